@@ -1,18 +1,26 @@
 import os
+import bisect
+import random
 import traceback
 import time
 from itertools import combinations
-from math import comb
+from math import comb, exp
 import pandas as pd
 import numpy as np
 from flask import Flask, request, jsonify, send_file
+from selection_pool import sheet_task, run_sheet_selections, selection_workers
 import tempfile
 import datetime
 
 # Global storage for processed results
 stored_results = None
 # Constants
-COMB_LIMIT = 10000  # if combinations exceed this, use greedy fallback
+COMB_LIMIT = 10000  # sheets with at most this many device combinations are always solved exactly (enumerated if degenerate)
+TIE_EXPANSION_LIMIT = 20000  # max pixel subsets re-scored when tied PCE values make several subsets optimal
+VERIFY_COMB_LIMIT = 5000  # verification mode: cross-check devices/sheets with at most this many subsets
+# Device search work budgets per sheet -- counts, not time, so a seed always gives the same selection
+BNB_NODE_LIMIT = 750_000  # exact search: branch-and-bound nodes before the anytime search takes over (selectionNodeLimit)
+ANYTIME_MOVES = 250_000  # anytime search: swap moves from the greedy selection (selectionMoves)
 
 # ---------------- Utilities ---------------- #
 def safe_std(values):
@@ -83,12 +91,188 @@ def make_pce_work(df: pd.DataFrame, basis: str, log_messages=[]):
     raise ValueError(f"Unsupported basis: {basis}")
 
 # ---------------- Device candidates (exact M pixels) ---------------- #
-def build_device_candidates_M(pce_df: pd.DataFrame, m_pixels: int, method: str, log_messages=[]):
+def subset_metric(vals, method: str):
+    """Metric of one pixel subset (values in pixel order): SD for minimize-sd, else mean"""
+    return safe_std(vals) if method == "minimize-sd" else float(np.mean(vals))
+
+def enumerate_best_subset(pces, m_pixels: int, method: str):
+    """
+    Reference selector: score every M-subset of pixel positions in lexicographic order and keep
+    the first strictly best one. Returns (indices, metric), or (None, None) if there is no subset.
+    """
+    best_idxs, best_metric = None, None
+    for idxs in combinations(range(len(pces)), m_pixels):
+        metric = subset_metric([pces[i] for i in idxs], method)
+        if method == "minimize-sd":
+            better = (best_metric is None) or (metric < best_metric)
+        else:  # maximize-mean-pce
+            better = (best_metric is None) or (metric > best_metric)
+        if better:
+            best_idxs, best_metric = idxs, metric
+    return best_idxs, best_metric
+
+def _tied_subsets(sorted_vals, order, lo: int, m_pixels: int):
+    """
+    Pixel subsets holding the same PCE values as sorted window [lo, lo+M): pixels whose value ties
+    with the window's lowest/highest value are interchangeable. Past TIE_EXPANSION_LIMIT only the
+    lexicographically first such subset is returned.
+    """
+    window = sorted_vals[lo:lo + m_pixels]
+    fixed, choices, count = [], [], 1
+    for v in np.unique(window):
+        pool = np.sort(order[sorted_vals == v]).tolist()
+        k = int(np.count_nonzero(window == v))
+        if k == len(pool):
+            fixed += pool
+        else:
+            choices.append((pool, k))
+            count *= comb(len(pool), k)
+    if count > TIE_EXPANSION_LIMIT:
+        choices = [(pool[:k], k) for pool, k in choices]
+
+    subsets = [tuple(fixed)]
+    for pool, k in choices:
+        subsets = [base + pick for base in subsets for pick in combinations(pool, k)]
+    return [tuple(sorted(idxs)) for idxs in subsets]
+
+def exact_best_subset(pces, m_pixels: int, method: str):
+    """
+    Same answer as enumerate_best_subset in O(n log n) per device (plus tied pixels).
+    In PCE order, a minimum-SD M-subset is a contiguous window (swapping an outer value for a
+    skipped inner one lowers the SD), so windows are screened with running sums and sums of squares;
+    the maximum mean is the top M. Windows within rounding of the optimum are expanded over tied pixels
+    and re-scored with subset_metric in lexicographic order, so ties break by pixel order exactly
+    like the enumeration.
+    """
+    n = len(pces)
+    if m_pixels < 2 or m_pixels > n:
+        return enumerate_best_subset(pces, m_pixels, method)
+
+    vals = np.asarray(pces, dtype="float64")
+    order = np.argsort(vals, kind="stable")
+    sorted_vals = vals[order]
+    if method == "minimize-sd":
+        centered = sorted_vals - sorted_vals.mean()
+        s1 = np.concatenate(([0.0], np.cumsum(centered)))
+        s2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        wsum = s1[m_pixels:] - s1[:-m_pixels]
+        wsq = s2[m_pixels:] - s2[:-m_pixels]
+        var = (wsq - wsum * wsum / m_pixels) / (m_pixels - 1)
+        tol = 1e-9 * float(sorted_vals[-1] - sorted_vals[0]) ** 2
+        starts = np.flatnonzero(var <= var.min() + tol)
+    else:  # maximize-mean-pce
+        starts = [n - m_pixels]
+
+    candidates = set()
+    for lo in starts:
+        candidates.update(_tied_subsets(sorted_vals, order, int(lo), m_pixels))
+
+    best_idxs, best_metric = None, None
+    for idxs in sorted(candidates):
+        metric = subset_metric([pces[i] for i in idxs], method)
+        if method == "minimize-sd":
+            better = (best_metric is None) or (metric < best_metric)
+        else:
+            better = (best_metric is None) or (metric > best_metric)
+        if better:
+            best_idxs, best_metric = idxs, metric
+    return best_idxs, best_metric
+
+CANDIDATE_COLUMNS = ["Batch ID","Sheet ID","Device ID","CandidatePixels","CandidatePCEs","DeviceMetric","PixelsUsed"]
+
+def _pandas_uses_bottleneck():
+    """Series.std goes through bottleneck when it is installed and enabled"""
+    if not pd.get_option("compute.use_bottleneck"):
+        return False
+    try:
+        import bottleneck  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _row_metrics(vals: np.ndarray, method: str) -> np.ndarray:
+    """
+    subset_metric of every row of a (devices x M) matrix, bit-identical to the per-list call:
+    pandas' two-pass sample SD (mean, then squared deviations) or np.mean.
+    """
+    if method != "minimize-sd":
+        return np.mean(vals, axis=1)
+    if _pandas_uses_bottleneck():
+        return np.array([safe_std(row) for row in vals.tolist()], dtype="float64")
+    m = vals.shape[1]
+    avg = vals.sum(axis=1, dtype=np.float64) / float(m)
+    sqr = (avg[:, None] - vals) ** 2
+    return np.sqrt(sqr.sum(axis=1, dtype=np.float64) / float(m - 1))
+
+def pack_devices(pce_df: pd.DataFrame):
+    """
+    CSR layout of PCE_WORK per (Batch, Sheet, Device), devices in groupby (sorted key) order and
+    pixels in Pixel ID order: device d = rows[offsets[d]:offsets[d+1]]. Returns (keys, rows, offsets).
+    """
+    g = pce_df.groupby(["Batch ID","Sheet ID","Device ID"], sort=True)
+    codes = g.ngroup().to_numpy()
+    keys = list(g.size().index)
+    pixel_rank = pd.factorize(pce_df["Pixel ID"], sort=True)[0]
+    valid = np.flatnonzero(codes >= 0)
+    rows = valid[np.lexsort((pixel_rank[valid], codes[valid]))]
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(codes[rows], minlength=len(keys)))))
+    return keys, rows, offsets
+
+def vectorized_best_subsets(vals: np.ndarray, offsets: np.ndarray, m_pixels: int, method: str):
+    """
+    exact_best_subset for all CSR-packed devices at once (vals in pixel order per device).
+    Every device's sorted windows are scored with array operations; a device whose optimum is a
+    single window without tied boundary values is resolved here. Returns (devices, positions)
+    with positions = (devices x M) pixel positions in pixel order, plus the devices left for
+    exact_best_subset (several near-optimal windows or tied values).
+    """
+    counts = np.diff(offsets)
+    eligible = np.flatnonzero(counts >= m_pixels)
+    if m_pixels < 2 or len(eligible) == 0:
+        return np.empty(0, dtype=np.intp), np.empty((0, max(m_pixels, 0)), dtype=np.intp), eligible
+
+    dev_of = np.repeat(np.arange(len(counts)), counts)
+    pos = np.arange(len(vals)) - offsets[dev_of]
+    order = np.lexsort((pos, vals, dev_of))  # per device: by PCE, ties in pixel order
+    sorted_vals, sorted_pos = vals[order], pos[order]
+
+    n_windows = counts[eligible] - m_pixels + 1
+    win_dev = np.repeat(eligible, n_windows)
+    first_window = np.concatenate(([0], np.cumsum(n_windows)[:-1]))
+    win_start = offsets[win_dev] + np.arange(len(win_dev)) - np.repeat(first_window, n_windows)
+    window = win_start[:, None] + np.arange(m_pixels)
+
+    if method == "minimize-sd":
+        dev_mean = np.bincount(dev_of, weights=vals, minlength=len(counts)) / np.maximum(counts, 1)
+        centered = sorted_vals[window] - dev_mean[win_dev][:, None]
+        wsum = centered.sum(axis=1)
+        var = ((centered * centered).sum(axis=1) - wsum * wsum / m_pixels) / (m_pixels - 1)
+        best_var = np.minimum.reduceat(var, first_window)
+        spread = sorted_vals[offsets[eligible + 1] - 1] - sorted_vals[offsets[eligible]]
+        near = var <= np.repeat(best_var + 1e-9 * spread ** 2, n_windows)
+        n_near = np.bincount(win_dev[near], minlength=len(counts))[eligible]
+        chosen = win_start[near][np.searchsorted(win_dev[near], eligible)]  # first near-optimal window
+    else:  # maximize-mean-pce: the top M
+        n_near = np.ones(len(eligible), dtype=np.intp)
+        chosen = offsets[eligible + 1] - m_pixels
+
+    lo, hi = chosen, chosen + m_pixels - 1
+    tied_below = (lo > offsets[eligible]) & (sorted_vals[np.maximum(lo - 1, 0)] == sorted_vals[lo])
+    tied_above = (hi + 1 < offsets[eligible + 1]) & (sorted_vals[np.minimum(hi + 1, len(vals) - 1)] == sorted_vals[hi])
+    fast = (n_near == 1) & ~tied_below & ~tied_above
+
+    positions = np.sort(sorted_pos[chosen[fast][:, None] + np.arange(m_pixels)], axis=1)
+    return eligible[fast], positions, eligible[~fast]
+
+def build_device_candidates_M(pce_df: pd.DataFrame, m_pixels: int, method: str, log_messages=[], verify=False):
     """
     For each (Batch, Sheet, Device), pick best EXACT-M-pixel subset by:
       - minimize-sd  => minimize SD of PCE_WORK
       - maximize-mean-pce=> maximize mean of PCE_WORK
-    Devices with < M pixels are skipped.
+    Devices with < M pixels are skipped. All devices are packed into one CSR array and solved
+    together (vectorized_best_subsets); only devices with ties go through exact_best_subset.
+    verify=True re-runs the full enumeration on devices with <= VERIFY_COMB_LIMIT subsets and
+    logs (and uses the enumeration's answer for) any device where the two differ.
     Returns: [Batch ID, Sheet ID, Device ID, CandidatePixels(list), CandidatePCEs(list), DeviceMetric, PixelsUsed=M]
     """
     need = ["Batch ID","Sheet ID","Device ID","Pixel ID","PCE_WORK"]
@@ -97,59 +281,312 @@ def build_device_candidates_M(pce_df: pd.DataFrame, m_pixels: int, method: str,
         raise ValueError(f"Missing columns for candidate building: {missing}")
 
     if pce_df.empty:
-        return pd.DataFrame(columns=[
-            "Batch ID","Sheet ID","Device ID","CandidatePixels","CandidatePCEs","DeviceMetric","PixelsUsed"
-        ])
-
-    recs = []
-    g = pce_df.groupby(["Batch ID","Sheet ID","Device ID"], as_index=False)
-    for (batch_id, sheet_id, dev_id), group in g:
-        group = group.sort_values("Pixel ID")
-        pixels = group["Pixel ID"].tolist()
-        pces   = group["PCE_WORK"].astype(float).tolist()
-
-        if len(pixels) < m_pixels:
-            continue
-
-        best_metric = None
-        best_pix = None
-        best_vals = None
-
-        for idxs in combinations(range(len(pixels)), m_pixels):
-            vals = [pces[i] for i in idxs]
-            pixs = [pixels[i] for i in idxs]
-            if method == "minimize-sd":
-                metric = safe_std(vals)
-                better = (best_metric is None) or (metric < best_metric)
-            else:  # maximize-mean-pce
-                metric = float(np.mean(vals))
-                better = (best_metric is None) or (metric > best_metric)
-            if better:
-                best_metric = metric
-                best_pix = pixs
-                best_vals = vals
-
-        if best_pix is None:
-            continue
-
-        recs.append({
-            "Batch ID": batch_id,
-            "Sheet ID": sheet_id,
-            "Device ID": dev_id,
-            "CandidatePixels": best_pix,
-            "CandidatePCEs": best_vals,
-            "DeviceMetric": best_metric,
-            "PixelsUsed": m_pixels,
-        })
-
-    return pd.DataFrame(recs)
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+
+    keys, rows, offsets = pack_devices(pce_df)
+    vals = pce_df["PCE_WORK"].to_numpy(dtype="float64")[rows]
+    pixel_ids = pce_df["Pixel ID"].to_numpy()[rows]
+
+    # NaN PCEs (not produced by make_pce_work) keep the enumeration's NaN handling
+    nan_devices = np.unique(np.repeat(np.arange(len(keys)), np.diff(offsets))[np.isnan(vals)])
+    clean = vals.copy()
+    clean[np.isnan(clean)] = 0.0
+    fast_devices, positions, slow_devices = vectorized_best_subsets(clean, offsets, m_pixels, method)
+    keep = ~np.isin(fast_devices, nan_devices)
+    fast_devices, positions = fast_devices[keep], positions[keep]
+    slow_devices = np.union1d(slow_devices, nan_devices[np.diff(offsets)[nan_devices] >= m_pixels])
+
+    # device -> (pixel positions, metric); fast devices straight from the packed arrays
+    picked = offsets[fast_devices][:, None] + positions
+    chosen = dict(zip(fast_devices.tolist(), zip(map(tuple, positions.tolist()),
+                                                 _row_metrics(vals[picked], method).tolist())))
+    for d in slow_devices.tolist():
+        select = enumerate_best_subset if d in nan_devices else exact_best_subset
+        chosen[d] = select(vals[offsets[d]:offsets[d + 1]].tolist(), m_pixels, method)
+
+    checked = mismatches = 0
+    if verify:
+        for d, (best_idxs, best_metric) in chosen.items():
+            pces = vals[offsets[d]:offsets[d + 1]].tolist()
+            if comb(len(pces), m_pixels) > VERIFY_COMB_LIMIT:
+                continue
+            checked += 1
+            ref_idxs, ref_metric = enumerate_best_subset(pces, m_pixels, method)
+            if ref_idxs != best_idxs or not (ref_metric == best_metric or (ref_metric != ref_metric and best_metric != best_metric)):
+                mismatches += 1
+                batch_id, sheet_id, dev_id = keys[d]
+                log_messages.append(
+                    f"Verification mismatch for device {dev_id} (Batch {batch_id}, Sheet {sheet_id}): "
+                    f"selector {best_idxs} vs enumeration {ref_idxs}; using enumeration.")
+                chosen[d] = (ref_idxs, ref_metric)
+
+    devices = [d for d in sorted(chosen) if chosen[d][0] is not None]
+    if not devices:
+        return pd.DataFrame()
+    taken = np.array([chosen[d][0] for d in devices], dtype=np.intp).reshape(len(devices), -1)
+    taken += offsets[devices][:, None]
+    batch_ids, sheet_ids, dev_ids = zip(*(keys[d] for d in devices))
+    columns = {
+        "Batch ID": list(batch_ids),
+        "Sheet ID": list(sheet_ids),
+        "Device ID": list(dev_ids),
+        "CandidatePixels": pixel_ids[taken].tolist(),
+        "CandidatePCEs": vals[taken].tolist(),
+        "DeviceMetric": [chosen[d][1] for d in devices],
+        "PixelsUsed": [m_pixels] * len(devices),
+    }
+
+    if verify:
+        log_messages.append(f"Verified pixel selection on {checked} device(s): {mismatches} mismatch(es).")
+    return pd.DataFrame(columns)
 
 # ---------------- Device selection per sheet (SAFE) ---------------- #
-def select_devices_for_sheet(sheet_group: pd.DataFrame, k_devices, method: str, log_messages=[]):
+def _combination_result(sheet_group: pd.DataFrame, idxs, method: str):
+    """Selection dict for the devices at row positions `idxs` (ascending) of a sheet group"""
+    rows = sheet_group.iloc[list(idxs)]
+    combined = [x for sub in rows["CandidatePCEs"] for x in sub]
+    metric = safe_std(combined) if method == "minimize-sd" else (float(np.mean(combined)) if combined else float("nan"))
+    return {
+        "SelectedDevices": tuple(rows["Device ID"].tolist()),
+        "CombinedPCEs": combined,
+        "CombinedMetric": metric,
+        "TotalPixels": int(sum(rows["PixelsUsed"])),
+    }
+
+def enumerate_device_selection(sheet_group: pd.DataFrame, k_devices: int, method: str):
+    """Reference search: every k-device combination in lexicographic order, first strictly best wins"""
+    best = None
+    for dev_combo in combinations(sheet_group["Device ID"].tolist(), k_devices):
+        rows = sheet_group[sheet_group["Device ID"].isin(dev_combo)]
+        combined = [x for sub in rows["CandidatePCEs"] for x in sub]
+        metric = safe_std(combined) if method == "minimize-sd" else (float(np.mean(combined)) if combined else float("nan"))
+        better = (best is None) or ((metric < best["CombinedMetric"]) if method=="minimize-sd" else (metric > best["CombinedMetric"]))
+        if better:
+            best = {
+                "SelectedDevices": tuple(dev_combo),
+                "CombinedPCEs": combined,
+                "CombinedMetric": metric,
+                "TotalPixels": int(sum(rows["PixelsUsed"])),
+            }
+    return best
+
+def device_moments(pce_lists):
+    """
+    Sufficient statistics per device: (n, sum, sum of squares) of its PCEs centred on the sheet mean
+    (centring keeps pooled variances accurate), plus the spread of all values.
+    """
+    lengths = np.array([len(v) for v in pce_lists], dtype=np.int64)
+    flat = np.concatenate([np.asarray(v, dtype="float64") for v in pce_lists]) if lengths.sum() else np.zeros(0)
+    centred = flat - (flat.mean() if len(flat) else 0.0)
+    dev = np.repeat(np.arange(len(lengths)), lengths)
+    sums = np.bincount(dev, weights=centred, minlength=len(lengths))
+    sumsq = np.bincount(dev, weights=centred * centred, minlength=len(lengths))
+    spread = float(flat.max() - flat.min()) if len(flat) else 0.0
+    return lengths, sums, sumsq, spread
+
+def _suffix_extremes(values, k: int, smallest: bool):
+    """table[j][r] = sum of the r smallest (or largest) of values[j:], inf when fewer than r remain"""
+    table = [None] * (len(values) + 1)
+    kept = []
+    table[len(values)] = [0.0] + [float("inf")] * k
+    for j in range(len(values) - 1, -1, -1):
+        bisect.insort(kept, values[j] if smallest else -values[j])
+        row, acc = [0.0], 0.0
+        for r in range(1, k + 1):
+            if r <= len(kept):
+                acc += kept[r - 1] if smallest else -kept[r - 1]
+                row.append(acc)
+            else:
+                row.append(float("inf"))
+        table[j] = row
+    return table
+
+class _SearchLimit(Exception):
+    pass
+
+def branch_and_bound_devices(n, sums, sumsq, spread: float, k_devices: int, method: str, node_limit: int = None):
+    """
+    Exact k-device search on sufficient statistics, each combination costing O(1).
+    Devices are visited in mean order (ascending for minimize-sd, descending for maximize-mean) and a
+    partial selection P is pruned when a lower bound on its best completion is worse than the best
+    found. For the SD the bound is SS(P) + the r smallest device SS left + P's between-group term
+    against the remaining means, over the largest possible pixel count. For the mean it is P plus
+    the r largest remaining sums (equal pixel counts) or the largest remaining mean.
+    Returns every combination (device positions, ascending) within rounding of the optimum, or None
+    when node_limit nodes were visited first.
+    """
+    node_limit = BNB_NODE_LIMIT if node_limit is None else node_limit
+    sd = method == "minimize-sd"
+    means = sums / n
+    order = np.argsort(means if sd else -means, kind="stable")
+    n_o, s_o, q_o = n[order].astype(float).tolist(), sums[order].tolist(), sumsq[order].tolist()
+    mu_o = means[order].tolist()
+    ss_o = [max(q - s * s / c, 0.0) for c, s, q in zip(n_o, s_o, q_o)]
+    count = len(n_o)
+    equal_n = len(set(n_o)) == 1
+    tol = 1e-9 * (spread * spread if sd else spread)
+
+    min_ss = _suffix_extremes(ss_o, k_devices, smallest=True)
+    min_n = _suffix_extremes(n_o, k_devices, smallest=True)
+    max_n = _suffix_extremes(n_o, k_devices, smallest=False)
+    max_s = _suffix_extremes(s_o, k_devices, smallest=False)
+
+    def key_of(c, s, q):
+        if sd:
+            return (q - s * s / c) / (c - 1) if c > 1 else float("inf")
+        return -s / c
+
+    def bound(j, r, c, s, q):
+        if sd:
+            c_rest = min_n[j][r]
+            gap = max(mu_o[j] - s / c, 0.0) if j < count else 0.0
+            ss = max(q - s * s / c, 0.0) + min_ss[j][r] + c * c_rest / (c + c_rest) * gap * gap
+            return ss / (c + max_n[j][r] - 1)
+        if equal_n:
+            return -(s + max_s[j][r]) / (c + r * n_o[0])
+        return -max(s / c, mu_o[j])
+
+    # Incumbent: best k consecutive devices in the visiting order
+    best = min(key_of(sum(n_o[i:i + k_devices]), sum(s_o[i:i + k_devices]), sum(q_o[i:i + k_devices]))
+               for i in range(count - k_devices + 1))
+    near = []
+    nodes = 0
+
+    def extend(start, r, c, s, q, chosen):
+        nonlocal best, nodes
+        for i in range(start, count - r + 1):
+            nodes += 1
+            if nodes > node_limit:
+                raise _SearchLimit()
+            c2, s2, q2 = c + n_o[i], s + s_o[i], q + q_o[i]
+            if r == 1:
+                key = key_of(c2, s2, q2)
+                if key <= best + tol:
+                    near.append((key, chosen + (i,)))
+                    best = min(best, key)
+            elif bound(i + 1, r - 1, c2, s2, q2) <= best + tol:
+                extend(i + 1, r - 1, c2, s2, q2, chosen + (i,))
+
+    try:
+        extend(0, k_devices, 0.0, 0.0, 0.0, ())
+    except _SearchLimit:
+        return None
+    return [tuple(sorted(order[list(p)].tolist())) for key, p in near if key <= best + tol]
+
+def exact_device_selection(sheet_group: pd.DataFrame, k_devices: int, method: str, node_limit: int = None):
+    """
+    Same selection as enumerate_device_selection via branch_and_bound_devices; near-optimal
+    combinations are re-scored with the original metric in lexicographic order, so ties break by
+    device order. None when the search hits node_limit (default BNB_NODE_LIMIT).
+    """
+    n, sums, sumsq, spread = device_moments(sheet_group["CandidatePCEs"].tolist())
+    if n.min() == 0 or (method == "minimize-sd" and k_devices * n.min() < 2):
+        # Degenerate metrics (empty / single values): keep the enumeration's semantics
+        return enumerate_device_selection(sheet_group, k_devices, method) if comb(len(n), k_devices) <= COMB_LIMIT else None
+
+    candidates = branch_and_bound_devices(n, sums, sumsq, spread, k_devices, method, node_limit)
+    if candidates is None:
+        return None
+    best = None
+    for idxs in sorted(candidates)[:TIE_EXPANSION_LIMIT]:
+        result = _combination_result(sheet_group, idxs, method)
+        better = (best is None) or ((result["CombinedMetric"] < best["CombinedMetric"]) if method == "minimize-sd"
+                                    else (result["CombinedMetric"] > best["CombinedMetric"]))
+        if better:
+            best = result
+    return best
+
+def greedy_device_selection(n, sums, sumsq, k_devices: int, method: str):
+    """Greedy baseline: add the device that gives the best combined metric, k times (device positions in pick order)"""
+    sd = method == "minimize-sd"
+    chosen, c, s, q = [], 0.0, 0.0, 0.0
+    remaining = np.ones(len(n), dtype=bool)
+    for _ in range(k_devices):
+        cand = np.flatnonzero(remaining)
+        c2, s2, q2 = c + n[cand], s + sums[cand], q + sumsq[cand]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            key = np.where(c2 > 1, (q2 - s2 * s2 / c2) / (c2 - 1), np.inf) if sd else -s2 / c2
+        i = int(cand[np.argmin(key)])
+        chosen.append(i)
+        remaining[i] = False
+        c, s, q = c + n[i], s + sums[i], q + sumsq[i]
+    return chosen
+
+def anytime_device_selection(n, sums, sumsq, spread: float, start, method: str, max_moves: int = ANYTIME_MOVES,
+                             seed: int = 0):
+    """
+    Improve a k-device selection (e.g. greedy_device_selection) by swapping one selected device for an
+    unselected one, on running (n, sum, sumsq) so every move costs O(1): best-improvement swap descent
+    to a local optimum, then simulated annealing with random swaps from random.Random(seed).
+    Stops after max_moves moves (a descent pass counts all the swaps it scores), so the result
+    depends only on the seed and max_moves.
+    Returns (best device positions ascending, {'iterations'}).
+    """
+    sd = method == "minimize-sd"
+    n = n.astype(float)
+    max_moves = max(int(max_moves), 0)
+    selected = list(start)
+    chosen = set(selected)
+    outside = [i for i in range(len(n)) if i not in chosen]
+    c, s, q = float(n[selected].sum()), float(sums[selected].sum()), float(sumsq[selected].sum())
+
+    def key_of(c, s, q):
+        return (q - s * s / c) / (c - 1) if sd else -s / c
+
+    current = key_of(c, s, q)
+    best, best_selection = current, sorted(selected)
+    moves = 0
+    if not outside:
+        return best_selection, {"iterations": 0}
+
+    # Swap descent: all k x (D - k) swaps per pass, scored at once
+    while moves < max_moves:
+        sel, out = np.array(selected), np.array(outside)
+        c2 = c - n[sel][:, None] + n[out][None, :]
+        s2 = s - sums[sel][:, None] + sums[out][None, :]
+        q2 = q - sumsq[sel][:, None] + sumsq[out][None, :]
+        keys = (q2 - s2 * s2 / c2) / (c2 - 1) if sd else -s2 / c2
+        moves += keys.size
+        a, b = np.unravel_index(np.argmin(keys), keys.shape)
+        if not keys[a, b] < current - 1e-12 * max(abs(current), 1.0):
+            break
+        i, j = selected[a], outside[b]
+        selected[a], outside[b] = j, i
+        c, s, q = c - n[i] + n[j], s - sums[i] + sums[j], q - sumsq[i] + sumsq[j]
+        current = float(keys[a, b])
+        if current < best:
+            best, best_selection = current, sorted(selected)
+
+    # Simulated annealing: temperature from the typical move size, cooled geometrically to 1e-4 of it
+    rng = random.Random(seed)
+    remaining_moves = max_moves - moves
+    temperature = (spread * spread if sd else spread) / max(c, 1.0) + 1e-12
+    cooling = (1e-4) ** (1.0 / remaining_moves) if remaining_moves > 0 else 1.0
+    for _ in range(remaining_moves):
+        a, b = rng.randrange(len(selected)), rng.randrange(len(outside))
+        i, j = selected[a], outside[b]
+        c2, s2, q2 = c - n[i] + n[j], s - sums[i] + sums[j], q - sumsq[i] + sumsq[j]
+        candidate = key_of(c2, s2, q2)
+        delta = candidate - current
+        if delta <= 0 or rng.random() < exp(-delta / temperature):
+            selected[a], outside[b] = j, i
+            c, s, q, current = c2, s2, q2, candidate
+            if current < best:
+                best, best_selection = current, sorted(selected)
+        temperature *= cooling
+        moves += 1
+    return best_selection, {"iterations": moves}
+
+def select_devices_for_sheet(sheet_group: pd.DataFrame, k_devices, method: str, log_messages=[], verify=False,
+                             node_limit: int = None, moves: int = None, seed: int = 0):
     """
     Choose devices for a single (Batch, Sheet).
     If k_devices is "select-all" or k_devices >= available -> select ALL available devices.
-    If 1 <= k_devices < available -> try exact-combo search; greedy fallback if too many combos.
+    If 1 <= k_devices < available -> exact branch-and-bound search within node_limit nodes (default
+    BNB_NODE_LIMIT; sheets with <= COMB_LIMIT combinations are always solved exactly); past that, an
+    anytime search from the greedy selection for `moves` swap moves (default ANYTIME_MOVES,
+    deterministic per seed), reported with its gain over greedy.
+    verify=True cross-checks sheets with <= VERIFY_COMB_LIMIT combinations against the enumeration.
     """
     if sheet_group.empty:
         return None
@@ -168,60 +605,52 @@ def select_devices_for_sheet(sheet_group: pd.DataFrame, k_devices, method: str,
         }
 
     # From here, 1 <= k_devices < available
-    dev_ids = sheet_group["Device ID"].tolist()
-
     # Safe combinations check
     try:
         num_combos = comb(available, k_devices)
     except ValueError:
         num_combos = 0
 
-    if num_combos and num_combos <= COMB_LIMIT:
-        best = None
-        for dev_combo in combinations(dev_ids, k_devices):
-            rows = sheet_group[sheet_group["Device ID"].isin(dev_combo)]
-            combined = [x for sub in rows["CandidatePCEs"] for x in sub]
-            metric = safe_std(combined) if method == "minimize-sd" else (float(np.mean(combined)) if combined else float("nan"))
-            better = (best is None) or ((metric < best["CombinedMetric"]) if method=="minimize-sd" else (metric > best["CombinedMetric"]))
-            if better:
-                best = {
-                    "SelectedDevices": tuple(dev_combo),
-                    "CombinedPCEs": combined,
-                    "CombinedMetric": metric,
-                    "TotalPixels": int(sum(rows["PixelsUsed"])),
-                }
+    node_limit = BNB_NODE_LIMIT if node_limit is None else max(int(node_limit), 0)
+    moves = ANYTIME_MOVES if moves is None else max(int(moves), 0)
+    if num_combos <= COMB_LIMIT:
+        # Small sheets are always solved exactly, whatever the node limit: each combination has one
+        # prefix per depth, so k * C(D, k) nodes cover the whole search tree
+        node_limit = max(node_limit, k_devices * num_combos)
+    best = exact_device_selection(sheet_group, k_devices, method, node_limit)
+    if best is not None:
+        if verify and num_combos <= VERIFY_COMB_LIMIT:
+            reference = enumerate_device_selection(sheet_group, k_devices, method)
+            if reference["SelectedDevices"] != best["SelectedDevices"]:
+                log_messages.append(
+                    f"Verification mismatch for sheet {sheet_group['Sheet ID'].iloc[0]}: search {best['SelectedDevices']} "
+                    f"vs enumeration {reference['SelectedDevices']}; using enumeration.")
+                best = reference
         return best
 
-    # Greedy fallback (bounded)
-    log_messages.append(f"Too many combinations ({num_combos:,} if computed); using greedy selection.")
-    remaining = sheet_group.copy()
-    selected = []
-    combined = []
-
-    steps = min(k_devices, available)
-    for _ in range(steps):
-        best_dev = None
-        best_metric = None
-        for _, row in remaining.iterrows():
-            test = combined + row["CandidatePCEs"]
-            m = safe_std(test) if method == "minimize-sd" else (float(np.mean(test)) if test else float("nan"))
-            better = (best_metric is None) or ((m < best_metric) if method=="minimize-sd" else (m > best_metric))
-            if better:
-                best_metric = m
-                best_dev = row
-        if best_dev is None:
-            break
-        selected.append(best_dev["Device ID"])
-        combined += best_dev["CandidatePCEs"]
-        remaining = remaining[remaining["Device ID"] != best_dev["Device ID"]]
-
-    rows = sheet_group[sheet_group["Device ID"].isin(selected)]
-    return {
-        "SelectedDevices": tuple(selected),
-        "CombinedPCEs": combined,
-        "CombinedMetric": (safe_std(combined) if method == "minimize-sd" else (float(np.mean(combined)) if combined else float("nan"))),
-        "TotalPixels": int(sum(rows["PixelsUsed"])),
-    }
+    # Anytime search from the greedy selection when the exact search is not feasible
+    n, sums, sumsq, spread = device_moments(sheet_group["CandidatePCEs"].tolist())
+    greedy = greedy_device_selection(n, sums, sumsq, k_devices, method)
+    greedy_result = _combination_result(sheet_group, sorted(greedy), method)
+    if n.min() == 0 or (method == "minimize-sd" and k_devices * n.min() < 2):
+        log_messages.append(f"Exact search not feasible ({num_combos:,} combinations); using greedy selection.")
+        return greedy_result
+
+    positions, stats = anytime_device_selection(n, sums, sumsq, spread, greedy, method, moves, seed)
+    result = _combination_result(sheet_group, positions, method)
+    greedy_metric = greedy_result["CombinedMetric"]
+    improvement = (greedy_metric - result["CombinedMetric"]) if method == "minimize-sd" else (result["CombinedMetric"] - greedy_metric)
+    result.update({
+        "Search": "anytime",
+        "GreedyMetric": greedy_metric,
+        "GapVsGreedy": (improvement / abs(greedy_metric) * 100) if greedy_metric else 0.0,
+        "Iterations": stats["iterations"],
+    })
+    log_messages.append(
+        f"Exact search not feasible ({num_combos:,} combinations, node limit {node_limit:,}); "
+        f"anytime search ({stats['iterations']:,} moves, seed {seed}): {result['CombinedMetric']:.4f} vs greedy "
+        f"{greedy_metric:.4f} ({result['GapVsGreedy']:.2f}% better).")
+    return result
 
 # ---------------- Entire data assembly ---------------- #
 def assemble_entire_rows(
@@ -353,6 +782,10 @@ def process_excel_analysis(
         basis = options.get('basis', 'forward')
         use_all_sheets = options.get('useAllSheets', True)
         sheet_ids = options.get('sheetIds', '')
+        verify_selection = bool(options.get('verifySelection', False))
+        selection_node_limit = int(options.get('selectionNodeLimit', BNB_NODE_LIMIT))
+        selection_moves = int(options.get('selectionMoves', ANYTIME_MOVES))
+        selection_seed = int(options.get('selectionSeed', 0))
 
         log_messages.append(f"Loading file: {file_path}")
         
@@ -400,7 +833,8 @@ def process_excel_analysis(
 
         # Build device candidates
         log_messages.append(f"Building device candidates (M={pixels_per_device}, method={method})")
-        cand_df = build_device_candidates_M(pce_df, m_pixels=pixels_per_device, method=method, log_messages=log_messages)
+        cand_df = build_device_candidates_M(pce_df, m_pixels=pixels_per_device, method=method,
+                                            log_messages=log_messages, verify=verify_selection)
         
         if cand_df.empty:
             raise ValueError("No device candidates produced; check data and settings.")
@@ -408,17 +842,31 @@ def process_excel_analysis(
         # Per-sheet device selection
         log_messages.append("Selecting devices per (Batch, Sheet)")
         quick_rows = []
+        anytime_sheets = []
 
         gb = cand_df.groupby(["Batch ID","Sheet ID"], as_index=False)
+        sheets = []
         for (batch_id, sheet_id), group in gb:
             # Devices selection
             k_dev = devices_top_k if devices_mode == "top-k" else "select-all"
             if isinstance(k_dev, int) and k_dev > len(group):
                 k_dev = "select-all"
+            sheets.append((batch_id, sheet_id, group, k_dev))
+
+        tasks = [sheet_task(group, k_dev, method, verify_selection, selection_node_limit, selection_moves,
+                            selection_seed)
+                 for _, _, group, k_dev in sheets]
+        outcomes = run_sheet_selections(tasks, selection_workers(options.get('selectionWorkers')), log_messages)
 
-            result = select_devices_for_sheet(group, k_devices=k_dev, method=method, log_messages=log_messages)
+        # Merge in (Batch, Sheet) order
+        for (batch_id, sheet_id, group, k_dev), (result, sheet_logs) in zip(sheets, outcomes):
+            log_messages.extend(sheet_logs)
             if result is None:
                 continue
+            if result.get("Search") == "anytime":
+                anytime_sheets.append({"Batch ID": batch_id, "Sheet ID": sheet_id,
+                                       "metric": result["CombinedMetric"], "greedyMetric": result["GreedyMetric"],
+                                       "gapVsGreedyPct": result["GapVsGreedy"], "iterations": result["Iterations"]})
 
             sel_devs = result["SelectedDevices"]
             combined = result["CombinedPCEs"]
@@ -530,7 +978,8 @@ def process_excel_analysis(
                 "sheetsProcessed": len(quick_df),
                 "devicesAnalyzed": sum(len(row["Selected devices"].split(", ")) for row in results_data if row["Selected devices"]),
                 "totalPixels": sum(row["Total pixels used"] for row in results_data),
-                "entireDataRows": len(entire_df)
+                "entireDataRows": len(entire_df),
+                "anytimeSelections": anytime_sheets
             },
             "results": results_data,
             "logs": log_messages,
@@ -26,13 +26,27 @@ from data_management_api import data_api
 from upload_data_api import upload_api
 from analysis_api import process_excel_analysis
 from stability_api import stability_api
+from http_cache import conditional_get, collection_get, compress_response
 
 # Load environment variables
 load_dotenv()
 
 # Create Flask app
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Data-Source', 'X-Data-Age', 'X-Data-Refreshing'])
+
+
+@app.after_request
+def compress(response):
+    """gzip/brotli-encode large JSON responses for clients that accept it"""
+    return compress_response(response)
+
+@app.before_request
+def start_chart_warmer():
+    """Start the chart cache warmer with this process's first chart request (gunicorn / App Service never run __main__)"""
+    from flask import request
+    if request.path.startswith('/api/charts/'):
+        charts_api.start_cache_warmer()
 
 # ==================== HEALTH CHECK ====================
 
@@ -62,7 +76,7 @@ def health():
 # Safety Issues
 @app.route('/api/safety', methods=['GET'])
 def get_safety_issues():
-    return data_api.get_all_safety_issues()
+    return collection_get(data_api.COLLECTION_SAFETY, data_api.get_all_safety_issues)
 
 @app.route('/api/safety', methods=['POST'])
 def create_safety_issue():
@@ -81,7 +95,7 @@ def delete_safety_issue(issue_id):
 # Kudos
 @app.route('/api/kudos', methods=['GET'])
 def get_kudos():
-    return data_api.get_all_kudos()
+    return collection_get(data_api.COLLECTION_KUDOS, data_api.get_all_kudos)
 
 @app.route('/api/kudos', methods=['POST'])
 def create_kudos():
@@ -95,7 +109,7 @@ def delete_kudos(kudos_id):
 # Today's Issues
 @app.route('/api/today', methods=['GET'])
 def get_today_issues():
-    return data_api.get_all_today_issues()
+    return collection_get(data_api.COLLECTION_TODAY, data_api.get_all_today_issues)
 
 @app.route('/api/today', methods=['POST'])
 def create_today_issue():
@@ -114,7 +128,7 @@ def delete_today_issue(issue_id):
 # Yesterday's Issues
 @app.route('/api/yesterday', methods=['GET'])
 def get_yesterday_issues():
-    return data_api.get_all_yesterday_issues()
+    return collection_get(data_api.COLLECTION_YESTERDAY, data_api.get_all_yesterday_issues)
 
 @app.route('/api/yesterday', methods=['POST'])
 def create_yesterday_issue():
@@ -137,25 +151,74 @@ def manual_reset_today():
 
 # ==================== CHART ENDPOINTS ====================
 
+CHART_FILTER_ARGS = ('batches', 'start', 'end', 'last_batches', 'sort')
+
+def _chart_filters():
+    """Raw chart filter query values, e.g. ?batches=B1,B2&start=2025-01-01&end=2025-01-31&last_batches=5&sort=desc"""
+    from flask import request
+    return {key: request.args.get(key) for key in CHART_FILTER_ARGS}
+
 @app.route('/api/charts/parameters', methods=['GET'])
 def get_chart_parameters():
     """Get list of available chart parameters."""
-    return charts_api.get_parameters()
+    return conditional_get('parameters', charts_api.get_parameters)
 
 @app.route('/api/charts/data/<parameter>', methods=['GET'])
 def get_chart_data(parameter):
-    """Get chart data for a specific parameter."""
-    return charts_api.get_chart_data(parameter)
+    """Get chart data for a specific parameter (optionally filtered)."""
+    return conditional_get(charts_api.data_version(),
+                           lambda: charts_api.get_chart_data(parameter, _chart_filters()))
+
+@app.route('/api/charts/histogram/<parameter>', methods=['GET'])
+def get_chart_histogram(parameter):
+    """Get per-batch histograms for a parameter (?bins=fd|N&ecdf=points, optionally filtered)."""
+    from flask import request
+    return conditional_get(charts_api.data_version(),
+                           lambda: charts_api.get_histogram(parameter, request.args.get('bins'),
+                                                            request.args.get('ecdf'), _chart_filters()))
 
 @app.route('/api/charts/device-yield', methods=['GET'])
 def get_device_yield_data():
-    """Get device yield data with 2.5% quantiles and batch averages."""
-    return charts_api.get_device_yield_data()
+    """Get device yield data with 2.5% quantiles and batch averages (optionally filtered)."""
+    return conditional_get(charts_api.data_version(), lambda: charts_api.get_device_yield_data(_chart_filters()))
 
 @app.route('/api/charts/iv-repeatability', methods=['GET'])
 def get_iv_repeatability_data():
-    """Get IV repeatability data with daily averages for last 10 days."""
-    return charts_api.get_iv_repeatability_data()
+    """Get IV repeatability data with daily averages for the last N days (?days=, default 10)."""
+    from flask import request
+    return conditional_get(charts_api.data_version(),
+                           lambda: charts_api.get_iv_repeatability_data(request.args.get('days'), _chart_filters()))
+
+@app.route('/api/charts/bundle', methods=['GET'])
+def get_chart_bundle():
+    """Get box-plot stats, device yield and IV repeatability together (optional ?parameters=&include=)."""
+    from flask import request
+    return conditional_get(charts_api.data_version(),
+                           lambda: charts_api.get_bundle(request.args.get('parameters'), request.args.get('include')))
+
+@app.route('/api/charts/query', methods=['GET'])
+def get_chart_query():
+    """Grouped aggregation (?group_by=batch,sheet,date,device&metrics=PCE,FF&aggs=mean,std,p25,count,cv, optionally filtered)."""
+    from flask import request
+    return conditional_get(charts_api.data_version(),
+                           lambda: charts_api.query(request.args.get('group_by'), request.args.get('metrics'),
+                                                    request.args.get('aggs'), _chart_filters()))
+
+@app.route('/api/charts/cache-stats', methods=['GET'])
+def get_chart_cache_stats():
+    """Get BaseLine dataset cache hit/miss counters."""
+    return charts_api.get_cache_stats()
+
+@app.route('/api/charts/quantile-report', methods=['GET'])
+def get_chart_quantile_report():
+    """Compare sketch-based and exact quantiles on the current data (?parameters=, optionally filtered)."""
+    from flask import request
+    return charts_api.get_quantile_report(request.args.get('parameters'), _chart_filters())
+
+@app.route('/api/charts/diff', methods=['GET'])
+def get_chart_version_diff():
+    """Row-level diff of the current BaseLine version against the previous one."""
+    return charts_api.get_version_diff()
 
 @app.route('/api/storage/check-connection', methods=['GET'])
 def make_connection_check():
@@ -174,12 +237,12 @@ def upload_file():
 @app.route('/api/stability/grid-data', methods=['GET'])
 def get_stability_grid_data():
     """Get all stability grid data including devices and history"""
-    return stability_api.get_grid_data()
+    return collection_get('stability_devices', stability_api.get_grid_data)
 
 @app.route('/api/stability/devices', methods=['GET'])
 def get_stability_devices():
     """Get all active stability devices"""
-    return stability_api.get_devices()
+    return collection_get('stability_devices', stability_api.get_devices)
 
 @app.route('/api/stability/devices', methods=['POST'])
 def create_stability_device():
@@ -199,7 +262,7 @@ def delete_stability_device(device_path):
 @app.route('/api/stability/history/<path:device_path>', methods=['GET'])
 def get_stability_history(device_path):
     """Get history for specific stability slot"""
-    return stability_api.get_history(device_path)
+    return collection_get('stability_history', lambda: stability_api.get_history(device_path))
 
 @app.route('/api/stability/check-expired', methods=['GET'])
 def check_expired_devices():
@@ -241,6 +304,12 @@ def process_analysis():
             options['basis'] = request.form.get('basis', 'forward')
             options['useAllSheets'] = request.form.get('useAllSheets', 'true').lower() == 'true'
             options['sheetIds'] = request.form.get('sheetIds', '')
+            options['verifySelection'] = request.form.get('verifySelection', 'false').lower() == 'true'
+            options['selectionNodeLimit'] = int(request.form.get('selectionNodeLimit', 750000))
+            options['selectionMoves'] = int(request.form.get('selectionMoves', 250000))
+            options['selectionSeed'] = int(request.form.get('selectionSeed', 0))
+            if request.form.get('selectionWorkers'):
+                options['selectionWorkers'] = int(request.form['selectionWorkers'])
         except (ValueError, TypeError) as e:
             return jsonify({"status": "error", "message": f"Invalid options format: {str(e)}"}), 400
         
@@ -397,6 +466,11 @@ def download_analysis_results():
 # ==================== START SERVER ====================
 
 if __name__ == '__main__':
+    # Analysis worker processes (selection_pool) are spawned; by default multiprocessing re-runs the
+    # main script in each of them (Flask app, chart and Mongo setup). Marking it run-only skips that.
+    import importlib.machinery
+    sys.modules['__main__'].__spec__ = importlib.machinery.ModuleSpec('__main__', None)
+
     print("🚀 Starting Modular Passdown API Server")
     print("=" * 60)
     print("📊 Features Available:")
@@ -414,4 +488,6 @@ if __name__ == '__main__':
     print("🔬 Stability Grid: GET /api/stability/grid-data")
     print("⚗️ Device Management: /api/stability/devices")
     print("=" * 60)
+    # Keep chart aggregates warm off the request path (CHART_WARMER=off to disable)
+    charts_api.start_cache_warmer()
     app.run(host='0.0.0.0', port=7071, debug=False)
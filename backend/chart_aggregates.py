@@ -0,0 +1,538 @@
+"""
+Chart Aggregates Module
+Materializes dashboard aggregates (box plots, device yield, IV repeatability) per BaseLine version
+so chart endpoints can serve them without recomputing from the workbook.
+
+Store backends (AGGREGATE_STORE):
+- file  (default): one JSON file per version under AGGREGATE_STORE_DIR (current and previous version kept)
+- mongo          : documents in AGGREGATE_COLLECTION of the passdown database
+
+Ad-hoc aggregation queries (/api/charts/query) are cached per BaseLine version and normalized
+query in a small LRU (QUERY_CACHE_ENTRIES=256).
+
+Materializing a new version reuses per-batch summaries keyed by a hash of each batch's rows
+(BATCH_SUMMARY_ENTRIES=4096), so only new or changed batches are recomputed. A re-upload is diffed
+row by row against the published version (identity: batch, sheet, device, pixel, scan direction,
+day); IV points of unchanged days are carried over and the diff summary is stored with the record.
+
+Background warmer (started by app.py with the first chart request in each process):
+- CHART_WARMER=on                  # off: requests revalidate and rebuild inline as before
+- CHART_WARM_INTERVAL_SECONDS=60   # how often the blob version is checked
+While the warmer runs, requests are served the last published aggregates (stale-while-revalidate).
+"""
+import os
+import json
+import copy
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+
+from data_processor import (
+    DASHBOARD_SECTIONS, IV_WINDOW_DAYS, select_parameters, compute_dashboard_bundle,
+    compute_chart_data, compute_device_yield_data, compute_iv_repeatability_data, compute_histogram_data,
+    load_baseline_dataset, ingest_baseline_bytes, ingest_baseline_partition,
+    refresh_baseline_dataset, quantile_error_report, QUANTILE_MODE, compute_aggregation_query, summarize_batches,
+    diff_baseline_datasets
+)
+from singleflight import SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class AggregateStore:
+    """Versioned store of precomputed dashboard bundles (all parameters, all sections)"""
+
+    def __init__(self):
+        self.backend = os.getenv('AGGREGATE_STORE', 'file').lower()
+        self.directory = os.getenv(
+            'AGGREGATE_STORE_DIR',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), '.baseline_aggregates')
+        )
+        self.collection = None
+        self._memory = {}  # version -> record, most recent last
+        self._lock = threading.Lock()
+        if self.backend == 'mongo':
+            self._connect_to_mongodb()
+
+    def _connect_to_mongodb(self):
+        """Use the passdown MongoDB; fall back to the file store if it is unavailable"""
+        try:
+            from pymongo import MongoClient
+            client = MongoClient(os.getenv('MONGODB_CONNECTION_STRING'))
+            db = client[os.getenv('DATABASE_NAME', 'passdown_db')]
+            client.server_info()
+            self.collection = db[os.getenv('AGGREGATE_COLLECTION', 'baseline_aggregates')]
+            logger.info("✅ Aggregate store using MongoDB")
+        except Exception as e:
+            logger.error(f"❌ Aggregate store MongoDB unavailable, using files: {e}")
+            self.backend = 'file'
+
+    def _path(self, version):
+        return os.path.join(self.directory, hashlib.sha1(str(version).encode('utf-8')).hexdigest()[:16] + '.json')
+
+    def _remember(self, record):
+        self._memory.pop(record['version'], None)
+        self._memory[record['version']] = record
+        while len(self._memory) > 4:
+            self._memory.pop(next(iter(self._memory)))
+
+    def save(self, record):
+        """Persist a materialized record (keyed by record['version'])"""
+        with self._lock:
+            if self.collection is not None:
+                self.collection.replace_one({'_id': record['version']}, dict(record, _id=record['version']), upsert=True)
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = self._path(record['version']) + f'.{os.getpid()}'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(record, f)
+                os.replace(tmp, self._path(record['version']))
+                self._prune(self._path(record['version']))
+            self._remember(record)
+
+    def _prune(self, current):
+        """Keep only the current and the previous version's file (best effort, like the snapshots)"""
+        older = [os.path.join(self.directory, entry) for entry in os.listdir(self.directory)
+                 if entry.endswith('.json') and os.path.join(self.directory, entry) != current]
+        older.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0, reverse=True)
+        for path in older[1:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def load(self, version):
+        """Materialized record for `version`, or None"""
+        with self._lock:
+            if version in self._memory:
+                return self._memory[version]
+            try:
+                if self.collection is not None:
+                    record = self.collection.find_one({'_id': version})
+                    if record:
+                        record.pop('_id', None)
+                else:
+                    with open(self._path(version), encoding='utf-8') as f:
+                        record = json.load(f)
+            except (OSError, ValueError):
+                record = None
+            if record and record.get('quantile_mode', 'exact') != QUANTILE_MODE:
+                record = None  # materialized under the other CHART_QUANTILES mode
+            if record:
+                self._remember(record)
+            return record
+
+
+_published = (None, None)  # (record, dataset) served by requests while the warmer runs
+computations = SingleFlight()  # concurrent identical computations run once and share the result
+
+
+def _publish(record, dataset):
+    """Make a materialized record (and the dataset it came from) the one requests are served"""
+    global _published
+    _published = (record, dataset)
+
+
+def _diff_against_published(dataset):
+    """(row diff vs the published version, its IV points for unchanged days); (None, None) without one"""
+    previous_record, previous = _published
+    if previous is None or previous.version == dataset.version:
+        return None, None
+    diff = diff_baseline_datasets(previous, dataset)
+    iv = previous_record.get('iv_repeatability') if previous_record else None
+    if not iv or previous_record.get('version') != previous.version:
+        return diff, None
+    changed = set(diff['changed_days'])
+    return diff, {point['date']: point for point in iv['repeatability_data'] if point['date'] not in changed}
+
+
+def materialize(dataset):
+    """
+    Compute and store the full dashboard bundle for one dataset version. Against the published
+    version, only changed batches and days are recomputed; the row diff is stored with the record.
+    """
+    summaries = None
+    if QUANTILE_MODE == 'exact' and dataset.batch_column:
+        summaries = batch_summaries.summaries(dataset)
+    diff, reuse_days = _diff_against_published(dataset)
+    record = compute_dashboard_bundle(dataset, batch_summaries=summaries, reuse_days=reuse_days)
+    if diff is not None:
+        record['diff'] = diff
+        print(f"🔍 BaseLine diff vs {diff['previous_version']}: +{diff['added']} -{diff['removed']} "
+              f"~{diff['changed']} rows in {len(diff['changed_batches'])} batch(es), {len(diff['changed_days'])} day(s)")
+    record['computed_at'] = datetime.utcnow().isoformat()
+    aggregate_store.save(record)
+    _publish(record, dataset)
+    recomputed = f" ({batch_summaries.last_computed}/{len(summaries)} batches recomputed)" if summaries else ""
+    print(f"📊 Materialized chart aggregates for version {dataset.version}{recomputed}")
+    return record
+
+
+def ensure_materialized(dataset):
+    """Stored record for the dataset's version, computing it at most once across threads"""
+    record = aggregate_store.load(dataset.version)
+    if record is None:
+        record = computations.do(('materialize', dataset.version),
+                                 lambda: aggregate_store.load(dataset.version) or materialize(dataset))
+    return record
+
+
+class CacheWarmer:
+    """
+    Daemon thread that checks the BaseLine version every `interval` seconds and rebuilds the
+    dataset and aggregates off the request path. Requests keep getting the previously
+    published version (marked with its version and age) until the rebuild is done.
+    """
+
+    def __init__(self, interval=60.0):
+        self.interval = interval
+        self.refreshing = False
+        self.last_refresh = None
+        self.last_error = None
+        self.runs = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def refresh_once(self):
+        """One version check (and rebuild when the version changed)"""
+        self.refreshing = True
+        try:
+            dataset = refresh_baseline_dataset()
+            _publish(ensure_materialized(dataset), dataset)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Chart cache warm-up failed: {e}")
+        finally:
+            self.refreshing = False
+            self.runs += 1
+            self.last_refresh = datetime.utcnow()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if not self.is_running():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            print(f"🔥 Chart cache warmer started (every {self.interval:g}s)")
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'running': self.is_running(),
+            'interval_seconds': self.interval,
+            'refreshing': self.refreshing,
+            'runs': self.runs,
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
+            'last_error': self.last_error,
+            'published_version': _published[0]['version'] if _published[0] else None,
+        }
+
+
+_warmer_lock = threading.Lock()
+_warmer_pid = None  # process that already decided whether to run the warmer (forked workers decide again)
+
+
+def start_cache_warmer():
+    """
+    Start the background warmer unless CHART_WARMER=off; returns the warmer (or None).
+    Safe to call on every request: only the first call in each process does anything.
+    """
+    global _warmer_pid
+    if _warmer_pid == os.getpid():
+        return cache_warmer if cache_warmer.is_running() else None
+    with _warmer_lock:
+        if _warmer_pid != os.getpid():
+            _warmer_pid = os.getpid()
+            if os.getenv('CHART_WARMER', 'on').lower() in ('0', 'off', 'false', 'no'):
+                print("⏸️ Chart cache warmer disabled (CHART_WARMER=off)")
+            else:
+                cache_warmer.start()
+    return cache_warmer if cache_warmer.is_running() else None
+
+
+def _record_age_seconds(record):
+    try:
+        return round((datetime.utcnow() - datetime.fromisoformat(record['computed_at'])).total_seconds(), 1)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def current_dataset():
+    """The dataset to compute ad-hoc views from: the published one while warming, else a strict load"""
+    if cache_warmer.is_running() and _published[1] is not None:
+        return _published[1]
+    return load_baseline_dataset()
+
+
+def current_version():
+    """BaseLine version (+ quantile mode) the chart endpoints serve right now (for ETags; nothing is aggregated)"""
+    return f"{current_dataset().version}|{QUANTILE_MODE}"
+
+
+_ingest_lock = threading.Lock()
+
+
+def ingest_baseline_upload(content: bytes, version):
+    """Parse a freshly uploaded BaseLine.xlsx once and materialize its aggregates in the background"""
+    def run():
+        with _ingest_lock:  # one ingest at a time, in upload order
+            try:
+                materialize(ingest_baseline_bytes(content, version))
+            except Exception as e:
+                logger.error(f"BaseLine ingest failed for version {version}: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def ingest_partition_upload(content: bytes, name: str):
+    """Partitioned mode: parse only the appended partition, merge it and materialize in the background"""
+    def run():
+        with _ingest_lock:
+            try:
+                materialize(ingest_baseline_partition(content, name))
+            except Exception as e:
+                logger.error(f"BaseLine partition ingest failed for {name}: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def slice_bundle(record, parameters=None, sections=None):
+    """Subset of a full bundle for the requested parameters/sections (record itself is not modified)"""
+    params = select_parameters(parameters)
+    sections = [s for s in DASHBOARD_SECTIONS if not sections or s in sections]
+    out = {
+        'version': record['version'],
+        'parameters': params,
+        'errors': {s: e for s, e in record.get('errors', {}).items() if s in sections},
+    }
+    if 'computed_at' in record:
+        out['computed_at'] = record['computed_at']
+
+    for section in sections:
+        data = record.get(section)
+        if data is None:
+            out[section] = None
+        elif section == 'chart_data':
+            out[section] = {p: copy.deepcopy(data[p]) for p in params if p in data}
+        elif section == 'device_yield':
+            out[section] = {
+                'parameters': params,
+                'batches': list(data['batches']),
+                'quantiles': {p: v for p, v in data['quantiles'].items() if p in params},
+                'batch_averages': {p: list(v) for p, v in data['batch_averages'].items() if p in params},
+            }
+        else:
+            keep = {'date', 'date_short'} | {f'{p}_{k}' for p in params for k in ('avg', 'cv')}
+            points = [{k: v for k, v in point.items() if k in keep} for point in data['repeatability_data']]
+            out[section] = {'dates': list(data['dates']), 'repeatability_data': points, 'parameters': params}
+    return out
+
+
+def get_dashboard_bundle(parameters=None, sections=None):
+    """
+    Serve the materialized aggregates for the current BaseLine version;
+    compute (and materialize) live only when that version has no stored record.
+    """
+    record = _published[0] if cache_warmer.is_running() else None
+    source = 'materialized'
+    if record is None:
+        dataset = load_baseline_dataset()
+        record = aggregate_store.load(dataset.version)
+        if record is None:
+            # Compute everything once for this version so the following requests are served from the store
+            record = ensure_materialized(dataset)
+            source = 'live'
+        _publish(record, dataset)
+    bundle = slice_bundle(record, parameters, sections)
+    bundle['source'] = source
+    bundle['age_seconds'] = _record_age_seconds(record)
+    bundle['refreshing'] = cache_warmer.refreshing
+    return bundle
+
+
+def freshness(bundle):
+    """Version/age markers that tell clients which BaseLine version they are looking at"""
+    return {k: bundle.get(k) for k in ('version', 'source', 'age_seconds', 'refreshing')}
+
+
+def _filters_key(filters):
+    """Canonical JSON of normalized row filters (batch allow-list order does not change results)"""
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    if filters.get('batches'):
+        filters['batches'] = sorted(filters['batches'])
+    return json.dumps(filters, sort_keys=True, default=str)
+
+
+def _live_section(section, parameters, filters, days):
+    dataset = current_dataset()
+
+    def compute():
+        if section == 'chart_data':
+            return compute_chart_data(dataset, parameters, filters)
+        if section == 'device_yield':
+            return compute_device_yield_data(dataset, parameters, filters)
+        return compute_iv_repeatability_data(dataset, parameters, days or IV_WINDOW_DAYS, filters)
+
+    key = (section, dataset.version, tuple(parameters or ()), _filters_key(filters), days)
+    data = computations.do(key, compute)
+    return data, {'version': dataset.version, 'source': 'live', 'age_seconds': 0.0, 'refreshing': cache_warmer.refreshing}
+
+
+def get_section(section, parameters=None, filters=None, days=None):
+    """
+    One dashboard section plus its freshness markers; raises ValueError like the extractors
+    when it cannot be computed. Unfiltered requests come from the materialized aggregates;
+    filtered ones (or a non-default IV window) are computed from the dataset's batch/day indexes.
+    """
+    if any(v is not None for v in (filters or {}).values()) or days not in (None, IV_WINDOW_DAYS):
+        return _live_section(section, parameters, filters, days)
+    bundle = get_dashboard_bundle(parameters, [section])
+    if bundle[section] is None:
+        raise ValueError(bundle['errors'].get(section, f"{section} not available"))
+    return bundle[section], freshness(bundle)
+
+
+def get_histogram(parameter, bins='fd', ecdf_points=0, filters=None):
+    """Per-batch histogram (+ optional ECDF) of one parameter, computed from the served dataset"""
+    dataset = current_dataset()
+    data = computations.do(('histogram', dataset.version, parameter, bins, ecdf_points, _filters_key(filters)),
+                           lambda: compute_histogram_data(dataset, parameter, bins, ecdf_points, filters))
+    return data, {'version': dataset.version, 'source': 'live', 'age_seconds': 0.0, 'refreshing': cache_warmer.refreshing}
+
+
+def get_version_diff():
+    """Row diff stored with the current version's aggregates (None when it had no previous version)"""
+    dataset = current_dataset()
+    record = ensure_materialized(dataset)
+    return record.get('diff'), {'version': dataset.version}
+
+
+def get_quantile_report(parameters=None, filters=None):
+    """Exact vs sketch quantile errors (and timings) on the served dataset"""
+    dataset = current_dataset()
+    return quantile_error_report(dataset, parameters, filters), {'version': dataset.version, 'source': 'live'}
+
+
+class QueryCache:
+    """LRU of aggregation query results keyed by (BaseLine version, normalized query + filters)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(version, query, filters):
+        return (version, json.dumps(query, sort_keys=True), _filters_key(filters))
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class BatchSummaryCache:
+    """
+    Per-batch dashboard summaries (see summarize_batches) keyed by the hash of the batch's rows, so a
+    new BaseLine version only recomputes the batches that are new or changed since earlier versions.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.reused = 0
+        self.computed = 0
+        self.last_computed = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def summaries(self, dataset):
+        """{batch slot: summary} for every batch of the dataset, computing only the missing ones"""
+        hashes = dataset.batch_hashes()
+        out, missing = {}, []
+        with self._lock:
+            for slot, digest in enumerate(hashes):
+                summary = self._entries.get(digest)
+                if summary is None:
+                    missing.append(slot)
+                else:
+                    self._entries.move_to_end(digest)
+                    out[slot] = summary
+        computed = summarize_batches(dataset, missing) if missing else {}
+        with self._lock:
+            for slot, summary in computed.items():
+                self._entries[hashes[slot]] = summary
+                self._entries.move_to_end(hashes[slot])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.reused += len(out)
+            self.computed += len(computed)
+            self.last_computed = len(computed)
+        out.update(computed)
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'reused': self.reused, 'computed': self.computed,
+                    'last_computed': self.last_computed}
+
+
+def run_query(query, filters=None):
+    """Result of a normalized aggregation query on the served dataset (cached per version); raises ValueError"""
+    dataset = current_dataset()
+    key = QueryCache.key(dataset.version, query, filters)
+    result = query_cache.get(key)
+    source = 'cache'
+    if result is None:
+        def compute():
+            computed = compute_aggregation_query(dataset, query, filters)
+            query_cache.put(key, computed)
+            return computed
+        result = computations.do(('query',) + key, compute)
+        source = 'live'
+    return result, {'version': dataset.version, 'source': source, 'refreshing': cache_warmer.refreshing}
+
+
+aggregate_store = AggregateStore()
+cache_warmer = CacheWarmer(interval=float(os.getenv('CHART_WARM_INTERVAL_SECONDS', '60')))
+query_cache = QueryCache(max_entries=int(os.getenv('QUERY_CACHE_ENTRIES', '256')))
+batch_summaries = BatchSummaryCache(max_entries=int(os.getenv('BATCH_SUMMARY_ENTRIES', '4096')))
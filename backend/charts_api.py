@@ -8,6 +8,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from flask import jsonify
+from http_cache import compressed_bodies
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,12 +19,27 @@ import sys
 sys.path.insert(0, os.path.dirname(__file__))
 
 try:
-    from data_processor import extract_chart_data, extract_device_yield_data, extract_iv_repeatability_data
+    from data_processor import get_baseline_cache_stats, parse_row_filters, parse_aggregation_query, DASHBOARD_SECTIONS
+    from chart_aggregates import get_dashboard_bundle, get_section, get_histogram, get_quantile_report, get_version_diff, run_query, query_cache, batch_summaries, computations, current_version, cache_warmer, start_cache_warmer
     DATA_PROCESSOR_AVAILABLE = True
 except ImportError as e:
     logging.warning(f"Data processor not available: {e}")
     DATA_PROCESSOR_AVAILABLE = False
 
+# Freshness markers change without a new BaseLine version, so they travel as headers:
+# the JSON body (covered by the version ETag) keeps only `version`.
+FRESHNESS_HEADERS = {'source': 'X-Data-Source', 'age_seconds': 'X-Data-Age', 'refreshing': 'X-Data-Refreshing'}
+
+
+def freshness_response(body, meta, status=200):
+    """JSON response with meta['version'] in the body and the other freshness markers as X-Data-* headers"""
+    response = jsonify({**body, "version": meta.get('version')})
+    for key, header in FRESHNESS_HEADERS.items():
+        value = meta.get(key)
+        if value is not None:
+            response.headers[header] = str(value).lower() if isinstance(value, bool) else str(value)
+    return response, status
+
 class ChartsAPI:
     """Charts API class handling all chart-related endpoints"""
     
@@ -47,8 +63,28 @@ class ChartsAPI:
                 "error": str(e)
             }), 500
     
-    def get_chart_data(self, parameter):
-        """Get chart data for a specific parameter"""
+    def data_version(self):
+        """Current BaseLine version used as the chart ETag validator (None when unavailable)"""
+        if not DATA_PROCESSOR_AVAILABLE:
+            return None
+        try:
+            return current_version()
+        except Exception as e:
+            logging.warning(f"BaseLine version unavailable for ETag: {e}")
+            return None
+    
+    def _parse_filters(self, filters):
+        """Normalized row filters from raw query values; returns (filters, error_response)"""
+        try:
+            return parse_row_filters(**(filters or {})), None
+        except ValueError as e:
+            return None, (jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400)
+    
+    def get_chart_data(self, parameter, filters=None):
+        """Get chart data for a specific parameter (optional batches/start/end/last_batches/sort filters)"""
         try:
             if not DATA_PROCESSOR_AVAILABLE:
                 return jsonify({
@@ -62,17 +98,21 @@ class ChartsAPI:
                     "error": f"Invalid parameter: {parameter}"
                 }), 400
             
-            # Extract data for ALL parameters, then filter for the requested one
-            all_chart_data = extract_chart_data()
+            filters, error = self._parse_filters(filters)
+            if error:
+                return error
+            
+            # Unfiltered: served from the materialized aggregates of the current BaseLine version
+            all_chart_data, meta = get_section('chart_data', parameters=[parameter], filters=filters)
             
             # Get data for the specific parameter
             parameter_data = all_chart_data.get(parameter, [])
             
-            return jsonify({
+            return freshness_response({
                 "success": True,
                 "parameter": parameter,
                 "data": parameter_data
-            }), 200
+            }, meta)
             
         except Exception as e:
             logging.error(f"Error getting chart data for {parameter}: {e}")
@@ -81,8 +121,8 @@ class ChartsAPI:
                 "error": str(e)
             }), 500
     
-    def get_device_yield(self):
-        """Get device yield data with quantiles"""
+    def get_histogram(self, parameter, bins=None, ecdf=None, filters=None):
+        """Get per-batch histograms (?bins=fd|N) and an optional downsampled ECDF (?ecdf=points)"""
         try:
             if not DATA_PROCESSOR_AVAILABLE:
                 return jsonify({
@@ -90,13 +130,59 @@ class ChartsAPI:
                     "error": "Data processor not available"
                 }), 500
             
-            # Extract device yield data
-            device_yield_data = extract_device_yield_data()
+            if parameter not in self.available_parameters:
+                return jsonify({
+                    "success": False,
+                    "error": f"Invalid parameter: {parameter}"
+                }), 400
             
+            filters, error = self._parse_filters(filters)
+            if error:
+                return error
+            
+            try:
+                bins = 'fd' if bins in (None, '', 'fd') else int(bins) if str(bins).isdigit() else -1
+                ecdf = int(ecdf) if str(ecdf).isdigit() else 0 if ecdf in (None, '') else -1
+                histogram, meta = get_histogram(parameter, bins, ecdf, filters)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": str(e)
+                }), 400
+            
+            return freshness_response({
+                "success": True,
+                "parameter": parameter,
+                "data": histogram
+            }, meta)
+            
+        except Exception as e:
+            logging.error(f"Error getting histogram for {parameter}: {e}")
             return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 500
+    
+    def get_device_yield(self, filters=None):
+        """Get device yield data with quantiles (optional batches/start/end/last_batches/sort filters)"""
+        try:
+            if not DATA_PROCESSOR_AVAILABLE:
+                return jsonify({
+                    "success": False,
+                    "error": "Data processor not available"
+                }), 500
+            
+            filters, error = self._parse_filters(filters)
+            if error:
+                return error
+            
+            # Extract device yield data
+            device_yield_data, meta = get_section('device_yield', filters=filters)
+            
+            return freshness_response({
                 "success": True,
                 "data": device_yield_data
-            }), 200
+            }, meta)
             
         except Exception as e:
             logging.error(f"Error getting device yield data: {e}")
@@ -105,8 +191,8 @@ class ChartsAPI:
                 "error": str(e)
             }), 500
     
-    def get_iv_repeatability(self):
-        """Get IV repeatability data"""
+    def get_iv_repeatability(self, days=None, filters=None):
+        """Get IV repeatability data (optionally for the last `days` days instead of 10, and filtered)"""
         try:
             if not DATA_PROCESSOR_AVAILABLE:
                 return jsonify({
@@ -114,13 +200,28 @@ class ChartsAPI:
                     "error": "Data processor not available"
                 }), 500
             
+            if days is not None:
+                try:
+                    days = int(days)
+                except (TypeError, ValueError):
+                    days = 0
+                if days < 1:
+                    return jsonify({
+                        "success": False,
+                        "error": "days must be a positive integer"
+                    }), 400
+            
+            filters, error = self._parse_filters(filters)
+            if error:
+                return error
+            
             # Extract IV repeatability data
-            iv_data = extract_iv_repeatability_data()
+            iv_data, meta = get_section('iv_repeatability', filters=filters, days=days)
             
-            return jsonify({
+            return freshness_response({
                 "success": True,
                 "data": iv_data
-            }), 200
+            }, meta)
             
         except Exception as e:
             logging.error(f"Error getting IV repeatability data: {e}")
@@ -129,14 +230,182 @@ class ChartsAPI:
                 "error": str(e)
             }), 500
     
+    def get_bundle(self, parameters=None, include=None):
+        """Get box-plot, device yield and IV repeatability data from one dataset load"""
+        try:
+            if not DATA_PROCESSOR_AVAILABLE:
+                return jsonify({
+                    "success": False,
+                    "error": "Data processor not available"
+                }), 500
+            
+            # Comma-separated query values, e.g. ?parameters=PCE,FF&include=chart_data,device_yield
+            param_list = [p.strip() for p in parameters.split(',') if p.strip()] if parameters else None
+            section_list = [s.strip() for s in include.split(',') if s.strip()] if include else None
+            
+            invalid = [p for p in (param_list or []) if p not in self.available_parameters]
+            if invalid:
+                return jsonify({
+                    "success": False,
+                    "error": f"Invalid parameter(s): {', '.join(invalid)}"
+                }), 400
+            
+            invalid = [s for s in (section_list or []) if s not in DASHBOARD_SECTIONS]
+            if invalid:
+                return jsonify({
+                    "success": False,
+                    "error": f"Invalid section(s): {', '.join(invalid)}. Use: {', '.join(DASHBOARD_SECTIONS)}"
+                }), 400
+            
+            bundle = get_dashboard_bundle(parameters=param_list, sections=section_list)
+            meta = {key: bundle.pop(key, None) for key in FRESHNESS_HEADERS}
+            meta['version'] = bundle.get('version')
+            
+            return freshness_response({
+                "success": True,
+                "data": bundle
+            }, meta)
+            
+        except Exception as e:
+            logging.error(f"Error getting chart bundle: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 500
+    
+    def query(self, group_by=None, metrics=None, aggs=None, filters=None):
+        """Grouped aggregation over the BaseLine data (?group_by=batch,date&metrics=PCE&aggs=mean,p25,cv)"""
+        try:
+            if not DATA_PROCESSOR_AVAILABLE:
+                return jsonify({
+                    "success": False,
+                    "error": "Data processor not available"
+                }), 500
+            
+            filters, error = self._parse_filters(filters)
+            if error:
+                return error
+            
+            try:
+                result, meta = run_query(parse_aggregation_query(group_by, metrics, aggs), filters)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": str(e)
+                }), 400
+            
+            return freshness_response({
+                "success": True,
+                "data": result
+            }, meta)
+            
+        except Exception as e:
+            logging.error(f"Error running chart query: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 500
+    
+    def get_quantile_report(self, parameters=None, filters=None):
+        """Compare approximate (sketch) and exact quantiles on the current BaseLine data"""
+        try:
+            if not DATA_PROCESSOR_AVAILABLE:
+                return jsonify({
+                    "success": False,
+                    "error": "Data processor not available"
+                }), 500
+            
+            param_list = [p.strip() for p in parameters.split(',') if p.strip()] if parameters else None
+            invalid = [p for p in (param_list or []) if p not in self.available_parameters]
+            if invalid:
+                return jsonify({
+                    "success": False,
+                    "error": f"Invalid parameter(s): {', '.join(invalid)}"
+                }), 400
+            
+            filters, error = self._parse_filters(filters)
+            if error:
+                return error
+            
+            report, meta = get_quantile_report(param_list, filters)
+            
+            return freshness_response({
+                "success": True,
+                "data": report
+            }, meta)
+            
+        except Exception as e:
+            logging.error(f"Error building quantile report: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 500
+    
+    def get_version_diff(self):
+        """Get the row-level diff of the current BaseLine version against the previous one"""
+        try:
+            if not DATA_PROCESSOR_AVAILABLE:
+                return jsonify({
+                    "success": False,
+                    "error": "Data processor not available"
+                }), 500
+            
+            diff, meta = get_version_diff()
+            if diff is None:
+                return freshness_response({
+                    "success": False,
+                    "error": "No previous BaseLine version to compare against"
+                }, meta, 404)
+            
+            return freshness_response({
+                "success": True,
+                "data": diff
+            }, meta)
+            
+        except Exception as e:
+            logging.error(f"Error getting BaseLine diff: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 500
+    
+    def get_cache_stats(self):
+        """Get BaseLine dataset cache counters (hits, misses, version)"""
+        try:
+            if not DATA_PROCESSOR_AVAILABLE:
+                return jsonify({
+                    "success": False,
+                    "error": "Data processor not available"
+                }), 500
+            
+            return jsonify({
+                "success": True,
+                "data": dict(get_baseline_cache_stats(), warmer=cache_warmer.stats(),
+                             compression=compressed_bodies.stats(), queries=query_cache.stats(),
+                             computations=computations.stats(), batch_summaries=batch_summaries.stats())
+            }), 200
+            
+        except Exception as e:
+            logging.error(f"Error getting cache stats: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 500
+    
+    def start_cache_warmer(self):
+        """Start the background chart cache warmer (no-op without the data processor)"""
+        if not DATA_PROCESSOR_AVAILABLE:
+            return None
+        return start_cache_warmer()
+    
     # Aliases for backward compatibility with app.py
-    def get_device_yield_data(self):
+    def get_device_yield_data(self, filters=None):
         """Alias for get_device_yield"""
-        return self.get_device_yield()
+        return self.get_device_yield(filters)
     
-    def get_iv_repeatability_data(self):
+    def get_iv_repeatability_data(self, days=None, filters=None):
         """Alias for get_iv_repeatability"""
-        return self.get_iv_repeatability()
+        return self.get_iv_repeatability(days, filters)
 
 # Lazy singleton instance - will be created on first access
 _charts_api_instance = None
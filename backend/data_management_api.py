@@ -11,6 +11,7 @@ from flask import jsonify
 from pymongo import MongoClient
 from bson import ObjectId
 from dotenv import load_dotenv
+from http_cache import change_counters
 
 # Load environment variables
 load_dotenv()
@@ -49,6 +50,10 @@ class DataManagementAPI:
             self.client = None
             self.db = None
     
+    def _changed(self, collection):
+        """Bump the collection's change counter so cached GET responses revalidate"""
+        change_counters.bump(collection)
+    
     def _serialize_doc(self, doc):
         """Convert MongoDB document to JSON-serializable format"""
         if doc and '_id' in doc:
@@ -92,6 +97,7 @@ class DataManagementAPI:
             }
             
             result = self.db[self.COLLECTION_SAFETY].insert_one(issue)
+            self._changed(self.COLLECTION_SAFETY)
             issue['_id'] = str(result.inserted_id)
             
             return jsonify({"success": True, "data": self._serialize_doc(issue)}), 201
@@ -122,6 +128,7 @@ class DataManagementAPI:
                 {'_id': ObjectId(issue_id)},
                 {'$set': update_data}
             )
+            self._changed(self.COLLECTION_SAFETY)
             
             logging.info(f"✅ Update result: matched={result.matched_count}, modified={result.modified_count}")
             
@@ -140,6 +147,7 @@ class DataManagementAPI:
                 return jsonify({"success": False, "error": "Database error"}), 500
             
             result = self.db[self.COLLECTION_SAFETY].delete_one({'_id': ObjectId(issue_id)})
+            self._changed(self.COLLECTION_SAFETY)
             
             if result.deleted_count == 0:
                 return jsonify({"success": False, "error": "Issue not found"}), 404
@@ -185,6 +193,7 @@ class DataManagementAPI:
             }
             
             result = self.db[self.COLLECTION_KUDOS].insert_one(kudos)
+            self._changed(self.COLLECTION_KUDOS)
             kudos['_id'] = str(result.inserted_id)
             
             return jsonify({"success": True, "data": self._serialize_doc(kudos)}), 201
@@ -199,6 +208,7 @@ class DataManagementAPI:
                 return jsonify({"success": False, "error": "Database error"}), 500
             
             result = self.db[self.COLLECTION_KUDOS].delete_one({'_id': ObjectId(kudos_id)})
+            self._changed(self.COLLECTION_KUDOS)
             
             if result.deleted_count == 0:
                 return jsonify({"success": False, "error": "Kudos not found"}), 404
@@ -243,6 +253,7 @@ class DataManagementAPI:
             }
             
             result = self.db[self.COLLECTION_TODAY].insert_one(today_issue)
+            self._changed(self.COLLECTION_TODAY)
             today_issue['_id'] = str(result.inserted_id)
             
             # Also add to yesterday's issues as incomplete
@@ -254,6 +265,7 @@ class DataManagementAPI:
                 'date': datetime.now().strftime('%m/%d')
             }
             self.db[self.COLLECTION_YESTERDAY].insert_one(yesterday_issue)
+            self._changed(self.COLLECTION_YESTERDAY)
             
             return jsonify({"success": True, "data": today_issue}), 201
         except Exception as e:
@@ -278,6 +290,7 @@ class DataManagementAPI:
                 {'id': int(issue_id)},
                 {'$set': update_data}
             )
+            self._changed(self.COLLECTION_TODAY)
             
             if result.matched_count == 0:
                 return jsonify({"success": False, "error": "Issue not found"}), 404
@@ -294,6 +307,7 @@ class DataManagementAPI:
                 return jsonify({"success": False, "error": "Database error"}), 500
             
             result = self.db[self.COLLECTION_TODAY].delete_one({'id': int(issue_id)})
+            self._changed(self.COLLECTION_TODAY)
             
             if result.deleted_count == 0:
                 return jsonify({"success": False, "error": "Issue not found"}), 404
@@ -339,6 +353,7 @@ class DataManagementAPI:
             }
             
             result = self.db[self.COLLECTION_YESTERDAY].insert_one(issue)
+            self._changed(self.COLLECTION_YESTERDAY)
             issue['_id'] = str(result.inserted_id)
             
             return jsonify({"success": True, "data": self._serialize_doc(issue)}), 201
@@ -364,6 +379,7 @@ class DataManagementAPI:
                 {'id': int(issue_id)},
                 {'$set': update_data}
             )
+            self._changed(self.COLLECTION_YESTERDAY)
             
             if result.matched_count == 0:
                 return jsonify({"success": False, "error": "Issue not found"}), 404
@@ -380,6 +396,7 @@ class DataManagementAPI:
                 return jsonify({"success": False, "error": "Database error"}), 500
             
             result = self.db[self.COLLECTION_YESTERDAY].delete_one({'id': int(issue_id)})
+            self._changed(self.COLLECTION_YESTERDAY)
             
             if result.deleted_count == 0:
                 return jsonify({"success": False, "error": "Issue not found"}), 404
@@ -398,6 +415,7 @@ class DataManagementAPI:
                 return jsonify({"success": False, "error": "Database error"}), 500
             
             result = self.db[self.COLLECTION_TODAY].delete_many({})
+            self._changed(self.COLLECTION_TODAY)
             
             return jsonify({
                 "success": True,
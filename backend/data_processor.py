@@ -1,9 +1,21 @@
 
 import os, io
+import json
+import time
+import shutil
+import hashlib
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from statistics import mean, stdev, median, quantiles
+from statistics import mean, stdev, median, quantiles, StatisticsError
 from dotenv import load_dotenv
 
+from quantile_sketch import CellSketches, SKETCH_RELATIVE_ACCURACY
+from singleflight import SingleFlight
+
 # Optional: Azure SDK (faster). If not installed, we'll use requests for SAS URL and container listing.
 try:
     from azure.storage.blob import BlobServiceClient, ContainerClient, BlobClient
@@ -16,6 +28,39 @@ load_dotenv()
 # REQUIRED file name (enforced strictly)
 REQUIRED_BLOB_NAME = os.getenv("BLOB_NAME", "BaseLine.xlsx")
 
+# Chart parameter -> BaseLine column (shared by every extractor)
+PARAMETER_MAPPING = {
+    'PCE': 'PCE (%)',
+    'FF': 'FF (%)',
+    'Max Power': 'Max Power (mW/cm2)',
+    'HI': 'HI (%)',
+    'I_sc': 'J_sc (mA/cm2)',
+    'V_oc': 'V_oc (V)',
+    'R_series': 'R_series (Ohm.cm2)',
+    'R_shunt': 'R_shunt (Ohm.cm2)'
+}
+EMPTY_STATS = {'min': 0, 'q1': 0, 'median': 0, 'q3': 0, 'max': 0, 'mean': 0, 'std': 0, 'count': 0}
+
+# Measurement identity columns kept by the column-pruning readers
+BASELINE_ID_COLUMNS = ("Batch ID", "Sheet ID", "Device ID", "Pixel ID", "Scan Direction")
+
+BASELINE_READER = os.getenv("BASELINE_READER", "streaming").lower()
+IV_WINDOW_DAYS = 10  # default number of most recent days on the IV repeatability chart
+HISTOGRAM_MAX_BINS = 200      # upper bound on histogram bins (fixed or Freedman-Diaconis)
+HISTOGRAM_MAX_ECDF_POINTS = 200
+QUERY_DIMENSIONS = ('batch', 'sheet', 'date', 'device')
+QUERY_DIMENSION_COLUMNS = {'sheet': 'Sheet ID', 'device': 'Device ID'}
+QUERY_AGGREGATIONS = ('count', 'mean', 'std', 'cv', 'min', 'max', 'median')  # plus pNN quantiles, e.g. p2.5
+QUERY_MAX_METRICS = 16
+QUERY_MAX_GROUPS = int(os.getenv("QUERY_MAX_GROUPS", "10000"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "5000000"))
+DIFF_IDENTITY_COLUMNS = ('Batch ID', 'Sheet ID', 'Device ID', 'Pixel ID', 'Scan Direction')  # + measurement day
+YIELD_TAIL_FRACTION = 0.05  # per-batch summaries keep their lowest 5% values (+2) for the 2.5% yield quantile
+QUANTILE_MODES = ('exact', 'approx')
+QUANTILE_MODE = os.getenv("CHART_QUANTILES", "exact").lower()  # approx: box plots / yield quantiles from sketches
+if QUANTILE_MODE not in QUANTILE_MODES:
+    QUANTILE_MODE = "exact"
+
 """
 Supported configurations (set EXACTLY ONE of these modes):
 
@@ -31,32 +76,44 @@ Supported configurations (set EXACTLY ONE of these modes):
    AZURE_STORAGE_CONNECTION_STRING="DefaultEndpointsProtocol=...;"
    CONTAINER_NAME="baseline-xlsx"
    # optional: BLOB_NAME="BaseLine.xlsx" (default)
+
+Optional tuning:
+   BASELINE_REVALIDATE_SECONDS=5   # how long a cached BaseLine is trusted before an ETag check
+   BASELINE_SNAPSHOT=on            # keep a memory-mappable columnar copy on disk across restarts
+   BASELINE_SNAPSHOT_DIR=...       # default: backend/.baseline_snapshot
+   BASELINE_READER=streaming       # streaming | pandas | <pd.read_excel engine, e.g. calamine>
+   BASELINE_COMPACT=on             # categorical IDs, lossless float32 metrics, dates parsed once
+   CHART_QUANTILES=exact           # approx: quartiles / 2.5% yield quantile merged from per-(batch, day) sketches
+   BLOB_CHUNK_BYTES=4194304        # Range chunk size for parallel blob downloads
+   BLOB_DOWNLOAD_WORKERS=4         # parallel Range requests per download
+
+Append-only mode (modes 2 or 3 only; uploads need write access):
+   BASELINE_MODE=partitioned       # workbook (default): one BaseLine.xlsx replaced on every upload
+   BASELINE_PARTITION_PREFIX=baseline/   # partition blobs + manifest.json live under this prefix
 """
 
 
 # -------------------- STRICT LOADERS --------------------
-def _read_xlsx_from_blob_sas_url(blob_sas_url: str) -> pd.DataFrame:
-    """Download BaseLine.xlsx via a single Blob SAS URL (exact file)."""
-    # Quick sanity: enforce URL targets REQUIRED_BLOB_NAME
-    lower = blob_sas_url.lower()
-    if not (lower.endswith(REQUIRED_BLOB_NAME.lower()) or f"/{REQUIRED_BLOB_NAME.lower()}?" in lower):
-        raise FileNotFoundError(f"BLOB_SAS_URL must point to '{REQUIRED_BLOB_NAME}'.")
-    if BlobClient is None:
-        import requests
-        r = requests.get(blob_sas_url)
-        r.raise_for_status()
-        return pd.read_excel(io.BytesIO(r.content))
-    data = BlobClient.from_blob_url(blob_sas_url).download_blob().readall()
-    return pd.read_excel(io.BytesIO(data))
+def _blob_version(headers, content=None):
+    """Version key for a blob: ETag, else Last-Modified, else a content hash."""
+    etag = headers.get("ETag") or headers.get("etag")
+    if etag:
+        return str(etag)
+    last_modified = headers.get("Last-Modified") or headers.get("last-modified")
+    if last_modified:
+        return f"lm:{last_modified}"
+    if content is not None:
+        return "sha256:" + hashlib.sha256(content).hexdigest()
+    return None
+
 
-def _strict_read_blob_from_container_sas(container_url: str, sas_token, blob_name: str):
+def _container_blob_url(container_url: str, sas_token, blob_name: str) -> str:
     """
     Accepts either:
     - combined container SAS in container_url (has '?'), or
     - split mode: container_url (no '?') + sas_token ("?sv=...").
     Builds: https://<acct>.blob.core.windows.net/<container>/<blob>?<token>
     """
-    import io, requests, pandas as pd
     from urllib.parse import urlsplit, urlunsplit
 
     if "?" in container_url:
@@ -66,47 +123,182 @@ def _strict_read_blob_from_container_sas(container_url: str, sas_token, blob_nam
             raise ValueError("Container URL has '?' but no query string.")
         # Insert '/BaseLine.xlsx' before the query
         path = parts.path.rstrip("/") + "/" + blob_name
-        blob_url = urlunsplit((parts.scheme, parts.netloc, path, parts.query, ""))  # keep same token
-    else:
-        # Split mode (old behavior)
-        if not sas_token:
-            raise ValueError("AZURE_CONTAINER_SAS is required when container URL has no query.")
-        if not sas_token.startswith("?"):
-            sas_token = "?" + sas_token
-        blob_url = container_url.rstrip("/") + "/" + blob_name + sas_token
+        return urlunsplit((parts.scheme, parts.netloc, path, parts.query, ""))  # keep same token
+
+    # Split mode (old behavior)
+    if not sas_token:
+        raise ValueError("AZURE_CONTAINER_SAS is required when container URL has no query.")
+    if not sas_token.startswith("?"):
+        sas_token = "?" + sas_token
+    return container_url.rstrip("/") + "/" + blob_name + sas_token
+
+
+# -------------------- BLOB FETCH LAYER --------------------
+BLOB_CHUNK_BYTES = int(os.getenv("BLOB_CHUNK_BYTES", str(4 * 1024 * 1024)))
+BLOB_DOWNLOAD_WORKERS = int(os.getenv("BLOB_DOWNLOAD_WORKERS", "4"))
+BLOB_CHANGED_RETRIES = 3  # downloads restarted because the blob was replaced mid-download, before giving up
+
+_http_session = None
+_sdk_clients = {}
+_client_lock = threading.Lock()
+
+
+class BlobChangedError(RuntimeError):
+    """The blob was replaced while its chunks were being downloaded."""
+
+
+def _get_http_session():
+    """Shared keep-alive session (one connection pool for every blob request in the process)."""
+    global _http_session
+    with _client_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(BLOB_DOWNLOAD_WORKERS, 4))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
 
-    # Optional: print safe URL (without sig) for debugging
-    safe = blob_url.split("&sig=")[0]
-    print(f"🔐 Fetching: {safe}")
 
-    r = requests.get(blob_url, stream=True)
-    if r.status_code == 200:
-        return pd.read_excel(io.BytesIO(r.content))
+def _sdk_client(key, factory):
+    """Reuse Azure SDK clients (and their HTTP pipelines) across loads."""
+    with _client_lock:
+        if key not in _sdk_clients:
+            _sdk_clients[key] = factory()
+        return _sdk_clients[key]
+
+
+def _raise_for_blob_status(r):
     if r.status_code == 404:
-        raise FileNotFoundError(f"'{blob_name}' not found in container.")
+        raise FileNotFoundError(f"'{REQUIRED_BLOB_NAME}' not found in container.")
     if r.status_code == 403:
         raise PermissionError("403 Forbidden: SAS lacks 'r', expired times, or IP restriction (sip) mismatch.")
     raise RuntimeError(f"Unexpected status {r.status_code} fetching blob.")
 
 
+def _download_blob_http(blob_url: str, if_none_match=None, chunk_bytes: int = None, workers: int = None):
+    """
+    GET a blob over the shared session. Returns (content or None on 304, version).
+
+    The first request carries the caller's validator and asks for the first chunk only. A larger
+    blob is then fetched as parallel Range requests into one preallocated buffer, each pinned to the
+    first response's ETag (If-Match) so a blob replaced mid-download is detected and re-fetched
+    (up to BLOB_CHANGED_RETRIES times).
+    """
+    chunk_bytes = chunk_bytes or BLOB_CHUNK_BYTES
+    workers = workers or BLOB_DOWNLOAD_WORKERS
+    for _ in range(BLOB_CHANGED_RETRIES):
+        try:
+            return _download_blob_attempt(blob_url, if_none_match, chunk_bytes, workers)
+        except BlobChangedError:
+            print("⚠️ Blob changed during download; fetching the new version")
+            if_none_match = None
+    raise BlobChangedError(f"Blob kept changing during download ({BLOB_CHANGED_RETRIES} attempts).")
+
+
+def _download_blob_attempt(blob_url: str, if_none_match, chunk_bytes: int, workers: int):
+    """One download of _download_blob_http; raises BlobChangedError if the blob is replaced meanwhile"""
+    session = _get_http_session()
+    headers = {"Range": f"bytes=0-{chunk_bytes - 1}"}
+    if if_none_match and if_none_match.startswith("lm:"):
+        headers["If-Modified-Since"] = if_none_match[3:]
+    elif if_none_match and not if_none_match.startswith("sha256:"):
+        headers["If-None-Match"] = if_none_match
+    r = session.get(blob_url, headers=headers)
+    if r.status_code == 304:
+        return None, if_none_match
+    if r.status_code == 416:  # empty blob: no satisfiable range
+        headers.pop("Range")
+        r = session.get(blob_url, headers=headers)
+        if r.status_code == 304:
+            return None, if_none_match
+    if r.status_code == 200:  # whole blob (server ignored the Range header)
+        return r.content, _blob_version(r.headers, r.content)
+    if r.status_code != 206:
+        _raise_for_blob_status(r)
+
+    total = int(r.headers["Content-Range"].rsplit("/", 1)[1])
+    first = r.content
+    if len(first) >= total:
+        return first, _blob_version(r.headers, first)
+
+    buffer = bytearray(total)
+    view = memoryview(buffer)
+    view[:len(first)] = first
+
+    pin = {}
+    if r.headers.get("ETag"):
+        pin["If-Match"] = r.headers["ETag"]
+    elif r.headers.get("Last-Modified"):
+        pin["If-Unmodified-Since"] = r.headers["Last-Modified"]
+
+    def fetch(start):
+        end = min(start + chunk_bytes, total) - 1
+        part = session.get(blob_url, headers={"Range": f"bytes={start}-{end}", **pin})
+        if part.status_code == 412:
+            raise BlobChangedError("Blob changed during a ranged download.")
+        if part.status_code != 206:
+            _raise_for_blob_status(part)
+        data = part.content
+        if len(data) != end - start + 1:
+            raise RuntimeError(f"Short read for bytes {start}-{end}: got {len(data)}.")
+        view[start:end + 1] = data
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fetch, range(len(first), total, chunk_bytes)))
+    return buffer, _blob_version(r.headers, buffer)
 
 
+def _fetch_from_blob_sas_url(blob_sas_url: str, if_none_match=None):
+    """Download BaseLine.xlsx via a single Blob SAS URL (exact file)."""
+    # Quick sanity: enforce URL targets REQUIRED_BLOB_NAME
+    lower = blob_sas_url.lower()
+    if not (lower.endswith(REQUIRED_BLOB_NAME.lower()) or f"/{REQUIRED_BLOB_NAME.lower()}?" in lower):
+        raise FileNotFoundError(f"BLOB_SAS_URL must point to '{REQUIRED_BLOB_NAME}'.")
+    if BlobClient is None:
+        return _download_blob_http(blob_sas_url, if_none_match)
+    bc = _sdk_client(("blob_url", blob_sas_url), lambda: BlobClient.from_blob_url(blob_sas_url))
+    version = bc.get_blob_properties().etag
+    if if_none_match and version == if_none_match:
+        return None, version
+    return bc.download_blob(max_concurrency=BLOB_DOWNLOAD_WORKERS).readall(), version
+
+
+def _fetch_from_container_sas(container_url: str, sas_token, blob_name: str, if_none_match=None):
+    """Download BaseLine.xlsx from a container SAS (combined or split token)."""
+    blob_url = _container_blob_url(container_url, sas_token, blob_name)
+
+    # Optional: print safe URL (without sig) for debugging
+    safe = blob_url.split("&sig=")[0]
+    print(f"🔐 Fetching: {safe}")
+    return _download_blob_http(blob_url, if_none_match)
+
 
-def _strict_read_blob_from_conn_str(conn_str: str, container: str, blob_name: str):
+def _fetch_from_conn_str(conn_str: str, container: str, blob_name: str, if_none_match=None):
     """Read exactly BaseLine.xlsx via connection string. Raises if missing."""
     if BlobServiceClient is None:
         raise RuntimeError("azure-storage-blob is required for connection-string reads (pip install azure-storage-blob).")
-    bsc = BlobServiceClient.from_connection_string(conn_str)
-    cont = bsc.get_container_client(container)
-    bc = cont.get_blob_client(blob_name)
+    bc = _sdk_client(
+        ("conn_str", conn_str, container, blob_name),
+        lambda: BlobServiceClient.from_connection_string(conn_str).get_container_client(container).get_blob_client(blob_name)
+    )
     if not bc.exists():
         raise FileNotFoundError(f"Required blob '{blob_name}' not found in container '{container}'.")
-    data = bc.download_blob().readall()
-    return pd.read_excel(io.BytesIO(data))
+    version = bc.get_blob_properties().etag
+    if if_none_match and version == if_none_match:
+        return None, version
+    # The SDK splits large blobs into parallel ranged GETs itself
+    return bc.download_blob(max_concurrency=BLOB_DOWNLOAD_WORKERS).readall(), version
 
 
-def _load_baseline_df():
-    """STRICT: load only 'BaseLine.xlsx' from Azure. If missing/inaccessible, raise. No local fallback."""
+def _fetch_baseline_blob(if_none_match=None):
+    """
+    STRICT: fetch only 'BaseLine.xlsx' from Azure. If missing/inaccessible, raise. No local fallback.
+    Returns (content, version); content is None when the blob still matches `if_none_match`.
+    """
     blob_sas_url = os.getenv("BLOB_SAS_URL")
     container_url = os.getenv("AZURE_CONTAINER_URL")
     sas_token = os.getenv("AZURE_CONTAINER_SAS")
@@ -125,15 +317,1045 @@ def _load_baseline_df():
 
     if blob_sas_url:
         print("🔐 Loading BaseLine.xlsx via BLOB_SAS_URL (strict)")
-        return _read_xlsx_from_blob_sas_url(blob_sas_url)
+        return _fetch_from_blob_sas_url(blob_sas_url, if_none_match)
 
     if container_url and sas_token:
         print("🔐 Loading BaseLine.xlsx via Container SAS (strict)")
-        return _strict_read_blob_from_container_sas(container_url, sas_token, blob_name)
+        return _fetch_from_container_sas(container_url, sas_token, blob_name, if_none_match)
 
     # connection string
     print("🔐 Loading BaseLine.xlsx via Connection String (strict)")
-    return _strict_read_blob_from_conn_str(conn_str, container, blob_name)
+    return _fetch_from_conn_str(conn_str, container, blob_name, if_none_match)
+
+
+# -------------------- PARTITIONED BASELINE --------------------
+# BASELINE_MODE=partitioned: every BaseLine upload is stored as an immutable partition blob under
+# BASELINE_PARTITION_PREFIX and listed (in upload order) in <prefix>manifest.json. The dataset version
+# is the manifest's ETag; a new upload only adds a partition, so only that file is downloaded and parsed.
+BASELINE_MODE = os.getenv("BASELINE_MODE", "workbook").lower()
+PARTITION_PREFIX = os.getenv("BASELINE_PARTITION_PREFIX", "baseline/")
+PARTITION_MANIFEST = PARTITION_PREFIX + "manifest.json"
+PARTITION_MANIFEST_FORMAT = 1
+PARTITION_MANIFEST_RETRIES = 5
+
+
+def partitioned_mode() -> bool:
+    return BASELINE_MODE == "partitioned"
+
+
+def _partition_source():
+    """Container access for partition blobs: ('sas', url, token) or ('conn_str', conn_str, container)."""
+    container_url = os.getenv("AZURE_CONTAINER_URL")
+    sas_token = os.getenv("AZURE_CONTAINER_SAS")
+    conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    container = os.getenv("CONTAINER_NAME")
+    if container_url and sas_token:
+        return ("sas", container_url, sas_token)
+    if conn_str and container:
+        return ("conn_str", conn_str, container)
+    raise RuntimeError(
+        "BASELINE_MODE=partitioned needs container access:\n"
+        "AZURE_CONTAINER_URL + AZURE_CONTAINER_SAS (sp=rcw), OR\n"
+        "AZURE_STORAGE_CONNECTION_STRING + CONTAINER_NAME"
+    )
+
+
+def _partition_blob_client(source, blob_name: str):
+    if BlobServiceClient is None:
+        raise RuntimeError("azure-storage-blob is required for connection-string access (pip install azure-storage-blob).")
+    _, conn_str, container = source
+    return _sdk_client(
+        ("conn_str", conn_str, container, blob_name),
+        lambda: BlobServiceClient.from_connection_string(conn_str).get_container_client(container).get_blob_client(blob_name)
+    )
+
+
+def _read_partition_blob(blob_name: str, if_none_match=None):
+    """(content or None when unchanged, version) of one blob; (None, None) when it does not exist."""
+    source = _partition_source()
+    if source[0] == "sas":
+        try:
+            return _download_blob_http(_container_blob_url(source[1], source[2], blob_name), if_none_match)
+        except FileNotFoundError:
+            return None, None
+    bc = _partition_blob_client(source, blob_name)
+    if not bc.exists():
+        return None, None
+    version = bc.get_blob_properties().etag
+    if if_none_match and version == if_none_match:
+        return None, version
+    return bc.download_blob(max_concurrency=BLOB_DOWNLOAD_WORKERS).readall(), version
+
+
+def _write_partition_blob(blob_name: str, data: bytes, if_match=None, content_type="application/octet-stream"):
+    """
+    PUT one blob and return its new version. Without `if_match` the blob is only created if it does
+    not exist yet; with it, only replaced if unchanged. A lost race raises BlobChangedError.
+    """
+    source = _partition_source()
+    if source[0] == "sas":
+        headers = {"x-ms-blob-type": "BlockBlob", "Content-Type": content_type}
+        if if_match:
+            headers["If-Match"] = if_match
+        else:
+            headers["If-None-Match"] = "*"
+        r = _get_http_session().put(_container_blob_url(source[1], source[2], blob_name), data=data, headers=headers)
+        if r.status_code in (409, 412):
+            raise BlobChangedError(f"'{blob_name}' was changed concurrently.")
+        if r.status_code not in (200, 201):
+            _raise_for_blob_status(r)
+        return _blob_version(r.headers, data)
+
+    from azure.core import MatchConditions
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+    bc = _partition_blob_client(source, blob_name)
+    try:
+        if if_match:
+            result = bc.upload_blob(data, overwrite=True, etag=if_match, match_condition=MatchConditions.IfNotModified)
+        else:
+            result = bc.upload_blob(data, overwrite=False)
+    except (ResourceExistsError, ResourceModifiedError):
+        raise BlobChangedError(f"'{blob_name}' was changed concurrently.")
+    return result.get("etag")
+
+
+def read_partition_manifest(if_none_match=None):
+    """(manifest or None when unchanged, version). A missing manifest reads as an empty one (version None)."""
+    content, version = _read_partition_blob(PARTITION_MANIFEST, if_none_match)
+    if content is None and version is None:
+        return {"format": PARTITION_MANIFEST_FORMAT, "partitions": []}, None
+    if content is None:
+        return None, version
+    manifest = json.loads(bytes(content).decode("utf-8"))
+    if manifest.get("format") != PARTITION_MANIFEST_FORMAT:
+        raise ValueError(f"Unsupported partition manifest format {manifest.get('format')!r}.")
+    return manifest, version
+
+
+def append_baseline_partition(content: bytes, source_name: str = None):
+    """
+    Store one BaseLine upload as a new partition and append it to the manifest.
+    The manifest is replaced with If-Match, so concurrent uploads retry instead of dropping each other.
+    Returns (manifest entry, new manifest version).
+    """
+    uploaded_at = datetime.utcnow()
+    name = f"part-{uploaded_at.strftime('%Y%m%d_%H%M%S_%f')}.xlsx"
+    entry = {
+        "name": name,
+        "version": _write_partition_blob(PARTITION_PREFIX + name, content),
+        "bytes": len(content),
+        "source_name": source_name,
+        "uploaded_at": uploaded_at.isoformat(),
+    }
+    for _ in range(PARTITION_MANIFEST_RETRIES):
+        manifest, manifest_version = read_partition_manifest()
+        manifest["partitions"].append(entry)
+        body = json.dumps(manifest, indent=1).encode("utf-8")
+        try:
+            manifest_version = _write_partition_blob(PARTITION_MANIFEST, body, if_match=manifest_version,
+                                                     content_type="application/json")
+        except BlobChangedError:
+            continue
+        print(f"🧩 BaseLine partition {name} appended ({len(manifest['partitions'])} partition(s))")
+        return entry, manifest_version
+    raise RuntimeError(f"Could not append '{name}' to the partition manifest (too many concurrent uploads).")
+
+
+# -------------------- XLSX READERS --------------------
+try:
+    from pandas._libs.parsers import STR_NA_VALUES as _EXCEL_NA_STRINGS
+except ImportError:
+    _EXCEL_NA_STRINGS = {"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+                         "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"}
+
+
+def _needed_columns(header) -> list:
+    """
+    Columns the extractors can touch, resolved on the FULL header with the extractors' own rules
+    (so pruning never changes which batch/date/metric column they pick). Keeps header order.
+    The pruning readers also keep every other numeric column (query metrics by column name).
+    """
+    keep = {_find_batch_column(header), _find_date_column(header)}
+    keep |= set(_resolve_chart_columns(header, verbose=False).values())
+    id_names = {c.upper() for c in BASELINE_ID_COLUMNS}
+    keep |= {c for c in header if str(c).strip().upper() in id_names}
+    return [c for c in header if c in keep]
+
+
+def _is_number_cell(value) -> bool:
+    """Cell that keeps an extra column numeric: a number, empty, or one of pandas' NA strings."""
+    if value is None or (isinstance(value, str) and value in _EXCEL_NA_STRINGS):
+        return True
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _prune_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Needed columns plus every other column holding numbers (bool and all-empty columns dropped)."""
+    needed = set(_needed_columns(df.columns))
+    return df[[c for c in df.columns if c in needed or (
+        pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]) and df[c].notna().any())]]
+
+
+def _typed_column(values: list) -> np.ndarray:
+    """Build a typed array from cell values with pandas' inference for Excel columns."""
+    # pd.read_excel treats its default NA strings ("N/A", "NULL", "", ...) as missing
+    values = [None if isinstance(v, str) and v in _EXCEL_NA_STRINGS else v for v in values]
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        if len(present) == len(values) and all(isinstance(v, int) for v in present):
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if present and all(isinstance(v, datetime) for v in present):
+        return pd.to_datetime(values).to_numpy()
+    if len(present) == len(values) and all(isinstance(v, bool) for v in present):
+        return np.array(values, dtype=bool)
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = [np.nan if v is None else v for v in values]
+    return arr
+
+
+def _read_xlsx_streaming(content: bytes) -> pd.DataFrame:
+    """
+    Stream the first sheet with openpyxl read-only mode, keeping the needed columns and the other
+    numeric ones (an extra column is dropped at its first text cell).
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            return pd.DataFrame()
+        header = [h if h is not None else f"Unnamed: {i}" for i, h in enumerate(first)]
+        if len(set(header)) != len(header):
+            raise ValueError("duplicate header names")
+
+        keep = _needed_columns(header)
+        extra = [i for i, c in enumerate(header) if c not in keep]
+        positions = [header.index(c) for c in keep]
+        columns = [[] for _ in keep]
+        extra_columns = {i: [] for i in extra}
+        n_rows = last_used = 0
+        for row in rows:
+            n_rows += 1
+            if any(v is not None for v in row):
+                last_used = n_rows
+            width = len(row)
+            for out, pos in zip(columns, positions):
+                out.append(row[pos] if pos < width else None)
+            for pos in extra:
+                out = extra_columns[pos]
+                if out is not None:
+                    value = row[pos] if pos < width else None
+                    if _is_number_cell(value):
+                        out.append(value)
+                    else:
+                        extra_columns[pos] = None
+    finally:
+        wb.close()
+
+    # Like pandas, drop trailing rows that are empty across the whole sheet
+    data = dict(zip(keep, columns))
+    for pos, vals in extra_columns.items():
+        if vals is not None and any(v is not None and not isinstance(v, str) for v in vals[:last_used]):
+            data[header[pos]] = vals
+    return pd.DataFrame({c: _typed_column(data[c][:last_used]) for c in header if c in data})
+
+
+def _parse_baseline_xlsx(content: bytes) -> pd.DataFrame:
+    """
+    Parse downloaded BaseLine.xlsx bytes into a DataFrame (BASELINE_READER):
+    - streaming (default): openpyxl read-only, needed and numeric columns only, typed NumPy columns
+    - pandas            : full pd.read_excel (every column)
+    - any other value   : used as pd.read_excel engine (e.g. calamine) with the same column pruning
+    """
+    if BASELINE_READER == "pandas":
+        return pd.read_excel(io.BytesIO(content))
+    try:
+        if BASELINE_READER == "streaming":
+            return _read_xlsx_streaming(content)
+        return _prune_columns(pd.read_excel(io.BytesIO(content), engine=BASELINE_READER))
+    except Exception as e:
+        print(f"⚠️ {BASELINE_READER} reader failed ({e}); falling back to full pd.read_excel")
+        return pd.read_excel(io.BytesIO(content))
+
+
+# -------------------- COMPACT LAYOUT --------------------
+COMPACT_ENABLED = os.getenv("BASELINE_COMPACT", "on").lower() not in ("0", "off", "false", "no")
+
+
+def _parse_dates(series: pd.Series) -> pd.Series:
+    """Convert to datetime (handles Excel serials)."""
+    if str(series.dtype) in ('float64', 'int64'):
+        try:
+            return pd.to_datetime(series, origin='1899-12-30', unit='D')
+        except Exception:
+            return pd.to_datetime(series, unit='D', origin='unix')
+    return pd.to_datetime(series, errors='coerce')
+
+
+def _float32_decimals(values: np.ndarray):
+    """
+    Decimal places d (0..6) with which float32 storage is lossless: every value has at most d
+    decimals and np.round(float32 -> float64, d) gives back the exact original. None if no such d.
+    """
+    finite = values[np.isfinite(values)]
+    for d in range(7):
+        if np.array_equal(np.round(finite, d), finite):
+            restored = np.round(finite.astype(np.float32).astype(np.float64), d)
+            return d if np.array_equal(restored, finite) else None
+    return None
+
+
+def compact_baseline_frame(df: pd.DataFrame):
+    """
+    Normalize a loaded BaseLine frame into a compact layout:
+    - batch / identity columns -> categoricals (when values repeat)
+    - float64 metric columns   -> float32 where that is lossless (decimal count kept in df.attrs)
+    - the date column          -> datetime64, parsed once (incl. Excel serial dates)
+    Returns (df, report) with the before/after memory footprint (silent: loaders print it per new version).
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    df = df.copy(deep=False)
+    decimals = dict(df.attrs.get("decimals", {}))
+    changes = {}
+
+    id_names = {c.upper() for c in BASELINE_ID_COLUMNS}
+    id_columns = [c for c in df.columns if str(c).strip().upper() in id_names]
+    batch_column = _find_batch_column(df.columns)
+    if batch_column is not None and batch_column not in id_columns:
+        id_columns.append(batch_column)
+    for col in id_columns:
+        s = df[col]
+        if not isinstance(s.dtype, pd.CategoricalDtype) and not pd.api.types.is_float_dtype(s) \
+                and s.nunique(dropna=True) <= len(s) // 2:
+            df[col] = s.astype("category")
+            changes[str(col)] = f"{s.dtype} -> category"
+
+    date_column = _find_date_column(df.columns)
+    if date_column is not None and not pd.api.types.is_datetime64_dtype(df[date_column]):
+        old_dtype = df[date_column].dtype
+        df[date_column] = _parse_dates(df[date_column])
+        changes[str(date_column)] = f"{old_dtype} -> {df[date_column].dtype}"
+
+    metric_columns = {c for c in _resolve_chart_columns(df.columns, verbose=False).values() if c is not None}
+    for col in df.columns:
+        if col in metric_columns and df[col].dtype == np.float64:
+            d = _float32_decimals(df[col].to_numpy())
+            if d is not None:
+                df[col] = df[col].astype(np.float32)
+                decimals[col] = d
+                changes[str(col)] = f"float64 -> float32 ({d} decimals)"
+
+    df.attrs["decimals"] = decimals
+    after = int(df.memory_usage(deep=True).sum())
+    return df, {'before_bytes': before, 'after_bytes': after, 'columns': changes}
+
+
+def _print_layout_report(memory: dict):
+    """One line per newly compacted BaseLine version (not per snapshot load or partition parse)"""
+    print(f"🗜️ BaseLine layout: {memory['before_bytes'] / 1e6:.2f} MB -> {memory['after_bytes'] / 1e6:.2f} MB "
+          f"({len(memory['columns'])} column(s) compacted)")
+
+
+def merge_partition_frames(frames) -> pd.DataFrame:
+    """
+    Concatenate partition frames in manifest order. Compact float32 columns are widened back to
+    their exact float64 values first, so compacting the merged frame decides per column exactly
+    as it would for one workbook holding all rows.
+    """
+    exact = []
+    for df in frames:
+        decimals = df.attrs.get("decimals", {})
+        df = df.copy(deep=False)
+        for col, d in decimals.items():
+            if col in df.columns and df[col].dtype == np.float32:
+                df[col] = np.round(df[col].to_numpy().astype(np.float64), d)
+        df.attrs["decimals"] = {}
+        exact.append(df)
+    merged = pd.concat(exact, ignore_index=True) if len(exact) > 1 else exact[0]
+    merged.attrs["decimals"] = {}
+    return merged
+
+
+# -------------------- COLUMNAR SNAPSHOT --------------------
+SNAPSHOT_FORMAT = 3  # 3: pruning readers keep every numeric column
+SNAPSHOT_DIR = os.getenv(
+    "BASELINE_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".baseline_snapshot")
+)
+SNAPSHOT_ENABLED = os.getenv("BASELINE_SNAPSHOT", "on").lower() not in ("0", "off", "false", "no")
+
+
+def _json_category(value):
+    """Categories are kept in the JSON manifest; non-JSON scalars degrade to strings."""
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value)
+    return str(value)
+
+
+def _read_snapshot_manifest(directory: str = None):
+    """Return the manifest of the current snapshot (in SNAPSHOT_DIR by default), or None if there is no usable one."""
+    directory = directory or SNAPSHOT_DIR
+    try:
+        with open(os.path.join(directory, "current.json"), encoding="utf-8") as f:
+            pointer = json.load(f)
+        with open(os.path.join(directory, pointer["dir"], "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError, KeyError):
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("reader") != BASELINE_READER:
+        return None  # written by another format or a reader that kept different columns
+    manifest["path"] = os.path.join(directory, pointer["dir"])
+    return manifest
+
+
+def write_snapshot(df: pd.DataFrame, version: str, directory: str = None, partitions: list = None,
+                   memory: dict = None) -> dict:
+    """
+    Persist a DataFrame as one .npy file per column plus a manifest (version + schema), in SNAPSHOT_DIR by default.
+    Numeric, datetime and categorical codes are stored as-is; other columns as int32 codes + categories.
+    In partitioned mode `partitions` records which manifest partitions the frame holds. `memory` is the
+    compact_baseline_frame report of the frame (None if it was not compacted), restored by snapshot loads.
+    """
+    directory = directory or SNAPSHOT_DIR
+    snap_dir = "snap-" + hashlib.sha1(str(version).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(directory, snap_dir)
+    os.makedirs(path, exist_ok=True)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        entry = {"name": _json_category(name), "file": f"c{i}.npy", "dtype": str(col.dtype)}
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            entry["kind"] = "category"
+            entry["categories"] = [_json_category(u) for u in col.cat.categories]
+            np.save(os.path.join(path, entry["file"]), col.cat.codes.to_numpy())
+        elif pd.api.types.is_numeric_dtype(col):
+            entry["kind"] = "numeric"
+            if name in df.attrs.get("decimals", {}):
+                entry["decimals"] = df.attrs["decimals"][name]
+            np.save(os.path.join(path, entry["file"]), col.to_numpy())
+        elif pd.api.types.is_datetime64_dtype(col):
+            entry["kind"] = "datetime"
+            np.save(os.path.join(path, entry["file"]), col.to_numpy())  # keeps the datetime unit
+        else:
+            entry["kind"] = "codes"
+            codes, uniques = pd.factorize(col)
+            entry["categories"] = [_json_category(u) for u in uniques]
+            np.save(os.path.join(path, entry["file"]), codes.astype(np.int32))
+        columns.append(entry)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "blob_name": REQUIRED_BLOB_NAME,
+        "reader": BASELINE_READER,
+        "rows": int(len(df)),
+        "partitions": partitions,
+        "memory": memory,
+        "created_at": datetime.utcnow().isoformat(),
+        "columns": columns,
+    }
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    # Swap the pointer atomically, then drop older snapshots (best effort: mapped files may be in use)
+    tmp_pointer = os.path.join(directory, f"current.json.{os.getpid()}")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        json.dump({"dir": snap_dir, "version": version}, f)
+    os.replace(tmp_pointer, os.path.join(directory, "current.json"))
+    for entry in os.listdir(directory):
+        if entry.startswith("snap-") and entry != snap_dir:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return manifest
+
+
+def load_snapshot(manifest: dict) -> pd.DataFrame:
+    """Map a snapshot back into a DataFrame (numeric/datetime columns stay memory-mapped)."""
+    data = {}
+    decimals = {}
+    for entry in manifest["columns"]:
+        arr = np.load(os.path.join(manifest["path"], entry["file"]), mmap_mode="r")
+        if entry["kind"] == "category":
+            arr = pd.Categorical.from_codes(arr, categories=entry["categories"])
+        elif entry["kind"] == "codes":
+            categories = np.empty(len(entry["categories"]) + 1, dtype=object)
+            categories[:-1] = entry["categories"]
+            categories[-1] = np.nan  # code -1 -> missing
+            arr = categories[arr]
+        if "decimals" in entry:
+            decimals[entry["name"]] = entry["decimals"]
+        data[entry["name"]] = arr
+    df = pd.DataFrame(data, copy=False)
+    df.attrs["decimals"] = decimals
+    if len(df) != manifest["rows"]:
+        raise ValueError("Snapshot row count does not match its manifest.")
+    return df
+
+
+# -------------------- DATASET CACHE --------------------
+class BaselineDataset:
+    """
+    One loaded BaseLine frame plus the conversions and groupings derived from it.
+    Each derived piece is built on first use and shared by every extractor reading this version.
+    """
+
+    def __init__(self, df: pd.DataFrame, version=None, partitions: list = None):
+        self.df = df
+        self.version = version
+        self.partitions = partitions or []  # manifest partition names held (partitioned mode)
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    def frame(self) -> pd.DataFrame:
+        """Private copy for callers that may modify it; extractors read self.df (never modified) instead."""
+        return self.df.copy()
+
+    def derive(self, key, build):
+        """Return the derived value stored under `key`, building it once."""
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = build()
+            return self._memo[key]
+
+    @property
+    def batch_column(self):
+        return self.derive('batch_column', lambda: _find_batch_column(self.df.columns))
+
+    def chart_columns(self) -> dict:
+        """Chart parameter -> column, with the fuzzy fallback of extract_chart_data."""
+        return self.derive('chart_columns', lambda: _resolve_chart_columns(self.df.columns))
+
+    def exact_columns(self) -> dict:
+        """Chart parameter -> column by case-insensitive exact name only (yield / repeatability)."""
+        def build():
+            colmap = {str(c).upper(): c for c in self.df.columns}
+            return {param: colmap.get(col.upper()) for param, col in PARAMETER_MAPPING.items()}
+        return self.derive('exact_columns', build)
+
+    def numeric(self, column, rows: np.ndarray = None) -> np.ndarray:
+        """
+        Column as float64 (NaN for non-numeric cells), optionally only at row positions `rows`.
+        Compact float32 columns come back exact.
+        """
+        col = self.df[column]
+        decimals = self.df.attrs.get("decimals", {}).get(column)
+        if decimals is not None:
+            values = col.to_numpy()
+            return np.round((values if rows is None else values[rows]).astype(np.float64), decimals)
+        if col.dtype == np.float64:
+            values = col.to_numpy()
+        else:
+            values = self.derive(('numeric', column), lambda: _numeric_values(col))
+        return values if rows is None else values[rows]
+
+    def day_partitions(self):
+        """
+        Per-day partition index over the date column (built once per version):
+        {'days': sorted dates, 'rows': row positions ordered by day, 'bounds': day i = rows[bounds[i]:bounds[i+1]]}.
+        None when the workbook has no date column.
+        """
+        def build():
+            date_column = _find_date_column(self.df.columns)
+            if date_column is None:
+                return None
+            day_numbers = _parse_dates(self.df[date_column]).to_numpy().astype('datetime64[D]')
+            rows = np.flatnonzero(~np.isnat(day_numbers))
+            rows = rows[np.argsort(day_numbers[rows], kind='stable')]
+            days, starts = np.unique(day_numbers[rows], return_index=True)
+            return {
+                'days': [d.item() for d in days],
+                'rows': rows,
+                'bounds': np.append(starts, len(rows)),
+            }
+        return self.derive('day_partitions', build)
+
+    def batch_groups(self):
+        """(codes, uniques) for the batch column, uniques in order of first appearance."""
+        return self.derive('batch_groups', lambda: _group_codes(self.df[self.batch_column]))
+
+    def batch_partitions(self):
+        """
+        Per-batch partition index (built once per version): {'labels': str(batch) -> code,
+        'rows': row positions ordered by batch code, 'bounds': batch code c = rows[bounds[c]:bounds[c+1]]}.
+        """
+        def build():
+            codes, uniques = self.batch_groups()
+            rows = np.flatnonzero(codes >= 0)
+            rows = rows[np.argsort(codes[rows], kind='stable')]
+            counts = np.bincount(codes[rows], minlength=len(uniques))
+            return {
+                'labels': {str(u): c for c, u in enumerate(uniques)},
+                'rows': rows,
+                'bounds': np.concatenate(([0], np.cumsum(counts))),
+            }
+        return self.derive('batch_partitions', build)
+
+    def row_days(self):
+        """Day partition number of every row (-1 where the date is missing)."""
+        def build():
+            partitions = self.day_partitions()
+            day_of_row = np.full(len(self.df), -1, dtype=np.intp)
+            counts = np.diff(partitions['bounds'])
+            day_of_row[partitions['rows']] = np.repeat(np.arange(len(counts)), counts)
+            return day_of_row
+        return self.derive('row_days', build)
+
+    def batch_recency(self):
+        """Batch codes from least to most recently measured (by last measurement day, then batch label)."""
+        def build():
+            codes, uniques = self.batch_groups()
+            label_rank = np.argsort(np.argsort(np.array([str(u) for u in uniques]), kind='stable'))
+            last_day = np.full(len(uniques), -1, dtype=np.intp)
+            if self.day_partitions() is not None:
+                valid = codes >= 0
+                np.maximum.at(last_day, codes[valid], self.row_days()[valid])
+            return np.lexsort((label_rank, last_day))
+        return self.derive('batch_recency', build)
+
+    def row_hashes(self) -> np.ndarray:
+        """64-bit content hash of each row over exact values (the same for the compact and plain layouts)."""
+        def build():
+            decimals = self.df.attrs.get("decimals", {})
+            exact = pd.DataFrame({c: (self.numeric(c) if c in decimals else self.df[c]) for c in self.df.columns})
+            return pd.util.hash_pandas_object(exact, index=False).to_numpy()
+        return self.derive('row_hashes', build)
+
+    def row_identities(self) -> np.ndarray:
+        """
+        64-bit hash of each row's identity: the DIFF_IDENTITY_COLUMNS present, the measurement day,
+        and the occurrence number among rows sharing those (so repeated measurements stay distinct).
+        Occurrences are numbered in content-hash order, so reordering the workbook changes nothing.
+        """
+        def build():
+            colmap = {str(c).upper(): c for c in self.df.columns}
+            keys = {name: self.df[colmap[name.upper()]].astype(str).to_numpy()
+                    for name in DIFF_IDENTITY_COLUMNS if name.upper() in colmap}
+            date_column = _find_date_column(self.df.columns)
+            if date_column is not None:
+                keys['day'] = _parse_dates(self.df[date_column]).to_numpy().astype('datetime64[D]').astype(np.int64)
+            base = pd.util.hash_pandas_object(pd.DataFrame(keys, index=pd.RangeIndex(len(self.df))), index=False).to_numpy()
+            order = np.lexsort((self.row_hashes(), base))
+            sorted_base = base[order]
+            first = np.flatnonzero(np.r_[True, sorted_base[1:] != sorted_base[:-1]])
+            occurrence = np.empty(len(base), dtype=np.int64)
+            occurrence[order] = np.arange(len(base)) - np.repeat(first, np.diff(np.r_[first, len(base)]))
+            return pd.util.hash_pandas_object(pd.DataFrame({'base': base, 'occurrence': occurrence}),
+                                              index=False).to_numpy()
+        return self.derive('row_identities', build)
+
+    def batch_hashes(self) -> list:
+        """
+        Content hash of each batch's rows, by batch slot (0 = rows without a batch, then batch code + 1).
+        Independent of row order and of the compact layout, so an unchanged batch hashes the same in
+        every version of the workbook.
+        """
+        def build():
+            codes, uniques = self.batch_groups()
+            row_hash = self.row_hashes()
+            slot = codes + 1
+            row_hash = row_hash[np.lexsort((row_hash, slot))]
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(slot, minlength=len(uniques) + 1))))
+            header = json.dumps([str(c) for c in self.df.columns]).encode("utf-8")
+            return [hashlib.sha1(header + row_hash[bounds[i]:bounds[i + 1]].tobytes()).hexdigest()
+                    for i in range(len(bounds) - 1)]
+        return self.derive('batch_hashes', build)
+
+    def dimension(self, name):
+        """
+        (codes, labels) of a query dimension (see QUERY_DIMENSIONS), built once per version:
+        codes number the labels in sorted order, -1 where the row has no value.
+        """
+        def build():
+            if name == 'date':
+                partitions = self.day_partitions()
+                if partitions is None:
+                    raise ValueError("No date column found to group by date (strict mode).")
+                return self.row_days(), [d.isoformat() for d in partitions['days']]
+            if name == 'batch':
+                column = self.batch_column
+            else:
+                colmap = {str(c).strip().upper(): c for c in self.df.columns}
+                column = colmap.get(QUERY_DIMENSION_COLUMNS[name].upper())
+            if column is None:
+                raise ValueError(f"No column found to group by {name} (strict mode).")
+            codes, uniques = _group_codes(self.df[column])
+            labels = [_json_category(u) for u in uniques]
+            try:
+                order = sorted(range(len(labels)), key=lambda i: labels[i])
+            except TypeError:  # mixed numbers and text
+                order = sorted(range(len(labels)), key=lambda i: str(labels[i]))
+            rank = np.empty(len(order), dtype=np.intp)
+            rank[order] = np.arange(len(order))
+            return np.where(codes >= 0, rank[np.maximum(codes, 0)], -1), [labels[i] for i in order]
+        return self.derive(('dimension', name), build)
+
+    def metric_column(self, metric: str):
+        """Column for a query metric: a chart parameter (PCE, FF, ...) or a numeric column by exact name."""
+        if metric in PARAMETER_MAPPING:
+            column = self.chart_columns()[metric]
+        else:
+            column = {str(c).upper(): c for c in self.df.columns}.get(metric.upper())
+            if column is not None and not pd.api.types.is_numeric_dtype(self.df[column]):
+                raise ValueError(f"Column '{metric}' is not numeric.")
+        if column is None:
+            raise ValueError(f"Unknown metric '{metric}'. Use a chart parameter ({', '.join(PARAMETER_MAPPING)}) "
+                             f"or a numeric column name.")
+        return column
+
+    def cells(self):
+        """
+        (batch x day) cell of every row, for the per-cell sketches (built once per version):
+        {'codes': cell per row, 'days': day slots, 'counts': rows per cell}. Slot 0 holds rows without
+        a batch / without a date, so cell = (batch code + 1) * days + (day + 1).
+        """
+        def build():
+            codes = self.batch_groups()[0] if self.batch_column else np.zeros(len(self.df), dtype=np.intp)
+            n_batches = len(self.batch_groups()[1]) + 1 if self.batch_column else 2
+            partitions = self.day_partitions()
+            n_days = len(partitions['days']) + 1 if partitions is not None else 1
+            day = self.row_days() + 1 if partitions is not None else np.zeros(len(self.df), dtype=np.intp)
+            cell = (codes + 1) * n_days + day
+            return {
+                'codes': cell,
+                'batches': n_batches,
+                'days': n_days,
+                'counts': np.bincount(cell, minlength=n_batches * n_days).reshape(n_batches, n_days),
+            }
+        return self.derive('cells', build)
+
+    def sketches(self, column) -> CellSketches:
+        """Per-cell quantile sketch + moments of one metric column (built once per version)."""
+        def build():
+            cells = self.cells()
+            return CellSketches(self.numeric(column), cells['codes'], cells['batches'] * cells['days'])
+        return self.derive(('sketches', column, SKETCH_RELATIVE_ACCURACY), build)
+
+    def select_cells(self, filters: dict = None):
+        """
+        The cell-level form of select_rows: (batch slot mask, day slot mask) whose cross product is
+        exactly the rows select_rows(filters) returns (batch and date filters never split a cell).
+        """
+        filters = filters or {}
+        cells = self.cells()
+        batch_ok = np.ones(cells['batches'], dtype=bool)
+        day_ok = np.ones(cells['days'], dtype=bool)
+        if filters.get('batches') is not None or filters.get('last_batches') is not None:
+            if not self.batch_column:
+                raise ValueError("No batch column found to filter by batch (strict mode).")
+        if filters.get('batches') is not None:
+            labels = self.batch_partitions()['labels']
+            batch_ok[:] = False
+            batch_ok[[labels[b] + 1 for b in filters['batches'] if b in labels]] = True
+        if filters.get('start') is not None or filters.get('end') is not None:
+            partitions = self.day_partitions()
+            if partitions is None:
+                raise ValueError("No date column found to filter by date (strict mode).")
+            days = partitions['days']
+            lo = bisect_left(days, filters['start']) if filters.get('start') is not None else 0
+            hi = bisect_right(days, filters['end']) if filters.get('end') is not None else len(days)
+            day_ok[:] = False
+            day_ok[1 + lo:1 + max(lo, hi)] = True
+        if filters.get('last_batches') is not None:
+            present = batch_ok & (cells['counts'][:, day_ok].sum(axis=1) > 0)
+            recency = self.batch_recency()
+            recency = recency[present[recency + 1]]
+            keep = recency[-filters['last_batches']:] if filters['last_batches'] else recency[:0]
+            batch_ok[:] = False
+            batch_ok[keep + 1] = True
+        return batch_ok, day_ok
+
+    def select_rows(self, filters: dict = None):
+        """
+        Row positions (sorted) matching normalized `filters` (see parse_row_filters), or None for all rows.
+        Uses the batch/day partition indexes, so the cost follows the number of selected rows.
+        """
+        filters = filters or {}
+        rows = None
+        if filters.get('batches') is not None or filters.get('last_batches') is not None:
+            if not self.batch_column:
+                raise ValueError("No batch column found to filter by batch (strict mode).")
+        if filters.get('batches') is not None:
+            labels = self.batch_partitions()['labels']
+            rows = self._rows_of_batches([labels[b] for b in filters['batches'] if b in labels])
+        if filters.get('start') is not None or filters.get('end') is not None:
+            partitions = self.day_partitions()
+            if partitions is None:
+                raise ValueError("No date column found to filter by date (strict mode).")
+            days = partitions['days']
+            lo = bisect_left(days, filters['start']) if filters.get('start') is not None else 0
+            hi = bisect_right(days, filters['end']) if filters.get('end') is not None else len(days)
+            bounds = partitions['bounds']
+            date_rows = np.sort(partitions['rows'][bounds[lo]:bounds[max(lo, hi)]])
+            rows = date_rows if rows is None else np.intersect1d(rows, date_rows, assume_unique=True)
+        if filters.get('last_batches') is not None:
+            codes = self.batch_groups()[0]
+            recency = self.batch_recency()
+            if rows is not None:
+                present = np.zeros(len(recency), dtype=bool)
+                present[codes[rows][codes[rows] >= 0]] = True
+                recency = recency[present[recency]]
+            keep = recency[-filters['last_batches']:] if filters['last_batches'] else recency[:0]
+            if rows is None:
+                rows = self._rows_of_batches(keep)
+            else:
+                wanted = np.zeros(len(present), dtype=bool)
+                wanted[keep] = True
+                rows = rows[(codes[rows] >= 0) & wanted[np.maximum(codes[rows], 0)]]
+        return rows
+
+    def _rows_of_batches(self, batch_codes) -> np.ndarray:
+        partitions = self.batch_partitions()
+        bounds = partitions['bounds']
+        slices = [partitions['rows'][bounds[c]:bounds[c + 1]] for c in batch_codes]
+        return np.sort(np.concatenate(slices)) if slices else np.empty(0, dtype=np.intp)
+
+
+class BaselineCache:
+    """
+    Process-wide cache of the parsed BaseLine DataFrame, keyed by blob version.
+
+    Within `revalidate_seconds` of the last check the cached frame is served without
+    touching storage; after that a conditional request (If-None-Match / ETag compare)
+    decides whether the workbook must be downloaded and parsed again. Concurrent callers
+    share one in-flight check / load (singleflight) instead of repeating it.
+    """
+
+    def __init__(self, revalidate_seconds: float = 5.0):
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._loaded_at = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.snapshot_loads = 0
+        self.source = None
+        self.last_parse_seconds = None
+        self.memory = None
+        self.partitions_parsed = 0
+        self._pending = {}  # partition name -> uploaded bytes not yet parsed (saves downloading them back)
+        self._flight = SingleFlight()
+
+    def get_dataset(self) -> BaselineDataset:
+        """Return the BaselineDataset for the current blob version."""
+        with self._lock:
+            current = self._dataset
+            if current is not None and time.monotonic() - self._checked_at < self.revalidate_seconds:
+                self.hits += 1
+                return current
+        # One revalidation / load at a time; callers arriving meanwhile share its outcome
+        return self._flight.do("dataset", self._revalidate)
+
+    def _revalidate(self) -> BaselineDataset:
+        """
+        Conditional check against storage; download and parse (or map the snapshot) on a new version.
+        Runs without the lock (singleflight keeps it to one at a time): the lock only guards reading
+        the cached entry and swapping in the new one, so stats() / prime() never wait for a load.
+        """
+        with self._lock:
+            current = self._dataset
+        if partitioned_mode():
+            return self._get_partitioned(current)
+
+        # Cold start: validate the on-disk snapshot instead of the (absent) in-memory frame
+        manifest = _read_snapshot_manifest() if current is None and SNAPSHOT_ENABLED else None
+        known_version = current.version if current is not None else (manifest or {}).get("version")
+
+        content, version = _fetch_baseline_blob(if_none_match=known_version)
+        if current is not None and (content is None or version == current.version):
+            return self._keep(current)
+
+        started = time.perf_counter()
+        df, source, memory, snapshot_loaded = None, None, None, False
+        if manifest and (content is None or version == manifest["version"]):
+            try:
+                df, memory = load_snapshot(manifest), manifest.get("memory")
+                if COMPACT_ENABLED and memory is None:  # snapshot written without the compact layout
+                    df, memory = compact_baseline_frame(df)
+                version = manifest["version"]
+                source, snapshot_loaded = "snapshot", True
+            except (OSError, ValueError) as e:
+                print(f"⚠️ BaseLine snapshot unreadable, re-parsing: {e}")
+                if content is None:
+                    content, version = _fetch_baseline_blob()
+        if df is None:
+            df = _parse_baseline_xlsx(content)
+            source = "xlsx"
+            if COMPACT_ENABLED:
+                df, memory = compact_baseline_frame(df)
+            if SNAPSHOT_ENABLED:
+                try:
+                    write_snapshot(df, version, memory=memory)
+                except OSError as e:
+                    print(f"⚠️ Could not write BaseLine snapshot: {e}")
+        return self._install(current, BaselineDataset(df, version), source, memory, started, snapshot_loaded)
+
+    def _keep(self, current) -> BaselineDataset:
+        """Storage still holds the cached version."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self.hits += 1
+            self.revalidations += 1
+            return self._dataset
+
+    def _install(self, current, dataset, source, memory, started, snapshot_loaded=False) -> BaselineDataset:
+        """Swap in a freshly loaded dataset, unless prime() installed one while it was loading."""
+        seconds = round(time.perf_counter() - started, 3)
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self.misses += 1
+            self.snapshot_loads += int(snapshot_loaded)
+            self.last_parse_seconds = seconds
+            if self._dataset is not current:
+                return self._dataset
+            self.source = source
+            if memory is not None:
+                self.memory = memory
+            self._dataset, self._loaded_at = dataset, datetime.utcnow()
+        if memory is not None and source != "snapshot":
+            _print_layout_report(memory)
+        partitions = f", partitions={len(dataset.partitions)}" if dataset.partitions else ""
+        print(f"📦 BaseLine cached (version={dataset.version}, source={source}{partitions}, load={seconds}s)")
+        return dataset
+
+    def _partition_frame(self, name: str) -> pd.DataFrame:
+        """Parse (and compact) one partition, from its upload bytes if this process has them."""
+        with self._lock:
+            content = self._pending.pop(name, None)
+        if content is None:
+            content, _ = _read_partition_blob(PARTITION_PREFIX + name)
+            if content is None:
+                raise FileNotFoundError(f"Partition '{name}' is listed in the manifest but missing from the container.")
+        df = _parse_baseline_xlsx(content)
+        if COMPACT_ENABLED:
+            df, _ = compact_baseline_frame(df)
+        with self._lock:
+            self.partitions_parsed += 1
+        return df
+
+    def _get_partitioned(self, current) -> BaselineDataset:
+        """
+        Partitioned mode: revalidate the manifest and, when partitions were appended, parse only
+        those and merge them onto the cached (or snapshotted) frame.
+        A manifest that is not an extension of the cached partition list is rebuilt from all partitions.
+        """
+        snapshot = _read_snapshot_manifest() if current is None and SNAPSHOT_ENABLED else None
+        known_version = current.version if current is not None else (snapshot or {}).get("version")
+
+        listing, version = read_partition_manifest(if_none_match=known_version)
+        if current is not None and (listing is None or version == current.version):
+            return self._keep(current)
+
+        started = time.perf_counter()
+        base, loaded = (current.df, current.partitions) if current is not None else (None, [])
+        source, memory, snapshot_loaded = None, None, False
+        if snapshot and snapshot.get("partitions"):
+            try:
+                base, loaded, memory = load_snapshot(snapshot), snapshot["partitions"], snapshot.get("memory")
+                source, snapshot_loaded = "snapshot", True
+            except (OSError, ValueError) as e:
+                print(f"⚠️ BaseLine snapshot unreadable, re-parsing partitions: {e}")
+        if listing is None and base is None:
+            listing, version = read_partition_manifest()
+
+        if listing is None:  # cold start and the snapshot is still current
+            df, names = base, loaded
+            if COMPACT_ENABLED and memory is None:  # snapshot written without the compact layout
+                df, memory = compact_baseline_frame(df)
+        else:
+            names = [p["name"] for p in listing["partitions"]]
+            if not names:
+                raise FileNotFoundError(f"No BaseLine partitions listed in '{PARTITION_MANIFEST}' yet.")
+            if not loaded or loaded != names[:len(loaded)]:
+                base, loaded = None, []
+            added = names[len(loaded):]
+            frames = ([base] if base is not None else []) + [self._partition_frame(n) for n in added]
+            df, memory = merge_partition_frames(frames), None
+            if COMPACT_ENABLED:
+                df, memory = compact_baseline_frame(df)
+            source = "partitions"
+            print(f"🧩 BaseLine partitions: {len(loaded)} cached + {len(added)} parsed")
+            if SNAPSHOT_ENABLED:
+                try:
+                    write_snapshot(df, version, partitions=names, memory=memory)
+                except OSError as e:
+                    print(f"⚠️ Could not write BaseLine snapshot: {e}")
+
+        return self._install(current, BaselineDataset(df, version, names), source, memory, started, snapshot_loaded)
+
+    def add_pending_partition(self, name: str, content: bytes):
+        """Hand just-uploaded partition bytes to the next load so they are parsed without a download."""
+        with self._lock:
+            self._pending[name] = content
+
+    def get(self) -> pd.DataFrame:
+        """Return a copy of the current BaseLine DataFrame (the cached frame itself stays untouched)."""
+        return self.get_dataset().frame()
+
+    def prime(self, dataset: BaselineDataset, memory: dict = None):
+        """Install a dataset that is known to be current (e.g. just uploaded)."""
+        with self._lock:
+            self.memory = memory
+            self._dataset, self._loaded_at = dataset, datetime.utcnow()
+            self._checked_at = time.monotonic()
+            self.source = "upload"
+
+    def invalidate(self):
+        """Force the next get() to revalidate against storage."""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'snapshot_loads': self.snapshot_loads,
+                'source': self.source,
+                'version': self._dataset.version if self._dataset is not None else None,
+                'loaded_at': self._loaded_at.isoformat() if self._loaded_at else None,
+                'rows': int(len(self._dataset.df)) if self._dataset is not None else 0,
+                'last_parse_seconds': self.last_parse_seconds,
+                'revalidate_seconds': self.revalidate_seconds,
+                'memory': self.memory,
+                'mode': BASELINE_MODE,
+                'partitions': len(self._dataset.partitions) if self._dataset is not None else 0,
+                'partitions_parsed': self.partitions_parsed,
+                'coalesced': self._flight.stats(),
+            }
+
+
+_baseline_cache = BaselineCache(revalidate_seconds=float(os.getenv("BASELINE_REVALIDATE_SECONDS", "5")))
+
+
+def _load_baseline_df():
+    """STRICT: load only 'BaseLine.xlsx' from Azure (through the version-keyed cache). Raises if inaccessible."""
+    return _baseline_cache.get()
+
+
+def load_baseline_dataset() -> BaselineDataset:
+    """STRICT: the cached BaselineDataset for the current BaseLine.xlsx version. Raises if inaccessible."""
+    return _baseline_cache.get_dataset()
+
+
+def refresh_baseline_dataset() -> BaselineDataset:
+    """Revalidate against storage now (ignoring the revalidate window) and return the current dataset."""
+    _baseline_cache.invalidate()
+    return _baseline_cache.get_dataset()
+
+
+def get_baseline_cache_stats():
+    """Hit/miss counters and current version of the BaseLine cache."""
+    return _baseline_cache.stats()
 
 
 # -------------------- STATS HELPERS --------------------
@@ -168,106 +1390,617 @@ def calculate_box_plot_stats(values):
     }
 
 
-# -------------------- CORE EXTRACTORS (STRICT) --------------------
-def extract_chart_data():
-    """Extract chart data from strictly-loaded BaseLine.xlsx."""
-    parameter_mapping = {
-        'PCE': 'PCE (%)',
-        'FF': 'FF (%)',
-        'Max Power': 'Max Power (mW/cm2)',
-        'HI': 'HI (%)',
-        'I_sc': 'J_sc (mA/cm2)',
-        'V_oc': 'V_oc (V)',
-        'R_series': 'R_series (Ohm.cm2)',
-        'R_shunt': 'R_shunt (Ohm.cm2)'
-    }
-    empty_stats = {'min': 0, 'q1': 0, 'median': 0, 'q3': 0, 'max': 0, 'mean': 0, 'std': 0, 'count': 0}
-    chart_data = {k: [] for k in parameter_mapping}
+def _group_codes(series: pd.Series):
+    """Factorize a grouping column in order of first appearance (missing values get code -1)."""
+    codes, uniques = pd.factorize(series, sort=False)
+    return codes, uniques
+
+
+def _numeric_values(series: pd.Series) -> np.ndarray:
+    """Column as float64 with non-numeric cells as NaN (same coercion as pd.to_numeric(errors='coerce'))."""
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _near_rounding_tie(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """True where round(x, ndigits) could differ between float and exact arithmetic."""
+    scaled = np.abs(x) * 10 ** ndigits
+    return np.abs(scaled - np.floor(scaled) - 0.5) < 1e-9 * np.maximum(scaled, 1)
+
+
+def grouped_box_plot_stats(values: np.ndarray, codes: np.ndarray, n_groups: int):
+    """
+    Vectorized calculate_box_plot_stats for every group at once.
+
+    `values` are float64 (NaN = missing), `codes` the group of each row (-1 = no group).
+    Quartiles follow statistics.quantiles' default 'exclusive' method and the n < 4 fallback,
+    so results match calculate_box_plot_stats. Returns one stats dict (or None if empty) per group.
+    """
+    valid = ~np.isnan(values) & (codes >= 0)
+    v = values[valid]
+    c = codes[valid]
+    order = np.lexsort((v, c))
+    v, c = v[order], c[order]
+    if len(v) == 0:
+        return [None] * n_groups
 
-    df = _load_baseline_df()  # <-- will raise if BaseLine.xlsx not accessible
-    print(f"✅ Excel loaded. Shape: {df.shape}")
+    n = np.bincount(c, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    has = n > 0
+    vmin = v[np.minimum(starts, len(v) - 1)]
+    vmax = v[np.clip(starts + n - 1, 0, len(v) - 1)]
+
+    # statistics.quantiles(method='exclusive', n=4): m = n + 1, j = i*m // 4, delta = i*m - 4j
+    def exclusive_quartile(i):
+        m = n + 1
+        j = (i * m) // 4
+        delta = i * m - j * 4
+        lo = v[np.clip(starts + j - 1, 0, len(v) - 1)]
+        hi = v[np.clip(starts + j, 0, len(v) - 1)]
+        return (lo * (4 - delta) + hi * delta) / 4
+
+    # statistics.median for the n < 4 fallback
+    mid = starts + n // 2
+    odd_median = v[np.clip(mid, 0, len(v) - 1)]
+    even_median = (v[np.clip(mid - 1, 0, len(v) - 1)] + odd_median) / 2
+    small_median = np.where(n % 2 == 1, odd_median, even_median)
+
+    big = n >= 4
+    q1 = np.where(big, exclusive_quartile(1), vmin)
+    q2 = np.where(big, exclusive_quartile(2), small_median)
+    q3 = np.where(big, exclusive_quartile(3), vmax)
+
+    sums = np.bincount(c, weights=v, minlength=n_groups)
+    means = np.divide(sums, n, out=np.zeros(n_groups), where=has)
+    sq_dev = np.bincount(c, weights=(v - means[c]) ** 2, minlength=n_groups)
+    stds = np.sqrt(np.divide(sq_dev, n - 1, out=np.zeros(n_groups), where=n > 1))
+
+    # statistics.mean/stdev are exact; only where float error could flip the rounding do we need them
+    for g in np.flatnonzero(has & (_near_rounding_tie(means, 2) | _near_rounding_tie(stds, 2))):
+        group_values = v[starts[g]:starts[g] + n[g]].tolist()
+        means[g] = mean(group_values)
+        stds[g] = stdev(group_values) if n[g] > 1 else 0
+
+    out = []
+    for g in range(n_groups):
+        if not has[g]:
+            out.append(None)
+            continue
+        out.append({
+            'min': round(float(vmin[g]), 2),
+            'q1': round(float(q1[g]), 2),
+            'median': round(float(q2[g]), 2),
+            'q3': round(float(q3[g]), 2),
+            'max': round(float(vmax[g]), 2),
+            'mean': round(float(means[g]), 2),
+            'std': round(float(stds[g]), 2),
+            'count': int(n[g]) / 4  # preserved from calculate_box_plot_stats
+        })
+    return out
+
+
+def sketch_box_plot_stats(sketches: CellSketches, cell_group: np.ndarray, n_groups: int):
+    """
+    Approximate grouped_box_plot_stats from merged per-cell sketches: quartiles within the sketch's
+    relative accuracy, min/max/mean/std/count from exact moments (std and mean without the exact
+    rounding fallback). Same output shape: one stats dict (or None if empty) per group.
+    """
+    summary = sketches.summarize(cell_group, n_groups, (0.25, 0.5, 0.75))
+    out = []
+    for g in range(n_groups):
+        n = int(summary['n'][g])
+        if n == 0:
+            out.append(None)
+            continue
+        q1, q2, q3 = summary['quantiles'][g]
+        if n < 4:  # calculate_box_plot_stats' small-sample fallback
+            q1, q3 = summary['min'][g], summary['max'][g]
+        out.append({
+            'min': round(float(summary['min'][g]), 2),
+            'q1': round(float(q1), 2),
+            'median': round(float(q2), 2),
+            'q3': round(float(q3), 2),
+            'max': round(float(summary['max'][g]), 2),
+            'mean': round(float(summary['mean'][g]), 2),
+            'std': round(float(summary['std'][g]), 2),
+            'count': n / 4  # preserved from calculate_box_plot_stats
+        })
+    return out
+
+
+def grouped_means(values: np.ndarray, codes: np.ndarray, n_groups: int, ndigits: int) -> np.ndarray:
+    """Per-group mean of non-NaN values (NaN for empty groups); exact where rounding to `ndigits` is at stake."""
+    valid = ~np.isnan(values) & (codes >= 0)
+    v, c = values[valid], codes[valid]
+    n = np.bincount(c, minlength=n_groups)
+    sums = np.bincount(c, weights=v, minlength=n_groups)
+    means = np.divide(sums, n, out=np.full(n_groups, np.nan), where=n > 0)
+    for g in np.flatnonzero((n > 0) & _near_rounding_tie(means, ndigits)):
+        means[g] = mean(v[c == g].tolist())
+    return means
+
+
+def grouped_mean_cv(values: np.ndarray, codes: np.ndarray, n_groups: int):
+    """
+    Per-group (avg, cv) as the IV repeatability chart reports them: avg = round(mean, 3),
+    cv = round(stdev / avg * 100, 3) (0 for single values or avg == 0); (0, 0) for empty groups.
+    """
+    valid = ~np.isnan(values) & (codes >= 0)
+    v, c = values[valid], codes[valid]
+    n = np.bincount(c, minlength=n_groups)
+    sums = np.bincount(c, weights=v, minlength=n_groups)
+    means = np.divide(sums, n, out=np.zeros(n_groups), where=n > 0)
+    sq_dev = np.bincount(c, weights=(v - means[c]) ** 2, minlength=n_groups)
+    stds = np.sqrt(np.divide(sq_dev, n - 1, out=np.zeros(n_groups), where=n > 1))
+
+    results = []
+    for g in range(n_groups):
+        if n[g] == 0:
+            results.append((0, 0))
+            continue
+        avg = float(means[g])
+        has_cv = n[g] > 1 and round(avg, 3) != 0
+        cv = float(stds[g]) / round(avg, 3) * 100 if has_cv else 0
+        if _near_rounding_tie(np.array([avg, cv]), 3).any():
+            # statistics.mean/stdev are exact; use them where float error could flip the rounding
+            group_values = v[c == g].tolist()
+            avg = mean(group_values)
+            has_cv = n[g] > 1 and round(avg, 3) != 0
+            cv = stdev(group_values) / round(avg, 3) * 100 if has_cv else 0
+        results.append((round(avg, 3), round(cv, 3) if has_cv else 0))
+    return results
+
+
+def grouped_aggregates(values: np.ndarray, codes: np.ndarray, n_groups: int, aggregations) -> dict:
+    """
+    Per-group aggregations of non-NaN values in one vectorized pass: count, mean, std (sample),
+    cv (std / mean * 100), min, max, median and pNN quantiles ('exclusive' positions like
+    statistics.quantiles). Returns {aggregation: array}; NaN where a group has too few values.
+    """
+    valid = ~np.isnan(values) & (codes >= 0)
+    v, c = values[valid], codes[valid]
+    n = np.bincount(c, minlength=n_groups)
+    means = np.divide(np.bincount(c, weights=v, minlength=n_groups), n, out=np.full(n_groups, np.nan), where=n > 0)
+    out = {}
+    if {'std', 'cv'} & set(aggregations):
+        m2 = np.bincount(c, weights=(v - means[c]) ** 2, minlength=n_groups)
+        stds = np.sqrt(np.divide(m2, n - 1, out=np.full(n_groups, np.nan), where=n > 1))
+    quantile_aggs = [a for a in aggregations if a == 'median' or a.startswith('p')]
+    if quantile_aggs and len(v):
+        order = np.lexsort((v, c))
+        sorted_v = v[order]
+        starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+
+    for agg in aggregations:
+        if agg == 'count':
+            out[agg] = n
+        elif agg == 'mean':
+            out[agg] = means
+        elif agg == 'std':
+            out[agg] = stds
+        elif agg == 'cv':
+            out[agg] = np.divide(stds * 100, means, out=np.full(n_groups, np.nan), where=(n > 1) & (means != 0))
+        elif agg in ('min', 'max'):
+            extreme = np.full(n_groups, np.inf if agg == 'min' else -np.inf)
+            (np.minimum if agg == 'min' else np.maximum).at(extreme, c, v)
+            out[agg] = np.where(n > 0, extreme, np.nan)
+        elif not len(v):
+            out[agg] = np.full(n_groups, np.nan)
+        else:
+            p = 0.5 if agg == 'median' else float(agg[1:]) / 100
+            # statistics.quantiles(method='exclusive'): j = floor(p * (n + 1)) clamped to 1 .. n-1
+            m = p * (n + 1)
+            j = np.clip(np.floor(m), 1, np.maximum(n - 1, 1)).astype(np.intp)
+            delta = np.where(n > 1, m - j, 0.0)
+            lo = sorted_v[np.clip(starts + j - 1, 0, len(sorted_v) - 1)]
+            hi = sorted_v[np.clip(starts + np.minimum(j, n - 1), 0, len(sorted_v) - 1)]
+            out[agg] = np.where(n > 0, lo + delta * (hi - lo), np.nan)
+    return out
 
-    batch_column = next((c for c in df.columns if 'batch' in str(c).lower() or 'id' in str(c).lower()), None)
-    batches = df[batch_column].unique() if batch_column else ['Baseline']
-    colmap = {str(c).upper(): c for c in df.columns}
 
-    for param, col in parameter_mapping.items():
+def exclusive_quantile(sorted_values: np.ndarray, i: int, n: int) -> float:
+    """The i-th of statistics.quantiles(data, n=n) (default 'exclusive' method) over pre-sorted values."""
+    ld = len(sorted_values)
+    if ld < 2:
+        raise StatisticsError('must have at least two data points')
+    m = ld + 1
+    j = i * m // n
+    j = 1 if j < 1 else ld - 1 if j > ld - 1 else j  # clamp to 1 .. ld-1
+    delta = i * m - j * n
+    return (float(sorted_values[j - 1]) * (n - delta) + float(sorted_values[j]) * delta) / n
+
+
+def histogram_edges(values: np.ndarray, bins='fd') -> np.ndarray:
+    """
+    Shared bin edges over finite `values`: `bins` equal-width bins, or Freedman-Diaconis width
+    (2 * IQR / n^(1/3), Sturges when the IQR is 0). Never more than HISTOGRAM_MAX_BINS bins.
+    """
+    lo, hi = float(values.min()), float(values.max())
+    if lo == hi:
+        return np.array([lo - 0.5, hi + 0.5])
+    if bins == 'fd':
+        q1, q3 = np.percentile(values, [25, 75])
+        width = 2 * (q3 - q1) / len(values) ** (1 / 3)
+        n_bins = int(np.ceil((hi - lo) / width)) if width > 0 else int(np.ceil(np.log2(len(values)))) + 1
+    else:
+        n_bins = int(bins)
+    return np.linspace(lo, hi, min(max(n_bins, 1), HISTOGRAM_MAX_BINS) + 1)
+
+
+def grouped_histograms(values: np.ndarray, codes: np.ndarray, n_groups: int, edges: np.ndarray) -> np.ndarray:
+    """(n_groups, n_bins) counts of non-NaN values per group in one bincount (last bin closed, like np.histogram)."""
+    n_bins = len(edges) - 1
+    valid = ~np.isnan(values) & (codes >= 0)
+    bin_of = np.clip(np.searchsorted(edges, values[valid], side='right') - 1, 0, n_bins - 1)
+    flat = np.bincount(codes[valid] * n_bins + bin_of, minlength=n_groups * n_bins)
+    return flat.reshape(n_groups, n_bins)
+
+
+def grouped_ecdf(values: np.ndarray, codes: np.ndarray, n_groups: int, points: int) -> list:
+    """Per group, at most `points` (value, cumulative fraction) pairs evenly spaced over the sorted values."""
+    valid = ~np.isnan(values) & (codes >= 0)
+    v, c = values[valid], codes[valid]
+    order = np.lexsort((v, c))
+    v, c = v[order], c[order]
+    counts = np.bincount(c, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = []
+    for g in range(n_groups):
+        n = int(counts[g])
+        if n == 0:
+            result.append([])
+            continue
+        idx = np.unique(np.round(np.linspace(0, n - 1, min(points, n))).astype(np.intp))
+        result.append([[round(float(x), 6), round(float(i + 1) / n, 6)] for x, i in zip(v[starts[g] + idx], idx)])
+    return result
+
+
+def _find_batch_column(columns):
+    return next((c for c in columns if 'batch' in str(c).lower() or 'id' in str(c).lower()), None)
+
+
+def _find_date_column(columns):
+    return next((c for c in columns if 'date' in str(c).lower()), None)
+
+
+def _resolve_chart_columns(columns, verbose: bool = True) -> dict:
+    """Map each chart parameter to a column: exact (case-insensitive) name first, then fuzzy substring."""
+    colmap = {str(c).upper(): c for c in columns}
+    resolved = {}
+    for param, col in PARAMETER_MAPPING.items():
         col_key = colmap.get(col.upper())
         if not col_key:
             # Try fuzzy match
-            for alt in df.columns:
+            for alt in columns:
                 if param.lower() in str(alt).lower():
                     col_key = alt
-                    print(f"✅ Using alternative for {param}: {alt}")
+                    if verbose:
+                        print(f"✅ Using alternative for {param}: {alt}")
                     break
+        resolved[param] = col_key
+    return resolved
+
+
+# -------------------- CORE EXTRACTORS (STRICT) --------------------
+DASHBOARD_SECTIONS = ('chart_data', 'device_yield', 'iv_repeatability')
+
+
+def select_parameters(parameters=None) -> list:
+    """Validate an optional parameter subset; result keeps PARAMETER_MAPPING order."""
+    if not parameters:
+        return list(PARAMETER_MAPPING)
+    unknown = [p for p in parameters if p not in PARAMETER_MAPPING]
+    if unknown:
+        raise ValueError(f"Invalid parameter(s): {unknown}")
+    return [p for p in PARAMETER_MAPPING if p in parameters]
+
+
+SORT_ORDERS = ('asc', 'desc')
+
+
+def parse_row_filters(batches=None, start=None, end=None, last_batches=None, sort=None) -> dict:
+    """
+    Normalize chart filter arguments (strings from a query string or Python values) into
+    {'batches': [str] | None, 'start': date | None, 'end': date | None, 'last_batches': int | None,
+     'sort': 'asc' | 'desc' | None}. Raises ValueError on invalid input.
+    """
+    if isinstance(batches, str):
+        batches = [b.strip() for b in batches.split(',') if b.strip()]
+    if batches is not None:
+        batches = list(dict.fromkeys(str(b) for b in batches))
+
+    def as_date(value, name):
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        try:
+            return date.fromisoformat(str(value).strip())
+        except ValueError:
+            raise ValueError(f"{name} must be a date like 2025-01-31, got {value!r}")
+
+    start, end = as_date(start, 'start'), as_date(end, 'end')
+    if start and end and start > end:
+        raise ValueError("start must not be after end")
+
+    if last_batches is not None and last_batches != '':
+        try:
+            last_batches = int(last_batches)
+        except (TypeError, ValueError):
+            last_batches = -1
+        if last_batches < 1:
+            raise ValueError("last_batches must be a positive integer")
+    else:
+        last_batches = None
+
+    sort = (sort or '').strip().lower() or None
+    if sort is not None and sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_ORDERS)}")
+
+    return {'batches': batches, 'start': start, 'end': end, 'last_batches': last_batches, 'sort': sort}
+
+
+def _group_labels(dataset: BaselineDataset, rows: np.ndarray):
+    """(sorted batch labels, sorted ISO days) touched by some row positions"""
+    batches, days = set(), set()
+    if dataset.batch_column and len(rows):
+        batches = {str(b) for b in pd.unique(dataset.df[dataset.batch_column].take(rows)) if not pd.isna(b)}
+    partitions = dataset.day_partitions()
+    if partitions is not None and len(rows):
+        row_days = dataset.row_days()[rows]
+        days = {partitions['days'][d].isoformat() for d in np.unique(row_days[row_days >= 0])}
+    return batches, days
+
+
+def diff_baseline_datasets(previous: BaselineDataset, current: BaselineDataset) -> dict:
+    """
+    Row-level diff of two BaseLine versions. Rows are matched on their identity (see row_identities);
+    a matched row is 'changed' when any of its values differ. Returns counts plus the batches and days
+    whose rows were added, removed or changed -- the only groups whose aggregates can differ.
+    A changed column layout marks every group changed.
+    """
+    old_ids, new_ids = previous.row_identities(), current.row_identities()
+    _, old_at, new_at = np.intersect1d(old_ids, new_ids, assume_unique=True, return_indices=True)
+    differs = previous.row_hashes()[old_at] != current.row_hashes()[new_at]
+    added = np.setdiff1d(np.arange(len(new_ids)), new_at)
+    removed = np.setdiff1d(np.arange(len(old_ids)), old_at)
+    columns_changed = [str(c) for c in previous.df.columns] != [str(c) for c in current.df.columns]
+
+    if columns_changed:
+        old_rows, new_rows = np.arange(len(old_ids)), np.arange(len(new_ids))
+    else:
+        old_rows, new_rows = np.concatenate((removed, old_at[differs])), np.concatenate((added, new_at[differs]))
+    old_batches, old_days = _group_labels(previous, old_rows)
+    new_batches, new_days = _group_labels(current, new_rows)
+    return {
+        'version': current.version,
+        'previous_version': previous.version,
+        'identity': list(DIFF_IDENTITY_COLUMNS) + ['day'],
+        'rows': len(new_ids),
+        'added': int(len(added)),
+        'removed': int(len(removed)),
+        'changed': int(differs.sum()),
+        'unchanged': int(len(new_at) - differs.sum()),
+        'columns_changed': columns_changed,
+        'changed_batches': sorted(old_batches | new_batches),
+        'changed_days': sorted(old_days | new_days),
+    }
+
+
+def summarize_batches(dataset: BaselineDataset, slots) -> dict:
+    """
+    Batch-level figures of the dashboard for some batch slots (see batch_hashes), per metric column:
+    {'box': box-plot stats or None, 'mean': exact-rounding mean or None, 'n': values, 'tail': lowest values}.
+    Computed over only those batches' rows, in one grouped pass per column.
+    """
+    codes, uniques = dataset.batch_groups()
+    n_slots = len(uniques) + 1
+    slots = sorted(set(slots))
+    row_sets = [np.flatnonzero(codes < 0) if slot == 0 else dataset._rows_of_batches([slot - 1]) for slot in slots]
+    rows = np.sort(np.concatenate(row_sets)) if row_sets else np.empty(0, dtype=np.intp)
+    slot_codes = codes[rows] + 1
+
+    columns = {c for c in list(dataset.chart_columns().values()) + list(dataset.exact_columns().values()) if c}
+    out = {slot: {} for slot in slots}
+    for col in columns:
+        values = dataset.numeric(col, rows)
+        box = grouped_box_plot_stats(values, slot_codes, n_slots)
+        means = grouped_means(values, slot_codes, n_slots, ndigits=3)
+        valid = ~np.isnan(values)
+        v, c = values[valid], slot_codes[valid]
+        order = np.lexsort((v, c))
+        v, c = v[order], c[order]
+        n = np.bincount(c, minlength=n_slots)
+        starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+        for slot in slots:
+            k = min(int(n[slot]), int(np.ceil(n[slot] * YIELD_TAIL_FRACTION)) + 2)
+            out[slot][col] = {
+                'box': box[slot],
+                'mean': None if np.isnan(means[slot]) else float(means[slot]),
+                'n': int(n[slot]),
+                'tail': v[starts[slot]:starts[slot] + k].tolist(),
+            }
+    return out
+
+
+def yield_quantile_from_summaries(summaries: dict, column) -> float:
+    """
+    The exact 2.5% quantile (first of 40 'exclusive' quantiles) of a column over all batches, from the
+    per-batch tails; None when the tails cannot prove it (a truncated tail ends below the answer).
+    """
+    parts = [s[column] for s in summaries.values() if column in s]
+    total = sum(p['n'] for p in parts)
+    if total < 2:
+        return None
+    m = total + 1
+    j = min(max(m // 40, 1), total - 1)
+    union = np.sort(np.concatenate([np.asarray(p['tail'], dtype=np.float64) for p in parts]))
+    if len(union) < j + 1:
+        return None
+    if any(len(p['tail']) < p['n'] and p['tail'][-1] < union[j] for p in parts):
+        return None
+    delta = m - j * 40
+    return (float(union[j - 1]) * (40 - delta) + float(union[j]) * delta) / 40
+
+
+def _resolve_quantile_mode(quantile_mode) -> str:
+    quantile_mode = (quantile_mode or QUANTILE_MODE).lower()
+    if quantile_mode not in QUANTILE_MODES:
+        raise ValueError(f"quantile mode must be one of {', '.join(QUANTILE_MODES)}")
+    return quantile_mode
+
+
+def _cell_groups(dataset: BaselineDataset, filters: dict, per_batch: bool) -> np.ndarray:
+    """Group of every (batch, day) cell `filters` select: its batch code (per_batch) or 0; -1 when not selected."""
+    batch_ok, day_ok = dataset.select_cells(filters)
+    slots = dataset.cells()['batches']
+    group = np.arange(slots) - 1 if per_batch else np.zeros(slots, dtype=np.intp)
+    return np.where(batch_ok[:, None] & day_ok[None, :], group[:, None], -1).ravel()
+
+
+def _sorted_labels(labels, sort):
+    """Apply an explicit sort order to (label, ...) tuples; None keeps the extractor's own order."""
+    if sort is None:
+        return labels
+    return sorted(labels, key=lambda item: item[0], reverse=(sort == 'desc'))
+
+
+def compute_chart_data(dataset: BaselineDataset, parameters=None, filters: dict = None, quantile_mode: str = None,
+                       batch_summaries: dict = None) -> dict:
+    """
+    Box-plot stats per batch for each parameter (all batches in one grouped pass per parameter),
+    optionally over only the rows selected by `filters` (see parse_row_filters).
+    quantile_mode 'approx' merges per-cell sketches instead of sorting values (default: CHART_QUANTILES).
+    Unfiltered exact stats are taken from `batch_summaries` (slot -> summarize_batches entry) when given.
+    """
+    params = select_parameters(parameters)
+    filters = filters or {}
+    approx = _resolve_quantile_mode(quantile_mode) == 'approx'
+    rows = dataset.select_rows(filters)
+    chart_data = {k: [] for k in params}
+    df = dataset.df
+
+    batch_column = dataset.batch_column
+    if batch_column:
+        # One entry per unique() value (incl. NaN, which matches no rows -> empty stats)
+        batches = (df[batch_column] if rows is None else df[batch_column].take(rows)).unique()
+        codes, uniques = dataset.batch_groups()
+        code_of = {u: i for i, u in enumerate(uniques)}
+        labels = [(str(b), code_of.get(b)) for b in batches]
+    else:
+        codes, uniques = np.zeros(len(df), dtype=np.intp), ['Baseline']
+        labels = [('Baseline', 0)]
+    labels = _sorted_labels(labels, filters.get('sort'))
+    if rows is not None:
+        codes = codes[rows]
+    cell_group = _cell_groups(dataset, filters, per_batch=True) if approx else None
+    summaries = batch_summaries if batch_column and rows is None and not approx else None
+
+    columns = dataset.chart_columns()
+    for param in params:
+        col_key = columns[param]
         if not col_key:
-            s = dict(empty_stats); s['batch'] = 'No Data'
+            s = dict(EMPTY_STATS); s['batch'] = 'No Data'
             chart_data[param].append(s)
             continue
 
-        if batch_column:
-            for b in batches:
-                vals = pd.to_numeric(df.loc[df[batch_column] == b, col_key], errors='coerce').dropna().tolist()
-                s = calculate_box_plot_stats(vals) if vals else dict(empty_stats)
-                s['batch'] = str(b)
-                chart_data[param].append(s)
+        if approx:
+            group_stats = sketch_box_plot_stats(dataset.sketches(col_key), cell_group, len(uniques))
+        elif summaries is not None:
+            group_stats = [summaries[c + 1][col_key]['box'] for c in range(len(uniques))]
         else:
-            vals = pd.to_numeric(df[col_key], errors='coerce').dropna().tolist()
-            s = calculate_box_plot_stats(vals) if vals else dict(empty_stats)
-            s['batch'] = 'Baseline'
+            group_stats = grouped_box_plot_stats(dataset.numeric(col_key, rows), codes, len(uniques))
+        for label, code in labels:
+            s = group_stats[code] if code is not None else None
+            s = dict(s) if s else dict(EMPTY_STATS)
+            s['batch'] = label
             chart_data[param].append(s)
 
     return chart_data
 
 
-def extract_device_yield_data():
-    """Extract device yield (2.5% quantiles + batch averages) strictly from BaseLine.xlsx."""
-    # Updated to include all 8 parameters matching charts_api.py
-    yield_parameters = {
-        'PCE': 'PCE (%)',
-        'FF': 'FF (%)',
-        'Max Power': 'Max Power (mW/cm2)',
-        'HI': 'HI (%)',
-        'I_sc': 'J_sc (mA/cm2)',
-        'V_oc': 'V_oc (V)',
-        'R_series': 'R_series (Ohm.cm2)',
-        'R_shunt': 'R_shunt (Ohm.cm2)'
-    }
-
-    df = _load_baseline_df()  # strict load
+def compute_device_yield_data(dataset: BaselineDataset, parameters=None, filters: dict = None,
+                              quantile_mode: str = None, batch_summaries: dict = None) -> dict:
+    """
+    Device yield (2.5% quantiles + batch averages) from a loaded dataset, optionally over filtered rows.
+    quantile_mode 'approx' answers both from merged per-cell sketches and moments; unfiltered exact
+    results come from `batch_summaries` when given (the quantile from their tails, if they prove it).
+    """
+    params = select_parameters(parameters)
+    filters = filters or {}
+    approx = _resolve_quantile_mode(quantile_mode) == 'approx'
+    df = dataset.df
 
-    batch_column = next((c for c in df.columns if 'batch' in str(c).lower() or 'id' in str(c).lower()), None)
+    batch_column = dataset.batch_column
     if not batch_column:
         raise ValueError("No batch column found for device yield analysis (strict mode).")
 
-    batches = sorted(df[batch_column].unique())
-    colmap = {str(c).upper(): c for c in df.columns}
+    rows = dataset.select_rows(filters)
+    batches = sorted((df[batch_column] if rows is None else df[batch_column].take(rows)).unique())
+    if filters.get('sort') == 'desc':
+        batches.reverse()
+    codes, uniques = dataset.batch_groups()
+    if rows is not None:
+        codes = codes[rows]
+    code_of = {u: i for i, u in enumerate(uniques)}
+    batch_codes = [code_of.get(b) for b in batches]
 
     result = {
-        'parameters': list(yield_parameters.keys()),
+        'parameters': params,
         'batches': [str(b) for b in batches],
         'quantiles': {},
         'batch_averages': {}
     }
 
-    for param, col_name in yield_parameters.items():
-        col_key = colmap.get(col_name.upper())
+    if approx:
+        global_group = _cell_groups(dataset, filters, per_batch=False)
+        batch_group = _cell_groups(dataset, filters, per_batch=True)
+    summaries = batch_summaries if rows is None and not approx else None
+
+    columns = dataset.exact_columns()
+    for param in params:
+        col_key = columns[param]
         if col_key is None:
-            print(f"⚠️ Column not found for {param}: {col_name}")
+            print(f"⚠️ Column not found for {param}: {PARAMETER_MAPPING[param]}")
+            continue
+
+        if approx:
+            sketches = dataset.sketches(col_key)
+            overall = sketches.summarize(global_group, 1, (1 / 40,))
+            if overall['n'][0] > 0:
+                result['quantiles'][param] = round(float(overall['quantiles'][0, 0]), 3)
+                means = sketches.summarize(batch_group, len(uniques))['mean']
+                result['batch_averages'][param] = [
+                    round(float(means[c]), 3) if c is not None and not np.isnan(means[c]) else 0
+                    for c in batch_codes
+                ]
+            else:
+                result['quantiles'][param] = 0
+                result['batch_averages'][param] = [0] * len(batches)
             continue
 
-        all_values = pd.to_numeric(df[col_key], errors='coerce').dropna().tolist()
+        q2_5 = yield_quantile_from_summaries(summaries, col_key) if summaries is not None else None
+        if q2_5 is not None:
+            q2_5 = round(q2_5, 3)
+            result['quantiles'][param] = q2_5
+            means = [summaries[c + 1][col_key]['mean'] if c is not None else None for c in batch_codes]
+            result['batch_averages'][param] = [round(m, 3) if m is not None else 0 for m in means]
+            print(f"✅ {param}: 2.5% quantile = {q2_5}, batch averages computed")
+            continue
+
+        values = dataset.numeric(col_key, rows)
+        all_values = np.sort(values[~np.isnan(values)])
         if len(all_values) > 0:
             # 2.5% quantile is first of 40-quantiles
-            q2_5 = round(quantiles(all_values, n=40)[0], 3)
+            q2_5 = round(exclusive_quantile(all_values, 1, 40), 3)
             result['quantiles'][param] = q2_5
 
-            batch_avgs = []
-            for b in batches:
-                vals = pd.to_numeric(df.loc[df[batch_column] == b, col_key], errors='coerce').dropna().tolist()
-                avg = round(mean(vals), 3) if vals else 0
-                batch_avgs.append(avg)
-            result['batch_averages'][param] = batch_avgs
+            means = grouped_means(values, codes, len(uniques), ndigits=3)
+            result['batch_averages'][param] = [
+                round(float(means[c]), 3) if c is not None and not np.isnan(means[c]) else 0
+                for c in batch_codes
+            ]
             print(f"✅ {param}: 2.5% quantile = {q2_5}, batch averages computed")
         else:
             result['quantiles'][param] = 0
@@ -276,79 +2009,359 @@ def extract_device_yield_data():
     return result
 
 
-def extract_iv_repeatability_data():
-    """Extract IV repeatability (daily avg + CV for last 10 days) strictly from BaseLine.xlsx."""
-    df = _load_baseline_df()  # strict load
+def compute_iv_repeatability_data(dataset: BaselineDataset, parameters=None, days: int = IV_WINDOW_DAYS,
+                                  filters: dict = None, reuse_days: dict = None) -> dict:
+    """
+    IV repeatability (daily avg + CV for the last `days` days) from a loaded dataset,
+    optionally over only the rows selected by `filters`.
+    Unfiltered, daily points found in `reuse_days` (ISO date -> point with every parameter) are kept
+    instead of recomputed; only the other days' rows are read.
+    """
+    params = select_parameters(parameters)
+    filters = filters or {}
+    if isinstance(days, bool) or not isinstance(days, (int, np.integer)) or days < 1:
+        raise ValueError(f"days must be a positive integer, got {days!r}")
 
-    date_column = next((c for c in df.columns if 'date' in str(c).lower()), None)
-    if not date_column:
+    partitions = dataset.day_partitions()
+    if partitions is None:
         raise ValueError("No date column found for IV repeatability analysis (strict mode).")
+    if not partitions['days']:
+        raise ValueError("No valid dates found (strict mode).")
 
-    colmap = {str(c).upper(): c for c in df.columns}
-    # Updated to include all 8 parameters matching charts_api.py
-    iv_parameters = {
-        'PCE': 'PCE (%)',
-        'FF': 'FF (%)',
-        'Max Power': 'Max Power (mW/cm2)',
-        'HI': 'HI (%)',
-        'I_sc': 'J_sc (mA/cm2)',
-        'V_oc': 'V_oc (V)',
-        'R_series': 'R_series (Ohm.cm2)',
-        'R_shunt': 'R_shunt (Ohm.cm2)'
-    }
+    columns = dataset.exact_columns()
 
-    # Convert to datetime (handles Excel serials)
-    if str(df[date_column].dtype) in ('float64', 'int64'):
-        try:
-            df[date_column] = pd.to_datetime(df[date_column], origin='1899-12-30', unit='D')
-        except Exception:
-            df[date_column] = pd.to_datetime(df[date_column], unit='D', origin='unix')
+    selected = dataset.select_rows(filters)
+    if selected is None:
+        # Only the rows of the last N day partitions are touched
+        window = partitions['days'][-days:]
+        bounds = partitions['bounds'][-len(window) - 1:]
+        rows = partitions['rows'][bounds[0]:]
+        codes = np.repeat(np.arange(len(window)), np.diff(bounds))
     else:
-        df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
+        # Last N of the days that still have rows after filtering
+        row_days = dataset.row_days()[selected]
+        selected, row_days = selected[row_days >= 0], row_days[row_days >= 0]
+        window_days = np.unique(row_days)[-days:]
+        keep = row_days >= window_days[0] if len(window_days) else np.zeros(len(row_days), dtype=bool)
+        rows = selected[keep]
+        codes = np.searchsorted(window_days, row_days[keep])
+        window = [partitions['days'][d] for d in window_days]
 
-    df = df.dropna(subset=[date_column])
-    if df.empty:
-        raise ValueError("No valid dates found (strict mode).")
-
-    df = df.sort_values(by=date_column)
-    df['date_only'] = df[date_column].dt.date
-    unique_dates = sorted(df['date_only'].unique())
-    last_10 = unique_dates[-10:] if len(unique_dates) >= 10 else unique_dates
-
-    daily_data = []
-    for d in last_10:
-        day_df = df[df['date_only'] == d]
-        point = {'date': d.strftime('%Y-%m-%d'), 'date_short': d.strftime('%m/%d')}
-
-        for param, col_name in iv_parameters.items():
-            col_key = colmap.get(col_name.upper())
-            if col_key and col_key in day_df.columns:
-                vals = pd.to_numeric(day_df[col_key], errors='coerce').dropna()
-                if len(vals) > 0:
-                    avg = round(mean(vals), 3)
-                    cv = round((stdev(vals) / avg * 100), 3) if len(vals) > 1 and avg != 0 else 0
-                    point[f'{param}_avg'] = avg
-                    point[f'{param}_cv'] = cv
-                else:
-                    point[f'{param}_avg'] = 0
-                    point[f'{param}_cv'] = 0
-            else:
-                point[f'{param}_avg'] = 0
-                point[f'{param}_cv'] = 0
-
-        daily_data.append(point)
+    daily_data = [{'date': d.strftime('%Y-%m-%d'), 'date_short': d.strftime('%m/%d')} for d in window]
+    reused = np.zeros(len(window), dtype=bool)
+    if reuse_days and selected is None:
+        keys = [f'{p}_{k}' for p in params for k in ('avg', 'cv')]
+        for i, point in enumerate(daily_data):
+            previous = reuse_days.get(point['date'])
+            if previous is not None and all(k in previous for k in keys):
+                point.update({k: previous[k] for k in keys})
+                reused[i] = True
+        keep = ~reused[codes]
+        rows, codes = rows[keep], codes[keep]
+    for param in params:
+        col_key = columns[param]
+        if col_key is not None:
+            stats = grouped_mean_cv(dataset.numeric(col_key, rows), codes, len(window))
+        else:
+            stats = [(0, 0)] * len(window)
+        for point, (avg, cv), kept in zip(daily_data, stats, reused):
+            if not kept:
+                point[f'{param}_avg'] = avg
+                point[f'{param}_cv'] = cv
+    if filters.get('sort') == 'desc':
+        daily_data.reverse()
 
     print(f"✅ Processed {len(daily_data)} days of IV repeatability data")
     return {
         'dates': [p['date'] for p in daily_data],
         'repeatability_data': daily_data,
-        'parameters': ['PCE', 'FF', 'Max Power', 'HI', 'I_sc', 'V_oc', 'R_series', 'R_shunt']  # Updated to match charts_api.py
+        'parameters': params
+    }
+
+
+def extract_chart_data(parameters=None, filters: dict = None):
+    """Extract chart data from strictly-loaded BaseLine.xlsx (optionally only some parameters)."""
+    dataset = load_baseline_dataset()  # <-- will raise if BaseLine.xlsx not accessible
+    print(f"✅ Excel loaded. Shape: {dataset.df.shape}")
+    return compute_chart_data(dataset, parameters, filters)
+
+
+def extract_device_yield_data(parameters=None, filters: dict = None):
+    """Extract device yield (2.5% quantiles + batch averages) strictly from BaseLine.xlsx."""
+    return compute_device_yield_data(load_baseline_dataset(), parameters, filters)
+
+
+def extract_iv_repeatability_data(parameters=None, days: int = IV_WINDOW_DAYS, filters: dict = None):
+    """Extract IV repeatability (daily avg + CV for the last `days` days) strictly from BaseLine.xlsx."""
+    return compute_iv_repeatability_data(load_baseline_dataset(), parameters, days, filters)
+
+
+def compute_histogram_data(dataset: BaselineDataset, parameter, bins='fd', ecdf_points: int = 0,
+                           filters: dict = None) -> dict:
+    """
+    Per-batch histograms of one parameter over shared bin edges (fixed count or 'fd'), plus an
+    optional downsampled ECDF. Output size is bounded by batches x (bins + ECDF points), not rows.
+    """
+    if parameter not in PARAMETER_MAPPING:
+        raise ValueError(f"Unknown parameter: {parameter}")
+    if bins != 'fd' and (isinstance(bins, bool) or not isinstance(bins, (int, np.integer))
+                         or not 1 <= bins <= HISTOGRAM_MAX_BINS):
+        raise ValueError(f"bins must be 'fd' or an integer from 1 to {HISTOGRAM_MAX_BINS}")
+    if isinstance(ecdf_points, bool) or not isinstance(ecdf_points, (int, np.integer)) \
+            or not 0 <= ecdf_points <= HISTOGRAM_MAX_ECDF_POINTS:
+        raise ValueError(f"ecdf must be an integer from 0 to {HISTOGRAM_MAX_ECDF_POINTS}")
+
+    filters = filters or {}
+    col_key = dataset.chart_columns()[parameter]
+    result = {'parameter': parameter, 'binning': bins if bins == 'fd' else 'fixed', 'edges': [], 'batches': []}
+    if not col_key:
+        return result
+
+    rows = dataset.select_rows(filters)
+    values = dataset.numeric(col_key, rows)
+    if dataset.batch_column:
+        codes, uniques = dataset.batch_groups()
+        if rows is not None:
+            codes = codes[rows]
+    else:
+        codes, uniques = np.zeros(len(values), dtype=np.intp), ['Baseline']
+
+    present = values[~np.isnan(values) & (codes >= 0)]
+    if len(present) == 0:
+        return result
+
+    edges = histogram_edges(present, bins)
+    rounded = np.round(edges, 6)
+    if np.all(np.diff(rounded) > 0):
+        edges = rounded  # bin against exactly the edges that are reported
+    counts = grouped_histograms(values, codes, len(uniques), edges)
+    ecdf = grouped_ecdf(values, codes, len(uniques), ecdf_points) if ecdf_points else None
+
+    labels = _sorted_labels([(str(u), g) for g, u in enumerate(uniques) if counts[g].sum() > 0], filters.get('sort'))
+    result['edges'] = [float(e) for e in edges]
+    for label, g in labels:
+        entry = {'batch': label, 'count': int(counts[g].sum()), 'counts': counts[g].tolist()}
+        if ecdf is not None:
+            entry['ecdf'] = ecdf[g]
+        result['batches'].append(entry)
+    return result
+
+
+def _query_list(value) -> list:
+    items = value.split(',') if isinstance(value, str) else list(value or [])
+    out = []
+    for item in (str(i).strip() for i in items):
+        if item and item not in out:
+            out.append(item)
+    return out
+
+
+def parse_aggregation_query(group_by=None, metrics=None, aggregations=None) -> dict:
+    """
+    Normalize raw query values (comma-separated strings or lists) into {'group_by', 'metrics', 'aggregations'}.
+    Quantiles are written pNN (p2.5, p25, ...) and normalized, so equal queries get equal keys.
+    Raises ValueError with a user-facing message.
+    """
+    dims = [d.lower() for d in _query_list(group_by)]
+    invalid = [d for d in dims if d not in QUERY_DIMENSIONS]
+    if invalid:
+        raise ValueError(f"Invalid group_by: {', '.join(invalid)}. Use: {', '.join(QUERY_DIMENSIONS)}")
+
+    metric_list = _query_list(metrics)
+    if not metric_list:
+        raise ValueError("metrics is required (e.g. metrics=PCE,FF)")
+    if len(metric_list) > QUERY_MAX_METRICS:
+        raise ValueError(f"At most {QUERY_MAX_METRICS} metrics per query")
+
+    aggs = []
+    for agg in [a.lower() for a in _query_list(aggregations)] or ['count', 'mean']:
+        if agg.startswith('p') and agg not in QUERY_AGGREGATIONS:
+            try:
+                p = float(agg[1:])
+            except ValueError:
+                p = -1
+            if not 0 < p < 100:
+                raise ValueError(f"Invalid quantile '{agg}': use p<percent> with 0 < percent < 100, e.g. p2.5")
+            agg = f"p{p:g}"
+        elif agg not in QUERY_AGGREGATIONS:
+            raise ValueError(f"Invalid aggregation '{agg}'. Use: {', '.join(QUERY_AGGREGATIONS)} or pNN")
+        if agg not in aggs:
+            aggs.append(agg)
+    return {'group_by': dims, 'metrics': metric_list, 'aggregations': aggs}
+
+
+def compute_aggregation_query(dataset: BaselineDataset, query: dict, filters: dict = None) -> dict:
+    """
+    Run a normalized aggregation query (see parse_aggregation_query) as one grouped pass per metric
+    over the rows selected by `filters`. Groups come out in label order (reversed for sort=desc);
+    each group row holds its dimension labels and '<metric>_<aggregation>' values (None when undefined).
+    Raises ValueError when the query exceeds QUERY_MAX_ROWS / QUERY_MAX_GROUPS.
+    """
+    filters = filters or {}
+    rows = dataset.select_rows(filters)
+    n_rows = len(dataset.df) if rows is None else len(rows)
+    if n_rows > QUERY_MAX_ROWS:
+        raise ValueError(f"Query selects {n_rows} rows (limit {QUERY_MAX_ROWS}); narrow it with batch/date filters")
+    columns = [dataset.metric_column(m) for m in query['metrics']]
+
+    dims = [dataset.dimension(d) for d in query['group_by']]
+    if dims:
+        codes = [c if rows is None else c[rows] for c, _ in dims]
+        valid = np.logical_and.reduce([c >= 0 for c in codes])
+        sizes = [len(labels) for _, labels in dims]
+        composite = np.ravel_multi_index(tuple(np.where(valid, c, 0) for c in codes), sizes)
+        keys, inverse = np.unique(composite[valid], return_inverse=True)
+        group = np.full(n_rows, -1, dtype=np.intp)
+        group[valid] = inverse
+        key_codes = np.unravel_index(keys, sizes)
+    else:
+        keys = np.zeros(1 if n_rows else 0)
+        group = np.zeros(n_rows, dtype=np.intp)
+        key_codes = ()
+    n_groups = len(keys)
+    if n_groups > QUERY_MAX_GROUPS:
+        raise ValueError(f"Query produces {n_groups} groups (limit {QUERY_MAX_GROUPS}); "
+                         f"group by fewer columns or add filters")
+
+    groups = [
+        {name: labels[key_codes[d][g]] for d, (name, (_, labels)) in enumerate(zip(query['group_by'], dims))}
+        for g in range(n_groups)
+    ]
+    for metric, column in zip(query['metrics'], columns):
+        stats = grouped_aggregates(dataset.numeric(column, rows), group, n_groups, query['aggregations'])
+        for agg, values in stats.items():
+            key = f"{metric}_{agg}"
+            for g, value in enumerate(values.tolist()):
+                groups[g][key] = value if agg == 'count' else (None if np.isnan(value) else round(value, 6))
+    if filters.get('sort') == 'desc':
+        groups.reverse()
+
+    return dict(query, rows=int(n_rows), group_count=n_groups, groups=groups)
+
+
+def quantile_error_report(dataset: BaselineDataset, parameters=None, filters: dict = None) -> dict:
+    """
+    Approximate (sketch) vs exact quantiles on one dataset, as the chart endpoints return them:
+    per parameter the largest / mean error of the per-batch q1, median and q3 and the 2.5% yield
+    quantile of both modes, plus how long each mode took (sketches are built before timing).
+    """
+    params = select_parameters(parameters)
+    started = time.perf_counter()
+    for col_key in {dataset.chart_columns()[p] for p in params} | {dataset.exact_columns()[p] for p in params}:
+        if col_key:
+            dataset.sketches(col_key)
+    sketch_seconds = time.perf_counter() - started
+
+    timings, results = {}, {}
+    for mode in QUANTILE_MODES:
+        started = time.perf_counter()
+        results[mode] = (compute_chart_data(dataset, params, filters, mode),
+                         compute_device_yield_data(dataset, params, filters, mode))
+        timings[mode] = round(time.perf_counter() - started, 4)
+
+    report = {
+        'version': dataset.version,
+        'quantile_mode': QUANTILE_MODE,
+        'relative_accuracy': SKETCH_RELATIVE_ACCURACY,
+        'sketch_build_seconds': round(sketch_seconds, 4),
+        'exact_seconds': timings['exact'],
+        'approx_seconds': timings['approx'],
+        'parameters': {},
     }
+    (exact_chart, exact_yield), (approx_chart, approx_yield) = results['exact'], results['approx']
+    for param in params:
+        abs_errors, rel_errors = [], []
+        for e, a in zip(exact_chart[param], approx_chart[param]):
+            for key in ('q1', 'median', 'q3'):
+                abs_errors.append(abs(a[key] - e[key]))
+                rel_errors.append(abs(a[key] - e[key]) / abs(e[key]) if e[key] else 0.0)
+        exact_q = exact_yield['quantiles'].get(param)
+        approx_q = approx_yield['quantiles'].get(param)
+        col_key = dataset.chart_columns()[param]
+        report['parameters'][param] = {
+            'batches': len(exact_chart[param]),
+            'buckets': dataset.sketches(col_key).buckets if col_key else 0,
+            'max_abs_error': round(max(abs_errors, default=0.0), 6),
+            'max_rel_error': round(max(rel_errors, default=0.0), 6),
+            'mean_rel_error': round(float(np.mean(rel_errors)) if rel_errors else 0.0, 6),
+            'yield_quantile': {
+                'exact': exact_q,
+                'approx': approx_q,
+                'rel_error': round(abs(approx_q - exact_q) / abs(exact_q), 6) if exact_q and approx_q is not None else None,
+            },
+        }
+    return report
+
+
+def compute_dashboard_bundle(dataset: BaselineDataset, parameters=None, sections=None,
+                             batch_summaries: dict = None, reuse_days: dict = None) -> dict:
+    """
+    Box-plot stats, device yield and IV repeatability from one loaded dataset.
+    All sections share the dataset's batch grouping and numeric columns; with `batch_summaries`
+    the batch-level figures come from those instead of the rows, and IV points of unchanged
+    days can be carried over from `reuse_days`.
+    A section that cannot be computed (e.g. no date column) is reported under 'errors'.
+    """
+    params = select_parameters(parameters)
+    sections = [s for s in DASHBOARD_SECTIONS if not sections or s in sections]
+
+    compute = {
+        'chart_data': compute_chart_data,
+        'device_yield': compute_device_yield_data,
+        'iv_repeatability': compute_iv_repeatability_data,
+    }
+    bundle = {'version': dataset.version, 'parameters': params, 'quantile_mode': QUANTILE_MODE, 'errors': {}}
+    for section in sections:
+        try:
+            if section == 'iv_repeatability':
+                bundle[section] = compute[section](dataset, params, reuse_days=reuse_days)
+            else:
+                bundle[section] = compute[section](dataset, params, batch_summaries=batch_summaries)
+        except ValueError as e:
+            bundle[section] = None
+            bundle['errors'][section] = str(e)
+    return bundle
+
+
+def extract_dashboard_bundle(parameters=None, sections=None):
+    """Dashboard bundle computed from ONE strict load of BaseLine.xlsx."""
+    dataset = load_baseline_dataset()
+    print(f"✅ Excel loaded. Shape: {dataset.df.shape}")
+    return compute_dashboard_bundle(dataset, parameters, sections)
+
+
+def ingest_baseline_bytes(content: bytes, version) -> BaselineDataset:
+    """
+    Parse freshly uploaded BaseLine.xlsx bytes once and make them the cached dataset
+    (and on-disk snapshot), so the next reads do not download or parse it again.
+    """
+    version = version or "sha256:" + hashlib.sha256(content).hexdigest()
+    df, memory = _parse_baseline_xlsx(content), None
+    if COMPACT_ENABLED:
+        df, memory = compact_baseline_frame(df)
+        _print_layout_report(memory)
+    dataset = BaselineDataset(df, version)
+    if SNAPSHOT_ENABLED:
+        try:
+            write_snapshot(dataset.df, version, memory=memory)
+        except OSError as e:
+            print(f"⚠️ Could not write BaseLine snapshot: {e}")
+    _baseline_cache.prime(dataset, memory)
+    return dataset
+
+
+def ingest_baseline_partition(content: bytes, name: str) -> BaselineDataset:
+    """
+    Partitioned mode: make a just-appended partition part of the cached dataset.
+    Only this partition is parsed; the cached frame supplies every earlier one.
+    """
+    _baseline_cache.add_pending_partition(name, content)
+    return refresh_baseline_dataset()
 
 
 # -------------------- SIMPLE GETTERS --------------------
 def get_parameter_data(parameter):
-    all_data = extract_chart_data() 
+    all_data = extract_chart_data(parameters=[parameter])
     return all_data.get(parameter, [])
 
 def get_all_parameters():
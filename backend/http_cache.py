@@ -0,0 +1,264 @@
+"""
+HTTP Cache Module
+ETag / If-None-Match handling, Cache-Control headers and response compression.
+
+Validators:
+- chart endpoints: the BaseLine dataset version (+ the request's path and query)
+- passdown / stability endpoints: a per-collection change counter, bumped on every write
+
+Change counters live in the CHANGE_COUNTER_COLLECTION of the passdown database, so every
+app instance sees the same value; without MongoDB they fall back to an in-process counter.
+
+Compression (registered as an after_request hook in app.py): JSON/text responses above
+COMPRESS_MIN_BYTES are brotli- or gzip-encoded per the client's Accept-Encoding. Encoded responses
+get their own strong ETag ("<hash>-gzip" / "<hash>-br"), so caches never mix up representations.
+Compressed bodies of responses with an ETag are kept in a small LRU keyed by a digest of the
+uncompressed bytes, so unchanged data is compressed once and a changed body is never replayed.
+
+Optional tuning:
+   HTTP_CACHE_MAX_AGE=0          # seconds browsers may reuse a response without revalidating (0 = always revalidate)
+   COMPRESS_MIN_BYTES=1024       # smaller bodies are sent as-is
+   COMPRESS_CACHE_MB=32          # memory for cached compressed bodies
+"""
+import os
+import gzip
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from flask import request, make_response
+from dotenv import load_dotenv
+
+# Optional: brotli (smaller JSON than gzip). Without it responses are gzip-encoded.
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '0'))
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_CACHE_BYTES = int(float(os.getenv('COMPRESS_CACHE_MB', '32')) * 1024 * 1024)
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+class ChangeCounter:
+    """Monotonic per-collection write counters (MongoDB-backed, in-process fallback)"""
+
+    def __init__(self):
+        self.collection = None
+        self._connected = False
+        self._local = {}
+        self._lock = threading.Lock()
+        # Distinguishes in-process counters of different runs (they restart at 0)
+        self._epoch = uuid.uuid4().hex[:8]
+
+    def _counters(self):
+        """Lazily connect once; None when MongoDB is not configured or unreachable"""
+        with self._lock:
+            if not self._connected:
+                self._connected = True
+                connection_string = os.getenv('MONGODB_CONNECTION_STRING')
+                if connection_string:
+                    try:
+                        from pymongo import MongoClient
+                        client = MongoClient(connection_string)
+                        client.server_info()
+                        db = client[os.getenv('DATABASE_NAME', 'passdown_db')]
+                        self.collection = db[os.getenv('CHANGE_COUNTER_COLLECTION', 'change_counters')]
+                    except Exception as e:
+                        logger.error(f"❌ Change counters unavailable, using in-process counters: {e}")
+            return self.collection
+
+    def bump(self, *names):
+        """Record a write to each named collection"""
+        counters = self._counters()
+        for name in names:
+            try:
+                if counters is not None:
+                    counters.update_one({'_id': name}, {'$inc': {'n': 1}}, upsert=True)
+                    continue
+            except Exception as e:
+                logger.error(f"Could not bump change counter {name}: {e}")
+            with self._lock:
+                self._local[name] = self._local.get(name, 0) + 1
+
+    def token(self, *names):
+        """Opaque value that changes whenever any of the named collections is written"""
+        counters = self._counters()
+        if counters is not None:
+            try:
+                docs = {d['_id']: d.get('n', 0) for d in counters.find({'_id': {'$in': list(names)}})}
+                return 'db:' + ','.join(f"{name}={docs.get(name, 0)}" for name in names)
+            except Exception as e:
+                logger.error(f"Could not read change counters: {e}")
+                return None
+        with self._lock:
+            return f'local-{self._epoch}:' + ','.join(f"{name}={self._local.get(name, 0)}" for name in names)
+
+
+change_counters = ChangeCounter()
+
+
+def make_etag(*parts):
+    """Strong ETag from the validator parts plus the request path and query string"""
+    digest = hashlib.sha1()
+    for part in parts + (request.full_path,):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return f'"{digest.hexdigest()[:20]}"'
+
+
+def encoded_etag(etag, encoding):
+    """Strong ETag of the `encoding` representation: '"<hash>"' -> '"<hash>-gzip"'"""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _matching_etag(etag):
+    """The If-None-Match entry (identity or encoded variant of `etag`) the client holds, or None"""
+    header = request.headers.get('If-None-Match', '')
+    for candidate in (etag, encoded_etag(etag, 'br'), encoded_etag(etag, 'gzip')):
+        if candidate in header:
+            return candidate
+    return None
+
+
+def _cache_control():
+    if HTTP_CACHE_MAX_AGE > 0:
+        return f'private, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate'
+    return 'no-cache'
+
+
+def conditional_get(validator, build):
+    """
+    Serve `build()` (a Flask view result) with an ETag derived from `validator`;
+    answer 304 without calling `build` when the client's If-None-Match still matches.
+    A None validator (unknown state) disables caching for this request.
+    """
+    if validator is None:
+        return build()
+
+    etag = make_etag(validator)
+    matched = _matching_etag(etag)
+    if matched:
+        response = make_response('', 304)
+        response.headers['ETag'] = matched
+        response.headers['Cache-Control'] = _cache_control()
+        response.vary.add('Accept-Encoding')
+        return response
+
+    response = make_response(build())
+    if response.status_code == 200:
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = _cache_control()
+    else:
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def collection_get(names, build):
+    """conditional_get keyed by the change counters of `names` (one collection name or a tuple)"""
+    names = (names,) if isinstance(names, str) else tuple(names)
+    return conditional_get(change_counters.token(*names), build)
+
+
+# -------------------- COMPRESSION --------------------
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (digest of the uncompressed body, encoding), bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= len(old)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+compressed_bodies = CompressedBodyCache(COMPRESS_CACHE_BYTES)
+
+
+def _accepted_encoding(header):
+    """Best encoding the client accepts: 'br' (if brotli is installed), 'gzip', or None"""
+    accepted = {}
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for encoding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def compress_response(response):
+    """after_request hook: encode large JSON/text responses per Accept-Encoding"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = _accepted_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or (response.content_length or 0) < COMPRESS_MIN_BYTES:
+        return response
+
+    etag = response.headers.get('ETag')
+    data = response.get_data()
+    # Keyed by the bytes themselves: the compressed body is fully determined by its key
+    key = (hashlib.sha1(data).digest(), encoding) if etag else None
+    body = compressed_bodies.get(key) if key else None
+    if body is None:
+        body = _compress(data, encoding)
+        if key:
+            compressed_bodies.put(key, body)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.headers['ETag'] = encoded_etag(etag, encoding)
+    return response
@@ -0,0 +1,129 @@
+"""
+Quantile Sketch Module
+Mergeable quantile summaries for BaseLine metrics, kept per (batch, day) cell next to exact moments,
+so per-batch, global and filtered quantiles come from merging small summaries instead of sorting raw values.
+
+Sketch: relative-error log buckets (DDSketch-style). A value x is counted in bucket
+ceil(log_gamma |x|) with gamma = (1 + alpha) / (1 - alpha); every value in a bucket is within a
+relative error alpha of the bucket's representative. Merging two sketches adds their bucket counts,
+so merged results do not depend on merge order.
+
+Optional tuning:
+   SKETCH_RELATIVE_ACCURACY=0.005   # alpha: 0.5% relative error per quantile (more buckets when smaller)
+"""
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+SKETCH_RELATIVE_ACCURACY = min(max(float(os.getenv('SKETCH_RELATIVE_ACCURACY', '0.005')), 1e-4), 0.1)
+
+MIN_MAGNITUDE = 1e-12      # |x| below this is counted as zero
+_KEY_BIAS = 1 << 22        # bucket k of a positive value -> ordered key _KEY_BIAS + k (negatives mirrored)
+_KEY_OFFSET = 1 << 23      # shifts ordered keys to non-negative before packing with the cell number
+_KEY_SPAN = 1 << 24
+
+
+def _gamma(alpha):
+    return (1 + alpha) / (1 - alpha)
+
+
+def bucket_keys(values: np.ndarray, alpha: float = SKETCH_RELATIVE_ACCURACY) -> np.ndarray:
+    """Ordered bucket key per value: sorting keys sorts values (0 = zero, negatives below, positives above)."""
+    magnitude = np.abs(values)
+    nonzero = magnitude >= MIN_MAGNITUDE
+    k = np.zeros(len(values), dtype=np.int64)
+    k[nonzero] = np.ceil(np.log(magnitude[nonzero]) / np.log(_gamma(alpha))).astype(np.int64) + _KEY_BIAS
+    return np.where(values < 0, -k, k)
+
+
+def key_values(keys: np.ndarray, alpha: float = SKETCH_RELATIVE_ACCURACY) -> np.ndarray:
+    """Representative value of each ordered bucket key (relative error <= alpha)."""
+    gamma = _gamma(alpha)
+    k = np.abs(keys) - _KEY_BIAS
+    values = 2 * np.power(gamma, k.astype(np.float64)) / (gamma + 1)
+    return np.where(keys == 0, 0.0, np.sign(keys) * values)
+
+
+class CellSketches:
+    """
+    Sketch buckets and exact moments (n, mean, M2, min, max) of one metric column per cell.
+    Cells are any integer grouping of rows (here: batch x day); summarize() merges cells into groups.
+    """
+
+    def __init__(self, values: np.ndarray, cells: np.ndarray, n_cells: int, alpha: float = SKETCH_RELATIVE_ACCURACY):
+        self.alpha = alpha
+        self.n_cells = n_cells
+        valid = ~np.isnan(values) & (cells >= 0)
+        v, c = values[valid], cells[valid].astype(np.int64)
+
+        packed, counts = np.unique(c * _KEY_SPAN + bucket_keys(v, alpha) + _KEY_OFFSET, return_counts=True)
+        self.entry_cell = packed // _KEY_SPAN
+        self.entry_key = packed % _KEY_SPAN - _KEY_OFFSET
+        self.entry_count = counts
+
+        self.n = np.bincount(c, minlength=n_cells)
+        self.mean = np.divide(np.bincount(c, weights=v, minlength=n_cells), self.n,
+                              out=np.zeros(n_cells), where=self.n > 0)
+        self.m2 = np.bincount(c, weights=(v - self.mean[c]) ** 2, minlength=n_cells)
+        self.min = np.full(n_cells, np.inf)
+        self.max = np.full(n_cells, -np.inf)
+        np.minimum.at(self.min, c, v)
+        np.maximum.at(self.max, c, v)
+
+    @property
+    def buckets(self) -> int:
+        return int(len(self.entry_key))
+
+    def summarize(self, cell_group: np.ndarray, n_groups: int, probabilities=()) -> dict:
+        """
+        Merge cells into groups (`cell_group[cell]` = group, -1 = left out). Returns per-group arrays:
+        n, mean, std (sample), min, max and 'quantiles' ([group, probability], 'exclusive' positions
+        like statistics.quantiles; NaN for empty groups). Estimates are clamped to the exact min/max.
+        """
+        g = np.asarray(cell_group)
+        sel = (g >= 0) & (self.n > 0)
+        gs = g[sel]
+        n = np.bincount(gs, weights=self.n[sel], minlength=n_groups)
+        has = n > 0
+        mean = np.divide(np.bincount(gs, weights=self.n[sel] * self.mean[sel], minlength=n_groups), n,
+                         out=np.full(n_groups, np.nan), where=has)
+        m2 = np.bincount(gs, weights=self.m2[sel] + self.n[sel] * (self.mean[sel] - mean[gs]) ** 2, minlength=n_groups)
+        std = np.sqrt(np.divide(m2, n - 1, out=np.zeros(n_groups), where=n > 1))
+        vmin = np.full(n_groups, np.inf)
+        vmax = np.full(n_groups, -np.inf)
+        np.minimum.at(vmin, gs, self.min[sel])
+        np.maximum.at(vmax, gs, self.max[sel])
+
+        quantiles = np.full((n_groups, len(probabilities)), np.nan)
+        entry_group = g[self.entry_cell]
+        keep = entry_group >= 0
+        if len(probabilities) and keep.any():
+            packed, inverse = np.unique(entry_group[keep] * _KEY_SPAN + self.entry_key[keep] + _KEY_OFFSET,
+                                        return_inverse=True)
+            counts = np.bincount(inverse, weights=self.entry_count[keep])
+            cum = np.cumsum(counts)
+            values = key_values(packed % _KEY_SPAN - _KEY_OFFSET, self.alpha)
+            base = np.concatenate(([0.0], np.cumsum(n)[:-1]))  # merged counts before each group
+
+            def value_at(rank):
+                idx = np.searchsorted(cum, base + rank, side='right')
+                return values[np.minimum(idx, len(values) - 1)]
+
+            for j, p in enumerate(probabilities):
+                pos = np.clip(p * (n + 1) - 1, 0, np.maximum(n - 1, 0))
+                lo = np.floor(pos)
+                hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+                estimate = value_at(lo) + (pos - lo) * (value_at(hi) - value_at(lo))
+                quantiles[:, j] = np.where(has, np.clip(estimate, vmin, vmax), np.nan)
+
+        return {
+            'n': n.astype(np.int64),
+            'mean': mean,
+            'std': std,
+            'min': np.where(has, vmin, np.nan),
+            'max': np.where(has, vmax, np.nan),
+            'quantiles': quantiles,
+        }
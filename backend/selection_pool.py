@@ -0,0 +1,131 @@
+"""
+Selection Pool Module
+Runs the per-(Batch, Sheet) device selection of analysis_api on worker processes.
+
+Each sheet travels as a compact payload (sheet_task) and comes back as (result, log lines);
+results are merged in task order, so the output never depends on the worker count.
+
+One pool per process, sized once from ANALYSIS_WORKERS and shared by all requests. A request
+asking for fewer workers (selectionWorkers) keeps at most that many of its sheets in flight;
+requests never resize or shut down the pool. A broken pool (a worker died) is replaced, and the
+request falls back to selecting serially.
+
+Importing this module has no side effects: spawned workers load only this module and
+analysis_api's selection functions, never the Flask app.
+
+Optional tuning:
+   ANALYSIS_WORKERS=0     # sheet selection processes: 0 = one per CPU, 1 = always serial
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "0"))
+PARALLEL_MIN_SHEETS = 4  # fewer sheets than this are selected serially (pool round trips would dominate)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_size() -> int:
+    """Processes in the shared pool: ANALYSIS_WORKERS, or one per CPU when it is 0"""
+    return ANALYSIS_WORKERS if ANALYSIS_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def selection_workers(requested=None) -> int:
+    """Workers for one request: `requested` (selectionWorkers; <= 0 means all), capped at the pool size"""
+    size = pool_size()
+    if requested in (None, ""):
+        return size
+    requested = int(requested)
+    return size if requested <= 0 else min(requested, size)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """The shared pool, started on first use (spawned workers: safe next to Flask's request threads)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool; the next request starts a new one (unless another request already did)"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def sheet_task(sheet_group: pd.DataFrame, k_devices, method: str, verify=False, node_limit: int = None,
+               moves: int = None, seed: int = 0):
+    """
+    Compact, picklable payload for one (Batch, Sheet): device IDs, flattened candidate PCEs with
+    per-device lengths, pixels used, plus the selection settings -- no DataFrame crosses the process boundary.
+    """
+    pce_lists = sheet_group["CandidatePCEs"].tolist()
+    lengths = np.fromiter((len(p) for p in pce_lists), dtype=np.int64, count=len(pce_lists))
+    flat = np.fromiter((x for p in pce_lists for x in p), dtype=np.float64, count=int(lengths.sum()))
+    return (sheet_group["Sheet ID"].iloc[0] if len(sheet_group) else None, sheet_group["Device ID"].tolist(),
+            flat, lengths, sheet_group["PixelsUsed"].to_numpy(dtype=np.int64),
+            k_devices, method, verify, node_limit, moves, seed)
+
+
+def select_sheet_task(task):
+    """Worker entry point: rebuild the sheet's candidate columns and run select_devices_for_sheet -> (result, logs)"""
+    from analysis_api import select_devices_for_sheet  # not at module level: analysis_api imports this module
+
+    sheet_id, devices, flat, lengths, pixels_used, k_devices, method, verify, node_limit, moves, seed = task
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    sheet_group = pd.DataFrame({
+        "Sheet ID": [sheet_id] * len(devices),
+        "Device ID": devices,
+        "CandidatePCEs": [flat[a:b].tolist() for a, b in zip(bounds[:-1], bounds[1:])],
+        "PixelsUsed": pixels_used.tolist(),
+    })
+    logs = []
+    result = select_devices_for_sheet(sheet_group, k_devices, method, logs, verify=verify,
+                                      node_limit=node_limit, moves=moves, seed=seed)
+    return result, logs
+
+
+def run_sheet_selections(tasks, workers: int, log_messages=None):
+    """
+    Run select_sheet_task for every payload; results come back in task order whatever the worker count.
+    At most `workers` of these tasks are in flight on the shared pool at a time. Serial when workers <= 1
+    or fewer than PARALLEL_MIN_SHEETS sheets, and as the fallback if the pool cannot be used.
+    Pool messages are appended to `log_messages` when given.
+    """
+    if log_messages is None:
+        log_messages = []
+    workers = min(workers, pool_size(), len(tasks))
+    if workers <= 1 or len(tasks) < PARALLEL_MIN_SHEETS:
+        return [select_sheet_task(t) for t in tasks]
+
+    pool, in_flight = None, {}
+    try:
+        pool = _get_pool()
+        outcomes, next_task = [None] * len(tasks), 0
+        while next_task < len(tasks) or in_flight:
+            while next_task < len(tasks) and len(in_flight) < workers:
+                in_flight[pool.submit(select_sheet_task, tasks[next_task])] = next_task
+                next_task += 1
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcomes[in_flight.pop(future)] = future.result()
+        log_messages.append(f"Selected devices for {len(tasks)} sheet(s) on {workers} worker process(es).")
+        return outcomes
+    except Exception as e:
+        for future in in_flight:
+            future.cancel()
+        if isinstance(e, BrokenProcessPool):
+            _discard_pool(pool)
+        log_messages.append(f"Parallel sheet selection failed ({e}); selecting serially.")
+        return [select_sheet_task(t) for t in tasks]
@@ -0,0 +1,58 @@
+"""
+Singleflight Module
+Request coalescing: concurrent callers asking for the same key wait on one in-flight call and
+share its result (or its exception) instead of each repeating the same blob load or computation.
+
+Used for BaseLine dataset revalidation/loading (data_processor) and for chart computations
+(chart_aggregates). Counters show how many calls were executed and how many were coalesced.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """At most one in-flight call per key; callers arriving meanwhile get that call's outcome"""
+
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return fn() -- run here, or by the caller already computing `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
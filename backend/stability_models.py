@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from pymongo import MongoClient
 import json
 from dotenv import load_dotenv
+from http_cache import change_counters
 
 # Load environment variables
 load_dotenv()
@@ -148,6 +149,7 @@ class StabilityDeviceModel:
             data['status'] = 'active'
             
             result = self.collection.insert_one(data)
+            change_counters.bump(self.collection.name)
             return str(result.inserted_id)
         except Exception as e:
             print(f"Error creating device: {e}")
@@ -164,6 +166,7 @@ class StabilityDeviceModel:
                 {"_id": ObjectId(device_id)},
                 {"$set": update_data}
             )
+            change_counters.bump(self.collection.name)
             return result.modified_count > 0
         except Exception as e:
             print(f"Error updating device: {e}")
@@ -194,6 +197,7 @@ class StabilityDeviceModel:
                     }
                 }
             )
+            change_counters.bump(self.collection.name)
             return result.modified_count > 0
         except Exception as e:
             print(f"Error deleting device: {e}")
@@ -214,6 +218,7 @@ class StabilityDeviceModel:
                     {"_id": existing["_id"]},
                     {"$set": update_data}
                 )
+                change_counters.bump(self.collection.name)
                 return result.modified_count > 0
             else:
                 # Create new device
@@ -280,6 +285,7 @@ class StabilityDeviceModel:
                     }
                 }
             )
+            change_counters.bump(self.collection.name)
             print(f"📊 Update result: modified_count={result.modified_count}, matched_count={result.matched_count}")
             return result.modified_count > 0
             
@@ -376,6 +382,7 @@ class StabilityHistoryModel:
         try:
             data['created_at'] = datetime.utcnow()
             result = self.collection.insert_one(data)
+            change_counters.bump(self.collection.name)
             return str(result.inserted_id)
         except Exception as e:
             print(f"Error adding history entry: {e}")
@@ -413,6 +420,7 @@ class StabilityHistoryModel:
                     pass
             
             result = self.collection.insert_one(history_entry)
+            change_counters.bump(self.collection.name)
             return str(result.inserted_id)
             
         except Exception as e:
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Chart statistics test
+Checks the vectorized box-plot kernel against calculate_box_plot_stats on synthetic data
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+from data_processor import calculate_box_plot_stats, grouped_box_plot_stats, compact_baseline_frame, BaselineDataset, grouped_mean_cv
+from data_processor import parse_row_filters, compute_chart_data, compute_device_yield_data, compute_histogram_data
+from data_processor import merge_partition_frames, parse_aggregation_query, compute_aggregation_query, compute_dashboard_bundle
+from data_processor import diff_baseline_datasets, compute_iv_repeatability_data
+import data_processor
+from quantile_sketch import CellSketches
+from statistics import mean, stdev, quantiles
+
+
+def test_grouped_box_plot_stats_matches_reference():
+    """Every group (including n < 4, NaNs and empty groups) must match the per-list helper"""
+    rng = np.random.default_rng(42)
+    mismatches = 0
+
+    for trial in range(500):
+        n_groups = int(rng.integers(1, 6))
+        sizes = rng.integers(0, 12, n_groups)
+        codes = np.repeat(np.arange(n_groups), sizes)
+        values = np.round(rng.normal(10, 3, len(codes)), int(rng.integers(0, 5)))
+        values[rng.random(len(values)) < 0.1] = np.nan
+        perm = rng.permutation(len(codes))
+        codes, values = codes[perm], values[perm]
+
+        got = grouped_box_plot_stats(values, codes, n_groups)
+        for g in range(n_groups):
+            group_values = [float(x) for x in values[(codes == g) & ~np.isnan(values)]]
+            expected = calculate_box_plot_stats(group_values) if group_values else None
+            if got[g] != expected:
+                mismatches += 1
+                print(f"❌ Trial {trial}, group {g}: {got[g]} != {expected}")
+
+    print(f"📊 Mismatches: {mismatches}")
+    assert mismatches == 0
+
+
+def test_grouped_mean_cv_matches_statistics():
+    """Daily avg/CV from one grouped pass must equal the per-day statistics.mean/stdev result"""
+    rng = np.random.default_rng(3)
+    for trial in range(300):
+        n_groups = int(rng.integers(1, 12))
+        codes = rng.integers(0, n_groups, int(rng.integers(0, 60)))
+        values = np.round(rng.normal(0 if trial % 5 == 0 else 20, 2, len(codes)), int(rng.integers(0, 4)))
+        values[rng.random(len(values)) < 0.1] = np.nan
+        got = grouped_mean_cv(values, codes, n_groups)
+        for g in range(n_groups):
+            vals = [float(x) for x in values[(codes == g) & ~np.isnan(values)]]
+            avg = round(mean(vals), 3) if vals else 0
+            cv = round(stdev(vals) / avg * 100, 3) if len(vals) > 1 and avg != 0 else 0
+            assert got[g] == (avg, cv), f"trial {trial}, group {g}: {got[g]} != {(avg, cv)}"
+
+
+def test_filtered_aggregates_match_prefiltered_frame():
+    """Index-based batch/date filters must give the same stats as aggregating a pre-filtered frame"""
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice([f'B{i:02d}' for i in range(12)], 2000),
+        'Date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 30 * 24, 2000), unit='h'),
+        'PCE (%)': np.round(rng.normal(18, 2, 2000), 4),
+    })
+    dataset = BaselineDataset(df, 'test')
+    filters = parse_row_filters(batches='B01,B03,B07,B99', start='2025-01-05', end='2025-01-20')
+    mask = df['Batch ID'].isin(['B01', 'B03', 'B07']) & df['Date'].dt.date.between(filters['start'], filters['end'])
+    expected = BaselineDataset(df[mask].reset_index(drop=True), 'ref')
+
+    assert compute_chart_data(dataset, ['PCE'], filters) == compute_chart_data(expected, ['PCE'])
+    assert compute_device_yield_data(dataset, ['PCE'], filters) == compute_device_yield_data(expected, ['PCE'])
+
+
+def test_histograms_match_numpy_per_batch():
+    """Shared-edge histograms must equal np.histogram of each batch; size is capped by bins, not rows"""
+    rng = np.random.default_rng(5)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2', 'B3'], 50000),
+        'PCE (%)': np.round(rng.normal(18, 2, 50000), 4),
+    })
+    dataset = BaselineDataset(df, 'test')
+    for bins in ('fd', 7):
+        result = compute_histogram_data(dataset, 'PCE', bins, ecdf_points=20)
+        assert len(result['edges']) <= 201
+        for entry in result['batches']:
+            values = df.loc[df['Batch ID'] == entry['batch'], 'PCE (%)'].to_numpy()
+            assert entry['counts'] == np.histogram(values, bins=np.array(result['edges']))[0].tolist()
+            assert len(entry['ecdf']) == 20 and entry['ecdf'][-1][1] == 1.0
+
+
+def test_compact_layout_is_lossless():
+    """float32 metrics must read back as the exact original float64 values"""
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2', 'B3'], 1000),
+        'Date': rng.integers(45000, 45010, 1000).astype(float),
+        'PCE (%)': np.round(rng.normal(18, 2, 1000), 4),
+        'R_shunt (Ohm.cm2)': np.round(rng.normal(2000, 300, 1000), 9),
+    })
+    compact, report = compact_baseline_frame(df)
+    print(f"🗜️ {report}")
+    assert str(compact['Batch ID'].dtype) == 'category'
+    assert str(compact['Date'].dtype).startswith('datetime64')
+    assert compact['PCE (%)'].dtype == np.float32
+    assert compact['R_shunt (Ohm.cm2)'].dtype == np.float64  # 9 decimals do not fit float32
+    dataset = BaselineDataset(compact, 'test')
+    assert np.array_equal(dataset.numeric('PCE (%)'), df['PCE (%)'].to_numpy())
+    assert report['after_bytes'] < report['before_bytes']
+
+
+def test_merged_partitions_match_one_workbook():
+    """Compacted partitions merged in upload order must equal compacting all rows at once"""
+    rng = np.random.default_rng(9)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2', 'B3', 'B4'], 3000),
+        'Date': rng.integers(45000, 45020, 3000).astype(float),
+        'PCE (%)': np.round(rng.normal(18, 2, 3000), 4),
+        'FF (%)': rng.normal(70, 5, 3000),
+    })
+    df.loc[:1999, 'FF (%)'] = df.loc[:1999, 'FF (%)'].round(2)  # float32 in some partitions only
+    parts = [compact_baseline_frame(df.iloc[a:b].reset_index(drop=True))[0] for a, b in ((0, 1000), (1000, 2000), (2000, 3000))]
+    merged, _ = compact_baseline_frame(merge_partition_frames(parts))
+    whole, _ = compact_baseline_frame(df)
+    pd.testing.assert_frame_equal(merged, whole)
+    assert merged.attrs['decimals'] == whole.attrs['decimals']
+
+
+def test_sketch_quantiles_merge_and_stay_within_accuracy():
+    """Merged cell sketches equal one sketch of the union, and quartiles stay within the relative accuracy"""
+    rng = np.random.default_rng(13)
+    values = np.round(rng.lognormal(3, 0.4, 20000), 4)
+    cells = rng.integers(0, 50, 20000)
+    alpha = 0.01
+    merged = CellSketches(values, cells, 50, alpha).summarize(np.arange(50) % 2, 2, (0.025, 0.25, 0.5, 0.75))
+    for g in range(2):
+        group_values = values[cells % 2 == g]
+        direct = CellSketches(group_values, np.zeros(len(group_values), dtype=np.intp), 1, alpha).summarize(
+            np.zeros(1, dtype=np.intp), 1, (0.025, 0.25, 0.5, 0.75))
+        assert np.array_equal(merged['quantiles'][g], direct['quantiles'][0])
+        assert merged['n'][g] == len(group_values) and np.isclose(merged['std'][g], np.std(group_values, ddof=1))
+        exact = np.array(quantiles(sorted(group_values.tolist()), n=40))[[0, 9, 19, 29]]
+        assert np.all(np.abs(merged['quantiles'][g] - exact) <= 2 * alpha * exact)
+
+
+def test_aggregation_query_matches_pandas_groupby():
+    """One grouped query pass must equal a pandas groupby over the same filtered rows"""
+    rng = np.random.default_rng(17)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2', 'B3'], 3000),
+        'Sheet ID': rng.integers(1, 4, 3000),
+        'Date': pd.Timestamp('2025-03-01') + pd.to_timedelta(rng.integers(0, 10, 3000), unit='D'),
+        'PCE (%)': np.round(rng.normal(18, 2, 3000), 4),
+    })
+    df.loc[rng.random(3000) < 0.05, 'PCE (%)'] = np.nan
+    filters = parse_row_filters(batches='B1,B3', start='2025-03-03')
+    query = parse_aggregation_query('batch,sheet', 'PCE', 'count,mean,std,median,cv')
+    result = compute_aggregation_query(BaselineDataset(df, 'test'), query, filters)
+
+    subset = df[df['Batch ID'].isin(['B1', 'B3']) & (df['Date'] >= '2025-03-03')]
+    expected = subset.groupby(['Batch ID', 'Sheet ID'])['PCE (%)'].agg(['count', 'mean', 'std', 'median'])
+    assert result['group_count'] == len(expected) and result['rows'] == len(subset)
+    for group, (key, row) in zip(result['groups'], expected.iterrows()):
+        assert (group['batch'], group['sheet']) == key
+        assert group['PCE_count'] == row['count']
+        for agg in ('mean', 'std', 'median'):
+            assert abs(group[f'PCE_{agg}'] - row[agg]) < 1e-6
+        assert abs(group['PCE_cv'] - row['std'] / row['mean'] * 100) < 1e-5
+
+
+def test_query_on_extra_numeric_column_through_streaming_reader():
+    """A numeric column outside the 8 chart parameters survives the streaming reader and can be queried"""
+    rng = np.random.default_rng(18)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2'], 400),
+        'Date': pd.Timestamp('2025-03-01') + pd.to_timedelta(rng.integers(0, 5, 400), unit='D'),
+        'PCE (%)': np.round(rng.normal(18, 2, 400), 4),
+        'Extra': np.round(rng.normal(5, 1, 400), 3).astype(object),
+        'Notes': rng.choice(['ok', 'recheck'], 400),
+    })
+    df.loc[::37, 'Extra'] = 'N/A'
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    assert data_processor.BASELINE_READER == 'streaming'
+    parsed = data_processor._parse_baseline_xlsx(buffer.getvalue())
+    assert 'Extra' in parsed.columns and 'Notes' not in parsed.columns
+
+    query = parse_aggregation_query('batch', 'Extra', 'count,mean')
+    result = compute_aggregation_query(BaselineDataset(compact_baseline_frame(parsed)[0], 'test'), query)
+    expected = pd.to_numeric(df['Extra'], errors='coerce').groupby(df['Batch ID']).agg(['count', 'mean'])
+    assert [g['batch'] for g in result['groups']] == list(expected.index)
+    for group, (_, row) in zip(result['groups'], expected.iterrows()):
+        assert group['Extra_count'] == row['count'] and abs(group['Extra_mean'] - row['mean']) < 1e-6
+
+
+def test_batch_summaries_reuse_unchanged_batches():
+    """A new version recomputes only the changed batch, and the bundle equals a full recompute"""
+    from chart_aggregates import BatchSummaryCache
+    rng = np.random.default_rng(19)
+    df = pd.DataFrame({
+        'Batch ID': rng.choice([f'B{i}' for i in range(8)], 4000),
+        'Date': pd.Timestamp('2025-02-01') + pd.to_timedelta(rng.integers(0, 20, 4000), unit='D'),
+        'PCE (%)': np.round(rng.normal(18, 2, 4000), 3),
+        'FF (%)': np.round(rng.normal(70, 5, 4000), 2),
+    })
+    df.loc[df['Batch ID'] == 'B0', 'PCE (%)'] -= 8  # one low batch holds most of the 2.5% tail
+    cache = BatchSummaryCache()
+    sections = ['chart_data', 'device_yield']
+    for version, frame in enumerate((df, df.assign(**{'FF (%)': np.where(df['Batch ID'] == 'B3', df['FF (%)'] + 1, df['FF (%)'])}))):
+        dataset = BaselineDataset(compact_baseline_frame(frame.sample(frac=1, random_state=version))[0], f'v{version}')
+        summaries = cache.summaries(dataset)
+        assert compute_dashboard_bundle(dataset, sections=sections, batch_summaries=summaries) == \
+            compute_dashboard_bundle(dataset, sections=sections)
+    assert cache.last_computed == 1
+
+
+def test_row_diff_ignores_order_and_finds_changed_groups():
+    """Reordered rows are unchanged; edited/added/removed rows are counted and name their batches and days"""
+    rng = np.random.default_rng(23)
+    n = 3000
+    df = pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2', 'B3', 'B4'], n),
+        'Sheet ID': rng.integers(1, 4, n),
+        'Device ID': rng.choice(list('ABCDEF'), n),
+        'Pixel ID': rng.integers(1, 7, n),
+        'Scan Direction': rng.choice(['F', 'R'], n),
+        'Date': pd.Timestamp('2025-04-01') + pd.to_timedelta(rng.integers(0, 10 * 24, n), unit='h'),
+        'PCE (%)': np.round(rng.normal(18, 2, n), 4),
+    })
+    edited = df.copy()
+    edited.loc[[3, 8], 'PCE (%)'] += 1
+    edited = pd.concat([edited.drop(index=[11]), df.iloc[[20]].assign(Date=pd.Timestamp('2025-05-01'))])
+    edited = edited.sample(frac=1, random_state=0).reset_index(drop=True)
+    previous, current = BaselineDataset(df, 'v1'), BaselineDataset(edited, 'v2')
+
+    assert diff_baseline_datasets(previous, BaselineDataset(df.iloc[::-1].reset_index(drop=True), 'v1b'))['unchanged'] == n
+    diff = diff_baseline_datasets(previous, current)
+    assert (diff['added'], diff['removed'], diff['changed']) == (1, 1, 2)
+    touched = df.loc[[3, 8, 11, 20]]
+    assert diff['changed_batches'] == sorted(set(touched['Batch ID']))
+    assert diff['changed_days'] == sorted(set(touched.loc[[3, 8, 11], 'Date'].dt.date.astype(str)) | {'2025-05-01'})
+
+    before = compute_iv_repeatability_data(previous, ['PCE'], days=40)
+    reuse = {p['date']: p for p in before['repeatability_data'] if p['date'] not in diff['changed_days']}
+    assert compute_iv_repeatability_data(current, ['PCE'], days=40, reuse_days=reuse) == \
+        compute_iv_repeatability_data(current, ['PCE'], days=40)
+
+
+def test_aggregate_store_keeps_current_and_previous_version():
+    """File store: saving a new version drops all but the current and previous record"""
+    from chart_aggregates import AggregateStore
+    store = AggregateStore()
+    store.backend, store.collection = 'file', None
+    with tempfile.TemporaryDirectory() as directory:
+        store.directory = directory
+        for version in ("v1", "v2", "v3", "v4"):
+            store.save({"version": version})
+            time.sleep(0.01)
+        assert sorted(os.listdir(directory)) == sorted(os.path.basename(store._path(v)) for v in ("v3", "v4"))
+        store._memory.clear()
+        assert store.load("v4") == {"version": "v4"} and store.load("v2") is None
+
+
+if __name__ == "__main__":
+    test_grouped_box_plot_stats_matches_reference()
+    test_grouped_mean_cv_matches_statistics()
+    test_filtered_aggregates_match_prefiltered_frame()
+    test_histograms_match_numpy_per_batch()
+    test_compact_layout_is_lossless()
+    test_merged_partitions_match_one_workbook()
+    test_sketch_quantiles_merge_and_stay_within_accuracy()
+    test_aggregation_query_matches_pandas_groupby()
+    test_query_on_extra_numeric_column_through_streaming_reader()
+    test_batch_summaries_reuse_unchanged_batches()
+    test_row_diff_ignores_order_and_finds_changed_groups()
+    test_aggregate_store_keeps_current_and_previous_version()
+    print("✅ Vectorized box-plot stats match calculate_box_plot_stats")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+HTTP cache test
+Checks ETag / If-None-Match handling and compression against a throwaway Flask app
+"""
+
+import sys
+import gzip
+from flask import Flask, jsonify
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+from http_cache import collection_get, change_counters, compress_response, compressed_bodies
+
+
+def test_change_counter_etag_revalidation():
+    """304 without rebuilding while the collection is unchanged; 200 again after a write"""
+    app = Flask(__name__)
+    builds = []
+
+    @app.route('/items')
+    def items():
+        def build():
+            builds.append(1)
+            return jsonify({"success": True, "data": len(builds)}), 200
+        return collection_get('test_items', build)
+
+    client = app.test_client()
+    first = client.get('/items')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+
+    unchanged = client.get('/items', headers={'If-None-Match': etag})
+    print(f"🔁 Unchanged: {unchanged.status_code}, builds={len(builds)}")
+    assert unchanged.status_code == 304 and unchanged.data == b''
+    assert len(builds) == 1
+
+    change_counters.bump('test_items')
+    changed = client.get('/items', headers={'If-None-Match': etag})
+    print(f"✏️ After write: {changed.status_code}, builds={len(builds)}")
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert len(builds) == 2
+
+
+def test_gzip_compression_is_cached_by_etag():
+    """Large bodies are gzip-encoded once per ETag; clients without gzip get identity"""
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route('/big')
+    def big():
+        return collection_get('test_big', lambda: (jsonify({"success": True, "data": list(range(2000))}), 200))
+
+    client = app.test_client()
+    plain = client.get('/big')
+    assert 'Content-Encoding' not in plain.headers
+
+    hits = compressed_bodies.hits
+    for _ in range(2):
+        encoded = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        assert encoded.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(encoded.data) == plain.data
+        assert 'Accept-Encoding' in encoded.headers['Vary']
+    print(f"🗜️ {len(plain.data)} -> {len(encoded.data)} bytes")
+    assert compressed_bodies.hits == hits + 1
+
+    # Each representation has its own strong validator, and both revalidate
+    assert encoded.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    revalidated = client.get('/big', headers={'Accept-Encoding': 'gzip', 'If-None-Match': encoded.headers['ETag']})
+    assert revalidated.status_code == 304 and revalidated.headers['ETag'] == encoded.headers['ETag']
+    assert client.get('/big', headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+
+def test_freshness_markers_are_headers_not_body():
+    """Same version -> same ETag and byte-identical body; age/refreshing change only the X-Data-* headers"""
+    from http_cache import conditional_get
+    from charts_api import freshness_response
+
+    app = Flask(__name__)
+    ages = iter([1.5, 60.0])
+
+    @app.route('/chart')
+    def chart():
+        meta = {'version': 'v1', 'source': 'materialized', 'age_seconds': next(ages), 'refreshing': False}
+        return conditional_get('v1', lambda: freshness_response({"success": True, "data": [1, 2]}, meta))
+
+    client = app.test_client()
+    first, second = client.get('/chart'), client.get('/chart')
+    assert first.headers['ETag'] == second.headers['ETag'] and first.data == second.data
+    assert first.get_json() == {"success": True, "data": [1, 2], "version": "v1"}
+    assert (first.headers['X-Data-Age'], second.headers['X-Data-Age']) == ('1.5', '60.0')
+    assert first.headers['X-Data-Refreshing'] == 'false' and first.headers['X-Data-Source'] == 'materialized'
+
+
+if __name__ == "__main__":
+    test_change_counter_etag_revalidation()
+    test_gzip_compression_is_cached_by_etag()
+    test_freshness_markers_are_headers_not_body()
+    print("✅ ETag revalidation and compression work")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Pixel selection test
+The sorted-window selector must pick the same M pixels (and metric) as the full enumeration
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+from itertools import combinations
+from analysis_api import exact_best_subset, enumerate_best_subset, build_device_candidates_M
+from analysis_api import select_devices_for_sheet, enumerate_device_selection, exact_device_selection
+from analysis_api import device_moments, greedy_device_selection, anytime_device_selection
+
+
+def test_exact_selector_matches_enumeration():
+    """Random devices, including many tied PCE values, for both methods and every M"""
+    rng = np.random.default_rng(21)
+    for trial in range(1000):
+        n = int(rng.integers(1, 10))
+        m = int(rng.integers(1, n + 1))
+        decimals = int(rng.integers(0, 3)) if trial % 2 else 4
+        pces = np.round(rng.normal(18, 1.5, n), decimals).tolist()
+        for method in ("minimize-sd", "maximize-mean-pce"):
+            got = exact_best_subset(pces, m, method)
+            expected = enumerate_best_subset(pces, m, method)
+            assert got[0] == expected[0], f"{pces}, M={m}, {method}: {got} != {expected}"
+            assert got[1] == expected[1] or (np.isnan(got[1]) and np.isnan(expected[1]))
+
+
+def test_verification_mode_reports_no_mismatches():
+    rng = np.random.default_rng(4)
+    pce_df = pd.DataFrame({
+        "Batch ID": "B1",
+        "Sheet ID": np.repeat([1, 2], 24),
+        "Device ID": np.tile(np.repeat(list("ABCD"), 6), 2),
+        "Pixel ID": np.tile(np.arange(1, 7), 8),
+        "PCE_WORK": np.round(rng.normal(18, 1, 48), 1),
+    })
+    logs = []
+    cand = build_device_candidates_M(pce_df, 3, "minimize-sd", log_messages=logs, verify=True)
+    assert len(cand) == 8
+    assert logs[-1] == "Verified pixel selection on 8 device(s): 0 mismatch(es)."
+
+
+def test_vectorized_candidates_match_per_device_loop():
+    """The packed all-device engine must build the same table as selecting device by device"""
+    rng = np.random.default_rng(8)
+    rows = []
+    for d in range(300):
+        for p in rng.permutation(np.arange(1, int(rng.integers(2, 10)))):
+            rows.append((f"B{d % 3}", d % 5, f"D{d}", int(p), round(float(rng.normal(18, 1.5)), [4, 1, 0][d % 3])))
+    pce_df = pd.DataFrame(rows, columns=["Batch ID", "Sheet ID", "Device ID", "Pixel ID", "PCE_WORK"])
+
+    for method in ("minimize-sd", "maximize-mean-pce"):
+        recs = []
+        for (b, s, dev), group in pce_df.groupby(["Batch ID", "Sheet ID", "Device ID"]):
+            group = group.sort_values("Pixel ID")
+            pixels, pces = group["Pixel ID"].tolist(), group["PCE_WORK"].tolist()
+            if len(pixels) < 4:
+                continue
+            idxs, metric = enumerate_best_subset(pces, 4, method)
+            recs.append({"Batch ID": b, "Sheet ID": s, "Device ID": dev,
+                         "CandidatePixels": [pixels[i] for i in idxs], "CandidatePCEs": [pces[i] for i in idxs],
+                         "DeviceMetric": metric, "PixelsUsed": 4})
+        pd.testing.assert_frame_equal(build_device_candidates_M(pce_df, 4, method), pd.DataFrame(recs))
+
+
+def _sheet(pce_lists):
+    m = len(pce_lists[0])
+    return pd.DataFrame({
+        "Batch ID": "B1", "Sheet ID": 1, "Device ID": [f"D{i:02d}" for i in range(len(pce_lists))],
+        "CandidatePixels": [list(range(1, m + 1))] * len(pce_lists), "CandidatePCEs": pce_lists,
+        "DeviceMetric": 0.0, "PixelsUsed": m,
+    })
+
+
+def test_device_search_matches_enumeration():
+    """Branch-and-bound on (n, sum, sumsq) must select exactly what the full enumeration selects"""
+    rng = np.random.default_rng(30)
+    for trial in range(150):
+        n_devices, m = int(rng.integers(2, 10)), int(rng.integers(1, 5))
+        pce_lists = [np.round(rng.normal(18 + rng.normal(0, 1), 1, m), trial % 3 + 1).tolist() for _ in range(n_devices)]
+        if trial % 5 == 0:
+            pce_lists[-1] = list(pce_lists[0])  # identical devices tie
+        sheet = _sheet(pce_lists)
+        k = int(rng.integers(1, n_devices))
+        for method in ("minimize-sd", "maximize-mean-pce"):
+            assert select_devices_for_sheet(sheet, k, method, []) == enumerate_device_selection(sheet, k, method)
+            # Up to COMB_LIMIT combinations the search stays exact even with no node budget at all
+            logs = []
+            assert select_devices_for_sheet(sheet, k, method, logs, node_limit=0) == enumerate_device_selection(sheet, k, method)
+            assert not logs
+
+
+def test_device_search_is_exact_beyond_combination_limit():
+    """C(30, 6) = 594k combinations: still exact (checked against vectorized pooled SDs of every combination)"""
+    rng = np.random.default_rng(31)
+    pce_lists = [np.round(rng.normal(18 + rng.normal(0, 1), 1, 4), 4).tolist() for _ in range(30)]
+    logs = []
+    result = select_devices_for_sheet(_sheet(pce_lists), 6, "minimize-sd", logs)
+    assert not logs
+
+    values = np.array(pce_lists)
+    n, s, q = 4.0, values.sum(axis=1), (values ** 2).sum(axis=1)
+    combos = np.array(list(combinations(range(30), 6)))
+    pooled = np.sqrt((q[combos].sum(axis=1) - s[combos].sum(axis=1) ** 2 / (6 * n)) / (6 * n - 1))
+    best = combos[np.argmin(pooled)]
+    assert result["SelectedDevices"] == tuple(f"D{i:02d}" for i in best)
+
+
+def test_anytime_search_is_deterministic_and_beats_greedy():
+    """Past the exact-search node limit: same answer for the same seed, never worse than greedy"""
+    rng = np.random.default_rng(32)
+    sheet = _sheet([np.round(rng.normal(18 + rng.normal(0, 1), 1, 4), 4).tolist() for _ in range(80)])
+    logs = []
+    first = select_devices_for_sheet(sheet, 12, "minimize-sd", logs, node_limit=37_500, moves=12_500, seed=7)
+    again = select_devices_for_sheet(sheet, 12, "minimize-sd", [], node_limit=37_500, moves=12_500, seed=7)
+    assert first["Search"] == "anytime" and "anytime search" in logs[-1]
+    assert first == again and first["Iterations"] == 12_500
+    assert first["CombinedMetric"] <= first["GreedyMetric"] and first["GapVsGreedy"] >= 0
+
+    pce_lists = [np.round(rng.normal(18 + rng.normal(0, 1), 1, 3), 4).tolist() for _ in range(16)]
+    n, sums, sumsq, spread = device_moments(pce_lists)
+    greedy = greedy_device_selection(n, sums, sumsq, 5, "minimize-sd")
+    positions, stats = anytime_device_selection(n, sums, sumsq, spread, greedy, "minimize-sd", max_moves=25_000)
+    exact = exact_device_selection(_sheet(pce_lists), 5, "minimize-sd")
+    assert tuple(f"D{i:02d}" for i in positions) == exact["SelectedDevices"]
+
+
+if __name__ == "__main__":
+    test_exact_selector_matches_enumeration()
+    test_verification_mode_reports_no_mismatches()
+    test_vectorized_candidates_match_per_device_loop()
+    test_device_search_matches_enumeration()
+    test_device_search_is_exact_beyond_combination_limit()
+    test_anytime_search_is_deterministic_and_beats_greedy()
+    print("✅ Exact pixel and device selection match the enumeration")
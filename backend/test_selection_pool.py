@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Selection pool test
+Sheets selected on worker processes must give the serial results, in order, also for concurrent requests
+"""
+
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+import selection_pool
+from selection_pool import sheet_task, select_sheet_task, run_sheet_selections
+from analysis_api import select_devices_for_sheet
+
+
+def _sheets(seed, count=6):
+    rng = np.random.default_rng(seed)
+    sheets = []
+    for i in range(count):
+        pce_lists = [np.round(rng.normal(18 + rng.normal(0, 1), 1, 3), 2).tolist() for _ in range(8 + 10 * i)]
+        sheets.append((pd.DataFrame({
+            "Batch ID": "B1", "Sheet ID": i, "Device ID": [f"D{d:02d}" for d in range(len(pce_lists))],
+            "CandidatePixels": [[1, 2, 3]] * len(pce_lists), "CandidatePCEs": pce_lists,
+            "DeviceMetric": 0.0, "PixelsUsed": 3,
+        }), "minimize-sd" if i % 2 else "maximize-mean-pce", i))
+    return sheets
+
+
+def _tasks(sheets):
+    return [sheet_task(sheet, 4, method, node_limit=7_500, moves=2_500, seed=seed) for sheet, method, seed in sheets]
+
+
+def test_payload_round_trip_matches_direct_selection():
+    """The compact payload selects exactly what select_devices_for_sheet selects on the frame"""
+    for sheet, method, seed in _sheets(33):
+        logs = []
+        expected = select_devices_for_sheet(sheet, 4, method, logs, node_limit=7_500, moves=2_500, seed=seed)
+        assert select_sheet_task(sheet_task(sheet, 4, method, node_limit=7_500, moves=2_500, seed=seed)) == (expected, logs)
+
+
+def test_concurrent_requests_share_the_pool():
+    """Two requests with different worker counts at once: both parallel, both equal to serial"""
+    original = selection_pool.ANALYSIS_WORKERS
+    selection_pool.ANALYSIS_WORKERS = 3
+    try:
+        requests = [_tasks(_sheets(34)), _tasks(_sheets(35, count=5))]
+        serial = [run_sheet_selections(tasks, workers=1) for tasks in requests]
+        outcomes, logs = [None, None], [[], []]
+
+        def run(i, workers):
+            outcomes[i] = run_sheet_selections(requests[i], workers, logs[i])
+
+        threads = [threading.Thread(target=run, args=(0, 3)), threading.Thread(target=run, args=(1, 2))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"🧵 {logs}")
+        assert outcomes == serial
+        assert logs == [["Selected devices for 6 sheet(s) on 3 worker process(es)."],
+                        ["Selected devices for 5 sheet(s) on 2 worker process(es)."]]
+        assert selection_pool.selection_workers(8) == 3 and selection_pool.selection_workers(None) == 3
+        assert run_sheet_selections.__defaults__ == (None,)  # no list shared between calls that omit it
+    finally:
+        selection_pool.ANALYSIS_WORKERS = original
+
+
+if __name__ == "__main__":
+    test_payload_round_trip_matches_direct_selection()
+    test_concurrent_requests_share_the_pool()
+    print("✅ Parallel sheet selection matches the serial loop")
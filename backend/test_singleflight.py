@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Singleflight test
+Concurrent identical calls must run once and share the result (or the error)
+"""
+
+import sys
+import time
+import threading
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+from singleflight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers=8):
+    results, errors = [], []
+    started = threading.Barrier(callers)
+
+    def call():
+        started.wait()
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    """Eight callers for one key: one execution, seven coalesced, same result object"""
+    flight = SingleFlight()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        time.sleep(0.2)
+        return {'value': 42}
+
+    results, errors = _run_concurrently(flight, 'dataset', slow)
+    print(f"🔀 {flight.stats()}")
+    assert not errors and len(runs) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.stats() == {'executed': 1, 'coalesced': 7, 'in_flight': 0}
+
+    flight.do('dataset', slow)  # a later call runs again
+    assert len(runs) == 2
+
+
+def test_errors_are_shared_and_not_cached():
+    """Waiting callers get the leader's exception; the next call retries"""
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("blob unavailable")
+
+    results, errors = _run_concurrently(flight, 'dataset', failing, callers=4)
+    assert not results and len(errors) == 4
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flight.do('dataset', lambda: 'ok') == 'ok'
+
+
+def test_cache_answers_while_a_load_is_in_flight():
+    """stats() and prime() do not wait for the blob download / parse another thread is running"""
+    import pandas as pd
+    import data_processor
+    from data_processor import BaselineCache, BaselineDataset
+
+    cache = BaselineCache(revalidate_seconds=0)
+    downloading, release = threading.Event(), threading.Event()
+
+    def slow_fetch(if_none_match=None):
+        downloading.set()
+        release.wait(5)
+        raise ConnectionError("blob unavailable")
+
+    def load():
+        try:
+            cache.get_dataset()
+        except ConnectionError:
+            pass
+
+    original = data_processor._fetch_baseline_blob
+    data_processor._fetch_baseline_blob = slow_fetch
+    loader = threading.Thread(target=load)
+    try:
+        loader.start()
+        assert downloading.wait(5)
+        started = time.perf_counter()
+        cache.stats()
+        cache.prime(BaselineDataset(pd.DataFrame({'PCE (%)': [18.0]}), 'uploaded'))
+        waited = time.perf_counter() - started
+        print(f"📊 stats/prime during a load: {waited * 1000:.1f} ms")
+        assert waited < 1 and cache.stats()['version'] == 'uploaded'
+    finally:
+        release.set()
+        loader.join()
+        data_processor._fetch_baseline_blob = original
+
+
+if __name__ == "__main__":
+    test_concurrent_calls_share_one_execution()
+    test_errors_are_shared_and_not_cached()
+    test_cache_answers_while_a_load_is_in_flight()
+    print("✅ Singleflight coalesces concurrent calls")
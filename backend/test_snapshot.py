@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Snapshot test
+A columnar snapshot must load back as the frame it was written from, and the cache must only use
+one that matches the blob (anything stale or damaged is re-parsed from the xlsx)
+"""
+
+import io
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+import data_processor
+from data_processor import write_snapshot, load_snapshot, _read_snapshot_manifest, compact_baseline_frame
+from data_processor import BaselineCache, _parse_baseline_xlsx
+
+
+def _frame(seed, rows=200):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Batch ID': rng.choice(['B1', 'B2', 'B3'], rows),
+        'Device ID': [f'D{i}' for i in rng.integers(0, 150, rows)],
+        'Scan Direction': rng.choice(['F', 'R', None], rows),
+        'Date': pd.Timestamp('2025-05-01') + pd.to_timedelta(rng.integers(0, 9, rows), unit='D'),
+        'Sheet ID': rng.integers(1, 5, rows),
+        'PCE (%)': np.round(rng.normal(18, 2, rows), 3),
+        'R_shunt (Ohm.cm2)': np.round(rng.normal(2000, 300, rows), 9),
+    })
+
+
+def _xlsx(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _cache_with_blob(directory, content, version):
+    """Cold cache reading snapshots from `directory`, the blob stubbed to (content, version)"""
+    def fetch(if_none_match=None):
+        return (None, version) if if_none_match == version else (content, version)
+    data_processor.SNAPSHOT_DIR, data_processor._fetch_baseline_blob = directory, fetch
+    return BaselineCache(revalidate_seconds=0)
+
+
+def _restore(original):
+    data_processor.SNAPSHOT_DIR, data_processor._fetch_baseline_blob = original
+
+
+def test_snapshot_round_trip_keeps_compact_columns():
+    """Categorical, float32 (with decimals), datetime, text and int columns come back equal"""
+    df, _ = compact_baseline_frame(_frame(41))
+    assert str(df['Batch ID'].dtype) == 'category' and df['PCE (%)'].dtype == np.float32
+    with tempfile.TemporaryDirectory() as directory:
+        write_snapshot(df, '"v1"', directory=directory)
+        manifest = _read_snapshot_manifest(directory)
+        assert manifest['version'] == '"v1"' and manifest['rows'] == len(df)
+        loaded = load_snapshot(manifest)
+        pd.testing.assert_frame_equal(loaded, df)  # dtypes included
+        assert loaded.attrs['decimals'] == df.attrs['decimals']
+
+
+def test_snapshot_of_another_version_is_ignored():
+    """The blob moved on since the snapshot was written: the new workbook is parsed"""
+    original = (data_processor.SNAPSHOT_DIR, data_processor._fetch_baseline_blob)
+    old, new = _frame(42), _frame(43)
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            write_snapshot(compact_baseline_frame(_parse_baseline_xlsx(_xlsx(old)))[0], '"v1"', directory=directory)
+            cache = _cache_with_blob(directory, _xlsx(new), '"v2"')
+            dataset = cache.get_dataset()
+            assert dataset.version == '"v2"' and cache.source == 'xlsx' and cache.snapshot_loads == 0
+            expected = compact_baseline_frame(_parse_baseline_xlsx(_xlsx(new)))[0]
+            pd.testing.assert_frame_equal(dataset.df, expected)
+
+            parsed_memory = cache.memory
+            cache = _cache_with_blob(directory, _xlsx(new), '"v2"')  # the snapshot now matches
+            assert cache.get_dataset().version == '"v2"' and cache.source == 'snapshot'
+            # The compaction report of the parse survives the restart (the snapshot is compact already)
+            assert cache.memory == parsed_memory and parsed_memory['after_bytes'] < parsed_memory['before_bytes']
+        finally:
+            _restore(original)
+
+
+def test_damaged_snapshot_is_reparsed():
+    """A corrupted or missing column file makes the cache re-parse the xlsx instead of failing"""
+    original = (data_processor.SNAPSHOT_DIR, data_processor._fetch_baseline_blob)
+    content = _xlsx(_frame(44))
+    expected = compact_baseline_frame(_parse_baseline_xlsx(content))[0]
+    for damage in ('corrupt', 'missing'):
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                manifest = write_snapshot(expected, '"v1"', directory=directory)
+                path = os.path.join(_read_snapshot_manifest(directory)['path'], manifest['columns'][-1]['file'])
+                if damage == 'corrupt':
+                    with open(path, 'wb') as f:
+                        f.write(b'not a numpy file')
+                else:
+                    os.remove(path)
+                cache = _cache_with_blob(directory, content, '"v1"')
+                dataset = cache.get_dataset()
+                print(f"🧊 {damage}: source={cache.source}")
+                assert cache.source == 'xlsx' and cache.snapshot_loads == 0
+                pd.testing.assert_frame_equal(dataset.df, expected)
+            finally:
+                _restore(original)
+
+
+if __name__ == "__main__":
+    test_snapshot_round_trip_keeps_compact_columns()
+    test_snapshot_of_another_version_is_ignored()
+    test_damaged_snapshot_is_reparsed()
+    print("✅ Snapshots round-trip and stale or damaged ones are re-parsed")
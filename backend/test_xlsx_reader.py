@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+XLSX reader test
+The streaming reader must return exactly what pd.read_excel returns for the columns it keeps
+"""
+
+import io
+import sys
+from datetime import datetime
+import pandas as pd
+from openpyxl import Workbook
+
+# Add current directory to path for imports
+sys.path.append('.')
+
+from data_processor import _read_xlsx_streaming
+
+
+def _workbook(header, rows, trailing_empty_rows=3):
+    """xlsx bytes; the trailing rows hold only a formatted, empty cell (as Excel leaves them)"""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    for r in range(len(rows) + 2, len(rows) + 2 + trailing_empty_rows):
+        ws.cell(row=r, column=1).number_format = '0.00'
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _assert_matches_pandas(content, expected_columns):
+    streamed = _read_xlsx_streaming(content)
+    reference = pd.read_excel(io.BytesIO(content))
+    print(f"📑 {list(streamed.columns)}")
+    assert list(streamed.columns) == expected_columns
+    pd.testing.assert_frame_equal(streamed, reference[expected_columns])
+
+
+def test_streaming_reader_matches_read_excel():
+    """NA and error strings in metrics, date cells, fuzzy / other-case headers, trailing empty rows"""
+    header = ['batch id', 'Sheet ID', 'Device ID', 'Pixel ID', 'Scan Direction', 'Measurement Date',
+              'pce', 'Fill Factor FF', 'V_oc (V)', 'Run Date Text', 'Notes', 'Extra']
+    rows = []
+    for i in range(30):
+        pce = 'N/A' if i == 3 else ('error' if i == 5 else round(15 + i * 0.13, 2))
+        rows.append([f'B{i % 3}', i % 4 + 1, f'D{i % 5}', i % 6 + 1, 'FR'[i % 2], datetime(2025, 3, 1 + i % 7, 10, i),
+                     pce, round(60 + i * 0.7, 1), None if i == 7 else 1.05 + i / 1000,
+                     f'2025-03-{1 + i % 9:02d}', 'ok', i * 2])
+    _assert_matches_pandas(_workbook(header, rows),
+                           ['batch id', 'Sheet ID', 'Device ID', 'Pixel ID', 'Scan Direction', 'Measurement Date',
+                            'pce', 'Fill Factor FF', 'V_oc (V)', 'Extra'])
+
+
+def test_streaming_reader_without_optional_columns():
+    """String dates mixed with date cells, 'NULL' metric cells, no ID / scan direction / most metric columns"""
+    rows = [[f'B{i % 2}', f'2025-04-{1 + i:02d}' if i % 3 else datetime(2025, 4, 1 + i),
+             'NULL' if i == 4 else round(17 + i / 7, 3), 70 + i] for i in range(12)]
+    _assert_matches_pandas(_workbook(['Batch', 'Date', 'PCE (%)', 'ff'], rows), ['Batch', 'Date', 'PCE (%)', 'ff'])
+
+
+if __name__ == "__main__":
+    test_streaming_reader_matches_read_excel()
+    test_streaming_reader_without_optional_columns()
+    print("✅ Streaming reader matches pd.read_excel")
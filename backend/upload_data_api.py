@@ -10,6 +10,8 @@ from flask import jsonify, request
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 
+from data_processor import partitioned_mode, append_baseline_partition
+
 # Load environment variables
 load_dotenv()
 
@@ -53,6 +55,8 @@ class UploadDataAPI:
 
             if response.status_code in [201, 200]:
                 logger.info(f"Successfully uploaded {filename} to Azure Blob Storage")
+                if filename == 'BaseLine.xlsx':
+                    self._ingest_baseline(file_content, response.headers.get('ETag'))
                 return True, f"File {filename} uploaded successfully"
             else:
                 logger.error(f"Failed to upload {filename}: {response.status_code} - {response.text}")
@@ -62,6 +66,33 @@ class UploadDataAPI:
             logger.error(f"Error uploading to blob storage: {str(e)}")
             return False, f"Upload error: {str(e)}"
 
+    def _ingest_baseline(self, file_content, etag):
+        """Precompute chart aggregates for the new BaseLine.xlsx in the background"""
+        try:
+            from chart_aggregates import ingest_baseline_upload
+            ingest_baseline_upload(file_content, etag)
+            logger.info(f"Scheduled chart aggregate ingest for BaseLine.xlsx (ETag {etag})")
+        except Exception as e:
+            # The upload itself succeeded; charts fall back to live computation
+            logger.error(f"Could not schedule BaseLine ingest: {str(e)}")
+
+    def _append_baseline_partition(self, file, filename):
+        """Partitioned mode: store the upload as a new BaseLine partition instead of replacing the workbook"""
+        from chart_aggregates import ingest_partition_upload
+        try:
+            file_content = file.read()
+            entry, manifest_version = append_baseline_partition(file_content, filename)
+        except Exception as e:
+            logger.error(f"Error appending BaseLine partition: {str(e)}")
+            return False, f"Upload error: {str(e)}", None
+        try:
+            ingest_partition_upload(file_content, entry['name'])
+        except Exception as e:
+            # The partition is stored; the next version check picks it up
+            logger.error(f"Could not schedule BaseLine partition ingest: {str(e)}")
+        logger.info(f"Appended BaseLine partition {entry['name']} (manifest {manifest_version})")
+        return True, f"File {filename} appended as BaseLine partition {entry['name']}", entry['name']
+
     def upload_file(self):
         """Handle file upload request"""
         try:
@@ -91,6 +122,20 @@ class UploadDataAPI:
             # Secure the filename
             filename = secure_filename(file.filename)
 
+            # In partitioned mode a BaseLine upload adds a partition (append-only)
+            if filename.lower() == 'baseline.xlsx' and partitioned_mode():
+                success, message, partition = self._append_baseline_partition(file, filename)
+                if success:
+                    return jsonify({
+                        'success': True,
+                        'message': message,
+                        'filename': partition
+                    }), 200
+                return jsonify({
+                    'success': False,
+                    'message': message
+                }), 500
+
             # Check if this is BaseLine.xlsx - if so, use exact name to replace
             if filename.lower() == 'baseline.xlsx':
                 unique_filename = 'BaseLine.xlsx'
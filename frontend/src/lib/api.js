@@ -6,6 +6,9 @@ console.log('🚀 API Configuration:', {
   baseURL: API_BASE_URL
 });
 
+// GET options: always revalidate with the server (ETag / 304) instead of re-downloading unchanged data
+const REVALIDATE = { cache: 'no-cache' };
+
 // Helper function to handle API responses
 const handleResponse = async (response) => {
   if (!response.ok) {
@@ -28,7 +31,7 @@ const handleResponse = async (response) => {
 export const safetyAPI = {
   // Get all safety issues
   getAll: async () => {
-    const response = await fetch(`${API_BASE_URL}/safety`);
+    const response = await fetch(`${API_BASE_URL}/safety`, REVALIDATE);
     const result = await handleResponse(response);
     return result.data || result;
   },
@@ -70,7 +73,7 @@ export const safetyAPI = {
 export const kudosAPI = {
   // Get all kudos
   getAll: async () => {
-    const response = await fetch(`${API_BASE_URL}/kudos`);
+    const response = await fetch(`${API_BASE_URL}/kudos`, REVALIDATE);
     const result = await handleResponse(response);
     return result.data || result;
   },
@@ -112,7 +115,7 @@ export const kudosAPI = {
 export const todayAPI = {
   // Get all today's issues
   getAll: async () => {
-    const response = await fetch(`${API_BASE_URL}/today`);
+    const response = await fetch(`${API_BASE_URL}/today`, REVALIDATE);
     const result = await handleResponse(response);
     return result.data || result;
   },
@@ -154,7 +157,7 @@ export const todayAPI = {
 export const yesterdayAPI = {
   // Get all yesterday's issues
   getAll: async () => {
-    const response = await fetch(`${API_BASE_URL}/yesterday`);
+    const response = await fetch(`${API_BASE_URL}/yesterday`, REVALIDATE);
     const result = await handleResponse(response);
     return result.data || result;
   },
@@ -201,29 +204,73 @@ export const healthAPI = {
 };
 
 // Chart data API functions
+// Build the query string for chart filters (empty values are left out)
+const chartQuery = ({ batches, start, end, lastBatches, sort, days } = {}) => {
+  const query = new URLSearchParams();
+  if (batches && batches.length) query.set('batches', batches.join(','));
+  if (start) query.set('start', start);
+  if (end) query.set('end', end);
+  if (lastBatches) query.set('last_batches', lastBatches);
+  if (sort) query.set('sort', sort);
+  if (days) query.set('days', days);
+  const text = query.toString();
+  return text ? `?${text}` : '';
+};
+
 export const chartAPI = {
   // Get available parameters
   getParameters: async () => {
-    const response = await fetch(`${API_BASE_URL}/charts/parameters`);
+    const response = await fetch(`${API_BASE_URL}/charts/parameters`, REVALIDATE);
     const data = await handleResponse(response);
     return data.parameters || data;
   },
 
   // Get data for a specific parameter
-  getData: async (parameter) => {
-    const response = await fetch(`${API_BASE_URL}/charts/data/${parameter}`);
+  // filters: { batches: [...], start: 'YYYY-MM-DD', end: 'YYYY-MM-DD', lastBatches: n, sort: 'asc' | 'desc' }
+  getData: async (parameter, filters = {}) => {
+    const response = await fetch(`${API_BASE_URL}/charts/data/${parameter}${chartQuery(filters)}`, REVALIDATE);
+    return handleResponse(response);
+  },
+
+  // Get per-batch histograms for a parameter: bins = 'fd' (Freedman-Diaconis) or a bin count,
+  // ecdf = number of ECDF points per batch (0 = none)
+  getHistogram: async (parameter, { bins = 'fd', ecdf = 0, ...filters } = {}) => {
+    const query = chartQuery(filters);
+    const extra = `bins=${encodeURIComponent(bins)}${ecdf ? `&ecdf=${ecdf}` : ''}`;
+    const response = await fetch(
+      `${API_BASE_URL}/charts/histogram/${parameter}${query ? `${query}&${extra}` : `?${extra}`}`,
+      REVALIDATE
+    );
     return handleResponse(response);
   },
 
   // Get device yield data with 2.5% quantiles and batch averages
-  getDeviceYield: async () => {
-    const response = await fetch(`${API_BASE_URL}/charts/device-yield`);
+  getDeviceYield: async (filters = {}) => {
+    const response = await fetch(`${API_BASE_URL}/charts/device-yield${chartQuery(filters)}`, REVALIDATE);
+    return handleResponse(response);
+  },
+
+  // Get IV repeatability data with daily averages for the last `days` days (server default: 10)
+  getIVRepeatability: async (days, filters = {}) => {
+    const response = await fetch(`${API_BASE_URL}/charts/iv-repeatability${chartQuery({ ...filters, days })}`, REVALIDATE);
+    return handleResponse(response);
+  },
+
+  // Grouped aggregation: groupBy from batch/sheet/date/device, metrics = parameters or numeric columns,
+  // aggs from count/mean/std/cv/min/max/median or quantiles like 'p2.5'; filters as in getData
+  query: async ({ groupBy = [], metrics = [], aggs = [], ...filters } = {}) => {
+    const query = new URLSearchParams(chartQuery(filters));
+    if (groupBy.length) query.set('group_by', groupBy.join(','));
+    query.set('metrics', metrics.join(','));
+    if (aggs.length) query.set('aggs', aggs.join(','));
+    const response = await fetch(`${API_BASE_URL}/charts/query?${query}`, REVALIDATE);
     return handleResponse(response);
   },
 
-  // Get IV repeatability data with daily averages for last 10 days
-  getIVRepeatability: async () => {
-    const response = await fetch(`${API_BASE_URL}/charts/iv-repeatability`);
+  // Get box plots, device yield and IV repeatability in one request (optionally for some parameters)
+  getBundle: async (parameters = []) => {
+    const query = parameters.length ? `?parameters=${encodeURIComponent(parameters.join(','))}` : '';
+    const response = await fetch(`${API_BASE_URL}/charts/bundle${query}`, REVALIDATE);
     return handleResponse(response);
   },
 };
@@ -344,7 +391,7 @@ export const stabilityAPI = {
   // Get all grid data
   getGridData: async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/stability/grid-data`);
+      const response = await fetch(`${API_BASE_URL}/stability/grid-data`, REVALIDATE);
       const result = await response.json();
       
       if (!result.success) {
@@ -361,7 +408,7 @@ export const stabilityAPI = {
   // Get all active devices
   getDevices: async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/stability/devices`);
+      const response = await fetch(`${API_BASE_URL}/stability/devices`, REVALIDATE);
       const result = await response.json();
       
       if (!result.success) {
@@ -469,7 +516,8 @@ export const stabilityAPI = {
       const encodedPath = encodeURIComponent(devicePath);
       
       const response = await fetch(
-        `${API_BASE_URL}/stability/history/${encodedPath}`
+        `${API_BASE_URL}/stability/history/${encodedPath}`,
+        REVALIDATE
       );
       
       const result = await response.json();